@@ -0,0 +1,202 @@
+/*
+ * Copyright (c) 2016 Linux Documentation Project
+ *
+ * FopServer: render XSL-FO to PDF for ldptool, in one long-lived JVM
+ *
+ * Starting FOP for each document means paying for JVM startup, class
+ * loading, font setup and JIT warmup every time.  ldptool --fopserver starts
+ * this program once per run and sends it all of the FO to PDF jobs.
+ *
+ * Usage (Java 16 or newer, with FOP 2.x and its dependencies):
+ *
+ *   java -cp /usr/share/java/fop.jar:... FopServer.java SOCKET [CONF ...]
+ *
+ * The server listens on the Unix domain socket SOCKET.  Each connection
+ * carries one request line and receives one reply line:
+ *
+ *   RENDER <TAB> /path/to/STEM.fo <TAB> /path/to/STEM.pdf [<TAB> CONF]
+ *   OK  |  ERROR <message>
+ *
+ * The FopFactory (configuration, fonts, hyphenation) is built once for each
+ * CONF, the FOP configuration file a job names (as fop -c), and once for
+ * jobs which name none; it is reused for every job.  The factories for the
+ * CONF arguments are built before the server listens.
+ *
+ * Relative URIs in the FO document (e.g. images/note.png) are resolved
+ * against the directory of the FO file, as they are when fop is run in the
+ * output directory.  Jobs run concurrently, one thread per connection.  The
+ * server runs until it is terminated.
+ */
+
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.OutputStreamWriter;
+import java.io.Writer;
+import java.net.StandardProtocolFamily;
+import java.net.URI;
+import java.net.UnixDomainSocketAddress;
+import java.nio.channels.Channels;
+import java.nio.channels.ServerSocketChannel;
+import java.nio.channels.SocketChannel;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.util.HashMap;
+import java.util.Map;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+
+import javax.xml.transform.Transformer;
+import javax.xml.transform.TransformerFactory;
+import javax.xml.transform.sax.SAXResult;
+import javax.xml.transform.stream.StreamSource;
+
+import org.apache.fop.apps.Fop;
+import org.apache.fop.apps.FopConfParser;
+import org.apache.fop.apps.FopFactory;
+import org.apache.fop.apps.FopFactoryBuilder;
+import org.apache.fop.apps.MimeConstants;
+import org.apache.fop.apps.io.ResourceResolverFactory;
+import org.apache.xmlgraphics.io.Resource;
+import org.apache.xmlgraphics.io.ResourceResolver;
+
+public class FopServer {
+
+    /*
+     * The base URI of every factory.  A factory is shared by the jobs of
+     * all documents, so relative URIs resolve against this placeholder, and
+     * JobResolver maps it to the directory of the FO file of the job which
+     * runs in the current thread.
+     */
+    static final URI BASE = URI.create("file:///ldptool-fo-basedir/");
+
+    static final ThreadLocal<URI> jobdir = new ThreadLocal<>();
+
+    static class JobResolver implements ResourceResolver {
+
+        private final ResourceResolver resolver =
+            ResourceResolverFactory.createDefaultResourceResolver();
+
+        URI rebase(URI uri) {
+            String base = BASE.toString();
+            String name = uri.toString();
+            URI dir = jobdir.get();
+            if (dir == null || !name.startsWith(base)) {
+                return uri;
+            }
+            return dir.resolve(name.substring(base.length()));
+        }
+
+        public Resource getResource(URI uri) throws IOException {
+            return resolver.getResource(rebase(uri));
+        }
+
+        public OutputStream getOutputStream(URI uri) throws IOException {
+            return resolver.getOutputStream(rebase(uri));
+        }
+    }
+
+    private final TransformerFactory transformers =
+        TransformerFactory.newInstance();
+
+    private final JobResolver resolver = new JobResolver();
+
+    // -- CONF (or "" for none) => FopFactory
+    private final Map<String, FopFactory> factories = new HashMap<>();
+
+    synchronized FopFactory factory(String conf) throws Exception {
+        FopFactory factory = factories.get(conf);
+        if (factory != null) {
+            return factory;
+        }
+        if (conf.isEmpty()) {
+            factory = new FopFactoryBuilder(BASE, resolver).build();
+        } else {
+            try (InputStream in = new FileInputStream(conf)) {
+                factory = new FopConfParser(in, BASE, resolver)
+                    .getFopFactoryBuilder().build();
+            }
+        }
+        factories.put(conf, factory);
+        return factory;
+    }
+
+    void render(File fo, File pdf, String conf) throws Exception {
+        FopFactory factory = factory(conf);
+        Transformer transformer;
+        synchronized (transformers) {
+            transformer = transformers.newTransformer();
+        }
+        jobdir.set(fo.getAbsoluteFile().getParentFile().toURI());
+        try (OutputStream out =
+                 new BufferedOutputStream(new FileOutputStream(pdf))) {
+            Fop fop = factory.newFop(MimeConstants.MIME_PDF,
+                                     factory.newFOUserAgent(), out);
+            transformer.transform(new StreamSource(fo),
+                                  new SAXResult(fop.getDefaultHandler()));
+        } finally {
+            jobdir.remove();
+        }
+    }
+
+    String dispatch(String request) {
+        String[] fields = request.split("\t");
+        if (fields.length < 3 || fields.length > 4
+                || !fields[0].equals("RENDER")) {
+            return "ERROR bad request";
+        }
+        String conf = fields.length == 4 ? fields[3] : "";
+        try {
+            render(new File(fields[1]), new File(fields[2]), conf);
+            return "OK";
+        } catch (Exception e) {
+            return "ERROR " + String.valueOf(e).replace('\n', ' ');
+        }
+    }
+
+    void handle(SocketChannel conn) {
+        try (conn;
+             BufferedReader in = new BufferedReader(new InputStreamReader(
+                 Channels.newInputStream(conn), StandardCharsets.UTF_8));
+             Writer out = new OutputStreamWriter(
+                 Channels.newOutputStream(conn), StandardCharsets.UTF_8)) {
+            String request = in.readLine();
+            if (request == null) {
+                return;
+            }
+            out.write(dispatch(request) + "\n");
+            out.flush();
+        } catch (IOException e) {
+            System.err.println("FopServer: " + e);
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        if (args.length < 1) {
+            System.err.println("usage: FopServer SOCKET [CONF ...]");
+            System.exit(2);
+        }
+        Path path = Paths.get(args[0]);
+        FopServer server = new FopServer();
+        server.factory("");
+        for (int i = 1; i < args.length; i++) {
+            server.factory(args[i]);
+        }
+        ExecutorService pool = Executors.newCachedThreadPool();
+        try (ServerSocketChannel listener =
+                 ServerSocketChannel.open(StandardProtocolFamily.UNIX)) {
+            listener.bind(UnixDomainSocketAddress.of(path));
+            while (true) {
+                SocketChannel conn = listener.accept();
+                pool.submit(() -> server.handle(conn));
+            }
+        }
+    }
+}
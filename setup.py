@@ -21,12 +21,13 @@ setup(
     long_description=readme,
     packages=['tldp', 'tldp/doctypes'],
     test_suite='nose.collector',
-    install_requires=['networkx', 'nose'],
+    install_requires=['nose'],
     include_package_data=True,
     package_data={'extras': ['extras/collateindex.pl'],
                   'extras/xsl': glob.glob('extras/xsl/*.xsl'),
                   'extras/css': glob.glob('extras/css/*.css'),
                   'extras/dsssl': glob.glob('extras/dsssl/*.dsl'),
+                  'extras/fop': glob.glob('extras/fop/*.java'),
                   },
     data_files=[('/etc/ldptool', ['etc/ldptool.ini']), ],
     entry_points={
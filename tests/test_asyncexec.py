@@ -0,0 +1,126 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import unittest
+from tempfile import mkdtemp
+from tempfile import NamedTemporaryFile as ntf
+
+from tldptesttools import TestInventoryBase, TestToolsFilesystem
+
+# -- Test Data
+import example
+
+import tldp.driver
+import tldp.inventory
+from tldp.utils import which
+
+# -- SUT
+try:
+    import asyncio
+    from tldp.asyncexec import AsyncEngine, execute, execute_pipeline
+except (ImportError, SyntaxError):
+    AsyncEngine = None
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+@unittest.skipIf(AsyncEngine is None, 'asyncio engine unavailable')
+class Test_async_execute(TestToolsFilesystem):
+
+    def test_execute_returns_zero(self):
+        result = run(execute([which('true')], logdir=self.tempdir))
+        self.assertEqual(0, result)
+
+    def test_execute_returns_nonzero(self):
+        result = run(execute([which('false')], logdir=self.tempdir))
+        self.assertEqual(1, result)
+
+    def test_execute_cwd(self):
+        rundir = mkdtemp(dir=self.tempdir)
+        with ntf(dir=self.tempdir, mode='w+') as f:
+            coro = execute([which('pwd')], stdout=f, logdir=self.tempdir,
+                           cwd=rundir)
+            result = run(coro)
+            f.seek(0)
+            reported = f.read().strip()
+        self.assertEqual(0, result)
+        self.assertTrue(os.path.samefile(rundir, reported))
+
+    def test_execute_exception_when_logdir_none(self):
+        with self.assertRaises(ValueError):
+            run(execute([which('true')], logdir=None))
+
+
+@unittest.skipIf(AsyncEngine is None, 'asyncio engine unavailable')
+class Test_async_execute_pipeline(TestToolsFilesystem):
+
+    def test_execute_pipeline_stdout(self):
+        cmds = [[which('echo'), 'frobnitz'], [which('tr'), 'a-z', 'A-Z']]
+        with ntf(dir=self.tempdir, mode='w+') as f:
+            result = run(execute_pipeline(cmds, stdout=f,
+                                          logdir=self.tempdir))
+            f.seek(0)
+            self.assertEqual('FROBNITZ', f.read().strip())
+        self.assertEqual(0, result)
+
+    def test_execute_pipeline_returns_nonzero(self):
+        cmds = [[which('false')], [which('cat')]]
+        result = run(execute_pipeline(cmds, logdir=self.tempdir))
+        self.assertEqual(1, result)
+
+    def test_execute_pipeline_waits_for_semaphore(self):
+        marker = os.path.join(self.tempdir, 'marker')
+        cmds = [[which('echo'), 'frobnitz'], [which('tee'), marker]]
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            semaphore = asyncio.Semaphore(1)
+            loop.run_until_complete(semaphore.acquire())
+            task = loop.create_task(execute_pipeline(
+                cmds, logdir=self.tempdir, semaphore=semaphore))
+            loop.run_until_complete(asyncio.sleep(0.2))
+            self.assertFalse(os.path.exists(marker))
+            semaphore.release()
+            result = loop.run_until_complete(task)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+        self.assertEqual(0, result)
+        self.assertTrue(os.path.exists(marker))
+
+
+@unittest.skipIf(AsyncEngine is None, 'asyncio engine unavailable')
+class TestAsyncEngine(TestInventoryBase):
+
+    def test_docbuild_result_shape(self):
+        c = self.config
+        c.build = True
+        c.engine = 'asyncio'
+        c.jobs = 2
+        ex = example.ex_linuxdoc
+        for stem in ('A-HOWTO', 'B-HOWTO', 'C-HOWTO'):
+            self.add_new(stem, ex)
+        inv = tldp.inventory.Inventory(c.pubdir, c.sourcedir)
+        docs = inv.all.values()
+        tldp.driver.prepare_docs_build_mode(c, docs)
+        _, results = tldp.driver.docbuild(c, docs)
+        self.assertEqual(len(docs), len(results))
+        for (result, doc), expected in zip(results, docs):
+            self.assertIs(doc, expected)
+            self.assertIn(result, (True, False))
+
+#
+# -- end of file
@@ -0,0 +1,138 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import time
+from argparse import Namespace
+
+from tldptesttools import TestToolsFilesystem
+
+# -- SUT
+from tldp.buildcache import BuildCache, fingerprint, linktree
+from tldp.utils import readmd5sums, writemd5sums
+
+
+class Frobnitz(object):
+    pass
+
+
+def runner(md5sums, sourcedir, **config):
+    r = Frobnitz()
+    r.source = Namespace(stem='Frobnitz-HOWTO', md5sums=md5sums,
+                         dirname=sourcedir)
+    r.config = Namespace(resources=['images'], **config)
+    return r
+
+
+class TestBuildCache(TestToolsFilesystem):
+
+    def setUp(self):
+        super(TestBuildCache, self).setUp()
+        self.cache = BuildCache(os.path.join(self.tempdir, 'cache'))
+        os.mkdir(self.cache.dirname)
+
+    def makeoutput(self, name, content='frobnitz'):
+        dirname = os.path.join(self.tempdir, name)
+        os.mkdir(dirname)
+        with open(os.path.join(dirname, 'Frobnitz-HOWTO.html'), 'w') as f:
+            f.write(content)
+        os.symlink('Frobnitz-HOWTO.html', os.path.join(dirname, 'index.html'))
+        return dirname
+
+    def test_linktree(self):
+        src = self.makeoutput('src')
+        dst = os.path.join(self.tempdir, 'dst')
+        self.assertEqual(len('frobnitz'), linktree(src, dst))
+        html = os.path.join(dst, 'Frobnitz-HOWTO.html')
+        self.assertTrue(os.path.samefile(
+            html, os.path.join(src, 'Frobnitz-HOWTO.html')))
+        index = os.path.join(dst, 'index.html')
+        self.assertEqual('Frobnitz-HOWTO.html', os.readlink(index))
+
+    def test_store_materialize(self):
+        src = self.makeoutput('src')
+        dst = os.path.join(self.tempdir, 'dst')
+        self.assertFalse(self.cache.materialize('abc', dst))
+        self.assertTrue(self.cache.store('abc', src))
+        os.mkdir(dst)
+        with open(os.path.join(dst, 'junk'), 'w'):
+            pass
+        self.assertTrue(self.cache.materialize('abc', dst))
+        self.assertEqual(['Frobnitz-HOWTO.html', 'index.html'],
+                         sorted(os.listdir(dst)))
+
+    def test_materialized_md5sums_replaced(self):
+        src = self.makeoutput('src')
+        md5sums = os.path.join(src, '.LDP-source-MD5SUMS')
+        writemd5sums(md5sums, {'a.sgml': 'frobnitz'})
+        self.assertTrue(self.cache.store('abc', src))
+        dst = os.path.join(self.tempdir, 'dst')
+        self.assertTrue(self.cache.materialize('abc', dst))
+        writemd5sums(os.path.join(dst, '.LDP-source-MD5SUMS'),
+                     {'a.sgml': 'wascally'}, algorithm='gitblob')
+        cached = os.path.join(self.cache.entry('abc'), '.LDP-source-MD5SUMS')
+        self.assertEqual({'a.sgml': 'frobnitz'},
+                         readmd5sums(cached)[1])
+        self.assertEqual(['.LDP-source-MD5SUMS', 'Frobnitz-HOWTO.html',
+                          'index.html'], sorted(os.listdir(dst)))
+
+    def test_evict_least_recently_used(self):
+        self.cache.maxsize = 3 * len('frobnitz')
+        then = time.time() - 3600
+        for n, key in enumerate(('a', 'b', 'c')):
+            self.cache.store(key, self.makeoutput(key))
+            os.utime(self.cache.entry(key), (then + n, then + n))
+        # -- a hit on the oldest makes it the most recently used
+        self.cache.materialize('a', os.path.join(self.tempdir, 'out'))
+        self.cache.store('d', self.makeoutput('d'))
+        remaining = sorted(x[2] for x in self.cache.entries())
+        self.assertEqual(['a', 'c', 'd'], remaining)
+
+    def test_fingerprint(self):
+        xsl = os.path.join(self.tempdir, 'frobnitz.xsl')
+        with open(xsl, 'w') as f:
+            f.write('<xsl/>')
+        md5sums = {'Frobnitz-HOWTO.xml': 'd41d8cd98f00b204e9800998ecf8427e'}
+        fp = fingerprint(runner(md5sums, self.tempdir, frobnitz_xsl=xsl))
+        self.assertEqual(fp, fingerprint(
+            runner(md5sums, self.tempdir, frobnitz_xsl=xsl, other_xsl=None)))
+        changed = {'Frobnitz-HOWTO.xml': '0' * 32}
+        self.assertNotEqual(fp, fingerprint(
+            runner(changed, self.tempdir, frobnitz_xsl=xsl)))
+        with open(xsl, 'w') as f:
+            f.write('<xsl>upgraded</xsl>')
+        self.assertNotEqual(fp, fingerprint(
+            runner(md5sums, self.tempdir, frobnitz_xsl=xsl)))
+
+    def test_fingerprint_toolversions(self):
+        tool = os.path.join(self.tempdir, 'frobnitz')
+        with open(tool, 'w') as f:
+            f.write('#! /bin/sh\n')
+        md5sums = {'Frobnitz-HOWTO.xml': 'd41d8cd98f00b204e9800998ecf8427e'}
+        fp = fingerprint(runner(md5sums, self.tempdir, frobnitz_tool=tool,
+                                toolversions={tool: 'frobnitz 1.0'}))
+        # -- the version, not the file, identifies the tool
+        then = time.time() - 3600
+        os.utime(tool, (then, then))
+        self.assertEqual(fp, fingerprint(
+            runner(md5sums, self.tempdir, frobnitz_tool=tool,
+                   toolversions={tool: 'frobnitz 1.0'})))
+        self.assertNotEqual(fp, fingerprint(
+            runner(md5sums, self.tempdir, frobnitz_tool=tool,
+                   toolversions={tool: 'frobnitz 1.1'})))
+
+    def test_fromconfig(self):
+        config = Namespace(buildcache=True, script=False, buildcache_size=1,
+                           cachedir=os.path.join(self.tempdir, 'c'))
+        cache = BuildCache.fromconfig(config)
+        self.assertEqual(1024 * 1024, cache.maxsize)
+        self.assertTrue(os.path.isdir(cache.dirname))
+        config.script = True
+        self.assertIsNone(BuildCache.fromconfig(config))
+
+#
+# -- end of file
@@ -15,6 +15,7 @@ from tldptesttools import CCTestTools
 # -- SUT
 from tldp.cascadingconfig import CascadingConfig
 from tldp.cascadingconfig import DefaultFreeArgumentParser
+from tldp.cascadingconfig import LazyDefault, LazyNamespace
 
 
 class Test_argv_from_env(unittest.TestCase):
@@ -59,6 +60,83 @@ class TestCascadingConfig(unittest.TestCase):
         self.assertIsInstance(args, list)
 
 
+def counting(calls, value):
+    calls.append(value)
+    return value
+
+
+def shout(value):
+    return value.upper()
+
+
+class TestLazyDefault(unittest.TestCase):
+
+    def test_resolved_when_read(self):
+        calls = list()
+        ns = LazyNamespace(frob=LazyDefault(counting, calls, 'nitz'))
+        self.assertEqual([], calls)
+        self.assertIsInstance(vars(ns)['frob'], LazyDefault)
+        self.assertEqual('nitz', ns.frob)
+        self.assertEqual('nitz', ns.frob)
+        self.assertEqual(['nitz'], calls)
+        self.assertEqual('nitz', vars(ns)['frob'])
+
+    def test_resolve(self):
+        calls = list()
+        ns = LazyNamespace(a=LazyDefault(counting, calls, 'a'), b='b')
+        ns.resolve()
+        self.assertEqual(dict(a='a', b='b'), vars(ns))
+        self.assertEqual(['a'], calls)
+
+    def test_str(self):
+        calls = list()
+        lazy = LazyDefault(counting, calls, 'wabbit')
+        self.assertTrue('counting' in str(lazy))
+        self.assertTrue('wabbit' in str(lazy))
+        self.assertTrue('counting' in repr(lazy))
+        self.assertEqual([], calls)
+
+    def test_help_defers_default(self):
+        calls = list()
+        ap = DefaultFreeArgumentParser()
+        ap.add_argument('--wabbit', type=str,
+                        default=LazyDefault(counting, calls, 'hasenpfeffer'),
+                        help='wabbit [%(default)s]')
+        helptext = ' '.join(ap.format_help().split())
+        self.assertTrue('found when needed: counting' in helptext)
+        self.assertTrue('hasenpfeffer' in helptext)
+        self.assertEqual([], calls)
+
+    def test_type_applied_when_resolved(self):
+        calls = list()
+        ap = DefaultFreeArgumentParser()
+        ap.add_argument('--wabbit', type=lambda x: None,
+                        default=LazyDefault(counting, calls, 'hasenpfeffer'))
+        ap.add_argument('--sneeze', type=shout,
+                        default=LazyDefault(counting, calls, 'achoo'))
+        ap.add_argument('--cough', type=shout,
+                        default=LazyDefault(counting, calls, None))
+        cc = CascadingConfig('effluvia', ap, argv=[], env=dict())
+        config, args = cc.parse()
+        self.assertIsNone(config.wabbit)
+        self.assertEqual('ACHOO', config.sneeze)
+        self.assertIsNone(config.cough)
+
+    def test_parse_defers_default(self):
+        calls = list()
+        ap = DefaultFreeArgumentParser()
+        ap.add_argument('--wabbit', type=str,
+                        default=LazyDefault(counting, calls, 'hasenpfeffer'))
+        ap.add_argument('--sneeze', type=str, default='achoo')
+        cc = CascadingConfig('effluvia', ap, argv=['--sneeze', 'gesundheit'],
+                             env=dict())
+        config, args = cc.parse()
+        self.assertEqual([], calls)
+        self.assertEqual('gesundheit', config.sneeze)
+        self.assertEqual('hasenpfeffer', config.wabbit)
+        self.assertEqual(['hasenpfeffer'], calls)
+
+
 class TestCascadingConfigBasic(TestToolsFilesystem):
 
     def setUp(self):
@@ -0,0 +1,116 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import unittest
+import subprocess
+from argparse import Namespace
+
+from tldptesttools import TestToolsFilesystem
+
+# -- SUT
+from tldp.utils import which
+from tldp.doctypes.commands import Command, CommandSyntaxError
+from tldp.doctypes.common import BaseDoctype
+
+xsltproc = '''"{config.frobnitz_xsltproc}" > "{output.name_htmls}" \\
+                  --nonet \\
+                  --stringparam admon.graphics.path images/ \\
+                  -V '%callout-graphics-path%=images/callouts/' \\
+                  --dsl "{config.frobnitz_dsl}#html" \\
+                  "{output.validsource}"'''
+
+fields = dict(config=Namespace(frobnitz_xsltproc='/usr/bin/xsltproc',
+                               frobnitz_dsl='/usr/share/ldp dsl/ldp.dsl'),
+              output=Namespace(name_htmls="Frob $nitz's-single.html",
+                               validsource='Frob nitz.xml'))
+
+
+class TestCommand(unittest.TestCase):
+
+    def test_fromtemplate(self):
+        c = Command.fromtemplate(xsltproc, **fields)
+        self.assertEqual([['/usr/bin/xsltproc',
+                           '--nonet',
+                           '--stringparam', 'admon.graphics.path', 'images/',
+                           '-V', '%callout-graphics-path%=images/callouts/',
+                           '--dsl', '/usr/share/ldp dsl/ldp.dsl#html',
+                           'Frob nitz.xml']], c.pipeline)
+        self.assertEqual("Frob $nitz's-single.html", c.stdout)
+        self.assertIsNone(c.stdin)
+
+    def test_pipeline_redirections(self):
+        c = Command.fromtemplate('a < in | b -x >> "o u t"')
+        self.assertEqual([['a'], ['b', '-x']], c.pipeline)
+        self.assertEqual(('in', 'o u t', True), (c.stdin, c.stdout, c.append))
+
+    def test_unsupported(self):
+        for template in ('test -d "x" && rm -rf -- "x"',
+                         'cd -- "{output.dirname}"',
+                         'true; false',
+                         'echo $HOME',
+                         'rm *.html',
+                         'a 2> /dev/null',
+                         'a\nb',
+                         'a | | b',
+                         '> out'):
+            with self.assertRaises(CommandSyntaxError):
+                Command.fromtemplate(template, output=Namespace(dirname='x'))
+
+    def test_comments_and_continuations(self):
+        c = Command.fromtemplate('\n# -- a comment\nrm \\\n  --verbose x\n')
+        self.assertEqual([['rm', '--verbose', 'x']], c.pipeline)
+
+    @unittest.skipUnless(which('bash'), "bash is not installed")
+    def test_shelltext_roundtrip(self):
+        c = Command.fromtemplate(xsltproc, **fields)
+        c.pipeline[0][0] = 'printf'
+        c.pipeline[0].insert(1, '%s\\n')
+        c.stdout = None
+        script = c.shelltext()
+        words = subprocess.check_output(['bash', '-c', script])
+        self.assertEqual(c.pipeline[0][2:],
+                         words.decode('utf-8').splitlines())
+
+
+class Frobnitz(BaseDoctype):
+    formatname = 'Frobnitz'
+    extensions = ['.frobnitz']
+    signatures = []
+
+
+class TestExecuteCommand(TestToolsFilesystem):
+
+    def runner(self):
+        dirname = os.path.join(self.tempdir, 'Frob nitz')
+        output = Namespace(stem='Frob nitz', dirname=dirname,
+                           logdir=os.path.join(dirname, 'logs'))
+        for d in (output.dirname, output.logdir):
+            os.mkdir(d)
+        source = Namespace(stem='Frob nitz', doctype=Frobnitz)
+        config = Namespace(script=False, build=True)
+        return Frobnitz(source=source, output=output, config=config)
+
+    def test_direct_execution(self):
+        r = self.runner()
+        with open(os.path.join(r.output.dirname, "it's in.txt"), 'w') as f:
+            f.write('frobnitz\n')
+        s = '''tr a-z A-Z < "it's in.txt" | rev > "{output.stem} out.txt"'''
+        self.assertTrue(r.shellscript(s))
+        with open(os.path.join(r.output.dirname, 'Frob nitz out.txt')) as f:
+            self.assertEqual('ZTINBORF\n', f.read())
+        self.assertEqual([], [x for x in os.listdir(r.output.logdir)
+                              if x.endswith('.sh')])
+
+    def test_failure_and_fallback(self):
+        r = self.runner()
+        self.assertFalse(r.shellscript('false'))
+        self.assertFalse(r.shellscript('no-such-frobnitz-tool'))
+        self.assertTrue(r.shellscript('true && test -d "{output.logdir}"'))
+
+#
+# -- end of file
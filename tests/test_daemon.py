@@ -0,0 +1,83 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import time
+import socket
+import threading
+from argparse import Namespace
+
+from tldptesttools import TestToolsFilesystem
+
+# -- SUT
+from tldp.daemon import InventoryDaemon, ask, listen, socketpath
+
+
+class TestInventoryDaemon(TestToolsFilesystem):
+
+    def setUp(self):
+        super(TestInventoryDaemon, self).setUp()
+        self.path = os.path.join(self.tempdir, 'ldptool.sock')
+
+    def start(self, handler):
+        daemon = InventoryDaemon(self.path, handler)
+        t = threading.Thread(target=daemon.serve, kwargs=dict(timeout=1))
+        t.start()
+        deadline = time.time() + 10
+        while not os.path.exists(self.path) and time.time() < deadline:
+            time.sleep(0.01)
+        return t
+
+    def test_ask(self):
+        t = self.start(lambda request: dict(result=0, echo=request))
+        try:
+            reply = ask(self.path, dict(action='frobnitz', args=['ä']))
+        finally:
+            t.join()
+        self.assertEqual(dict(action='frobnitz', args=['ä']), reply['echo'])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_handler_failure(self):
+        t = self.start(lambda request: 1 / 0)
+        try:
+            reply = ask(self.path, dict(action='frobnitz'))
+            self.assertTrue('Server error' in reply['result'])
+            # -- and still serving
+            self.assertIsNotNone(ask(self.path, dict(action='frobnitz')))
+        finally:
+            t.join()
+
+    def test_no_server(self):
+        self.assertIsNone(ask(self.path, dict(action='summary')))
+        self.assertIsNone(ask(None, dict(action='summary')))
+
+    def test_stale_socket(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+        self.assertIsNone(ask(self.path, dict(action='summary')))
+        listener = listen(self.path)
+        try:
+            with self.assertRaises(OSError):
+                listen(self.path)
+        finally:
+            listener.close()
+
+    def test_socketpath(self):
+        config = Namespace(serve_socket=None, cachedir=self.tempdir,
+                           pubdir='/pub', sourcedir=['/a', '/b'])
+        path = socketpath(config)
+        self.assertEqual(self.tempdir, os.path.dirname(path))
+        config.sourcedir = ['/b', '/a']
+        self.assertEqual(path, socketpath(config))
+        config.serve_socket = self.path
+        self.assertEqual(self.path, socketpath(config))
+        config = Namespace(cachedir=self.tempdir, pubdir=None, sourcedir=[])
+        self.assertIsNone(socketpath(config))
+
+#
+# -- end of file
@@ -0,0 +1,283 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import threading
+import unittest
+from argparse import Namespace
+
+from tldptesttools import TestInventoryBase, TestToolsFilesystem
+
+# -- Test Data
+import example
+
+import tldp.driver
+import tldp.inventory
+
+# -- SUT
+from tldp.utils import which
+from tldp.buildcache import BuildCache, fingerprint
+from tldp.doctypes.common import BaseDoctype, depends, memoize
+from tldp.doctypes.common import BuildPlan, topologicalorder
+from tldp.doctypes.docbook4xml import Docbook4XML
+
+
+class Diamond(BaseDoctype):
+    '''first -> (left, right) -> last; left and right wait for each other'''
+    formatname = 'Diamond'
+    extensions = ['.diamond']
+    signatures = []
+
+    def __init__(self, *args, **kwargs):
+        super(Diamond, self).__init__(*args, **kwargs)
+        self.called = list()
+        self.events = dict(left=threading.Event(), right=threading.Event())
+        self.fail = set()
+
+    def step(self, name, waitfor=None):
+        self.called.append(name)
+        if name in self.events:
+            self.events[name].set()
+        if waitfor and not self.events[waitfor].wait(5):
+            return False
+        return name not in self.fail
+
+    def first(self, **kwargs):
+        return self.step('first')
+
+    @depends(first)
+    def left(self, **kwargs):
+        return self.step('left', waitfor='right')
+
+    @depends(first)
+    def right(self, **kwargs):
+        return self.step('right', waitfor='left')
+
+    @depends(left, right)
+    def last(self, **kwargs):
+        return self.step('last')
+
+
+def diamond(stepjobs):
+    config = Namespace(script=False, build=True, stepjobs=stepjobs)
+    source = Namespace(stem='Diamond-HOWTO')
+    output = Namespace(stem='Diamond-HOWTO')
+    return Diamond(source=source, output=output, config=config)
+
+
+class TestBuildConcurrent(unittest.TestCase):
+
+    def test_independent_steps_overlap(self):
+        d = diamond(2)
+        self.assertTrue(d.build_fullrun())
+        self.assertEqual('first', d.called[0])
+        self.assertEqual('last', d.called[-1])
+        self.assertEqual(4, len(d.called))
+
+    def test_failure_stops_scheduling(self):
+        d = diamond(2)
+        d.fail.add('left')
+        self.assertFalse(d.build_fullrun())
+        self.assertNotIn('last', d.called)
+
+    def test_build_order_unchanged(self):
+        d = diamond(1)
+        order = [x.__name__ for x in d.determinebuildorder()]
+        self.assertEqual('first', order[0])
+        self.assertEqual('last', order[-1])
+
+
+# -- stand-ins for the DocBook SGML toolchain; each writes what the real tool
+#    would into the working directory, and jw fails if another jw is running
+#    in the same directory
+fakejw = """#! /bin/sh
+mkdir jw.running || exit 1
+sleep 0.2
+for arg; do last="$arg"; done
+stem=$(basename "$last" .sgml)
+case "$*" in
+  *"-b pdf"*) echo pdf > "$stem.pdf" ;;
+  *nochunks*) echo htmls > "$stem.html" ;;
+  *) echo html > index.html ;;
+esac
+rmdir jw.running
+"""
+faketools = dict(
+    jw=fakejw,
+    openjade='#! /bin/sh\ntouch HTML.index\n',
+    collateindex='#! /bin/sh\n'
+                 'while [ "$1" != -o ]; do shift; done; touch "$2"\n',
+    html2text='#! /bin/sh\necho text\n',
+    dblatex='#! /bin/sh\nexit 1\n',
+)
+
+
+class TestDocbookSGMLConcurrent(TestInventoryBase):
+
+    def setUp(self):
+        super(TestDocbookSGMLConcurrent, self).setUp()
+        c = self.config
+        for name, script in faketools.items():
+            fname = os.path.join(self.tempdir, name)
+            with open(fname, 'w') as f:
+                f.write(script)
+            os.chmod(fname, 0o755)
+            setattr(c, 'docbooksgml_' + name, fname)
+        for name in ('ldpdsl', 'docbookdsl'):
+            fname = os.path.join(self.tempdir, name + '.dsl')
+            with open(fname, 'w'):
+                pass
+            setattr(c, 'docbooksgml_' + name, fname)
+        c.docbooksgml_textengine = 'html2text'
+        c.build = True
+        c.script = False
+
+    def test_stepjobs(self):
+        c = self.config
+        c.stepjobs = 3
+        self.add_new('Frobnitz-HOWTO', example.ex_docbooksgml)
+        inv = tldp.inventory.Inventory(c.pubdir, c.sourcedir)
+        docs = list(inv.all.values())
+        tldp.driver.prepare_docs_build_mode(c, docs)
+        doc = docs[0]
+        runner = doc.doctype(source=doc, output=doc.working, config=c)
+        self.assertTrue(runner.generate())
+        output = doc.working
+        for name in ('name_pdf', 'name_html', 'name_htmls', 'name_txt',
+                     'name_indexhtml'):
+            self.assertTrue(os.path.exists(getattr(output, name)), name)
+
+
+class TestBuildPlan(unittest.TestCase):
+
+    def test_diamond(self):
+        plan = Diamond.buildplan()
+        self.assertIs(plan, Diamond.buildplan())
+        self.assertEqual(('first', 'right', 'left', 'last'), plan.order)
+        self.assertEqual((('first',), ('right', 'left'), ('last',)),
+                         plan.levels)
+        self.assertEqual(frozenset(['left', 'right']), plan.depends['last'])
+        self.assertEqual(frozenset(), plan.depends['first'])
+
+    def test_docbook4xml_order(self):
+        order = ('make_validated_source', 'make_chunked_html',
+                 'make_name_html', 'make_name_indexhtml', 'make_fo',
+                 'make_name_htmls', 'make_name_txt', 'make_name_pdf',
+                 'remove_validated_source')
+        self.assertEqual(order, Docbook4XML.buildplan().order)
+        self.assertEqual(('make_chunked_html', 'make_fo', 'make_name_htmls'),
+                         Docbook4XML.buildplan().levels[1])
+
+    def test_cycle(self):
+        successors = dict(a=['b'], b=['a'])
+        with self.assertRaises(ValueError):
+            topologicalorder(successors)
+
+    def test_fromclass_without_steps(self):
+        plan = BuildPlan.fromclass(BaseDoctype)
+        self.assertEqual((), plan.order)
+        self.assertEqual((), plan.levels)
+
+
+class TestBuildPrecheck(unittest.TestCase):
+
+    def test_checked_tools_not_validated(self):
+        calls = list()
+
+        def validator(thing):
+            calls.append(thing)
+            return True
+
+        runner = diamond(1)
+        runner.required = {'diamond_tool': validator}
+        runner.config.diamond_tool = '/usr/bin/diamond'
+        self.assertTrue(runner.build_precheck())
+        self.assertEqual(['/usr/bin/diamond'], calls)
+        runner.config.toolschecked = frozenset(['diamond_tool'])
+        self.assertTrue(runner.build_precheck())
+        self.assertEqual(['/usr/bin/diamond'], calls)
+        runner.config.diamond_tool = None
+        self.assertFalse(runner.build_precheck())
+
+
+class Upcase(BaseDoctype):
+    formatname = 'Upcase'
+    extensions = ['.upcase']
+    signatures = []
+    required = {}
+
+    @memoize(inputs=['{output.name_in}'], outputs=['{output.name_out}'])
+    def make_upcase(self, **kwargs):
+        s = '''"{config.upcase_tr}" a-z A-Z \\
+                  < "{output.name_in}" \\
+                  > "{output.name_out}"'''
+        return self.shellscript(s, **kwargs)
+
+
+class TestMemoize(TestToolsFilesystem):
+
+    def upcase(self, content):
+        dirname = os.path.join(self.tempdir, 'Upcase-HOWTO')
+        output = Namespace(stem='Upcase-HOWTO', dirname=dirname,
+                           logdir=os.path.join(dirname, 'logs'),
+                           name_in=os.path.join(dirname, 'in.txt'),
+                           name_out=os.path.join(dirname, 'out.txt'))
+        for d in (output.dirname, output.logdir):
+            if not os.path.isdir(d):
+                os.mkdir(d)
+        with open(output.name_in, 'w') as f:
+            f.write(content)
+        if os.path.exists(output.name_out):
+            os.unlink(output.name_out)
+        source = Namespace(stem='Upcase-HOWTO', doctype=Upcase, md5sums={})
+        config = Namespace(script=False, build=True, stepcache=True,
+                           cachedir=os.path.join(self.tempdir, 'cache'),
+                           buildcache_size=0, upcase_tr=which('tr'))
+        runner = Upcase(source=source, output=output, config=config)
+        self.assertTrue(runner.make_upcase())
+        with open(output.name_out) as f:
+            self.assertEqual(content.upper(), f.read())
+        return runner.stepstats
+
+    def test_memoize_hit_and_miss(self):
+        name = 'Upcase.make_upcase'
+        stats = self.upcase('frobnitz')
+        self.assertEqual(1, stats[(name, 'misses')])
+        stats = self.upcase('frobnitz')
+        self.assertEqual(1, stats[(name, 'hits')])
+        stats = self.upcase('wascally wabbit')
+        self.assertEqual(1, stats[(name, 'misses')])
+
+
+class TestGenerateBuildCache(TestToolsFilesystem):
+
+    def test_hit_skips_build_prepare(self):
+        dirname = os.path.join(self.tempdir, 'Upcase-HOWTO')
+        output = Namespace(stem='Upcase-HOWTO', dirname=dirname,
+                           logdir=os.path.join(dirname, 'logs'))
+        source = Namespace(stem='Upcase-HOWTO', doctype=Upcase,
+                           md5sums={'Upcase-HOWTO.upcase': 'frobnitz'},
+                           dirname=self.tempdir)
+        config = Namespace(script=False, build=True, buildcache=True,
+                           cachedir=os.path.join(self.tempdir, 'cache'),
+                           buildcache_size=0, resources=[],
+                           upcase_tr=which('tr'))
+        runner = Upcase(source=source, output=output, config=config)
+        cached = os.path.join(self.tempdir, 'cached')
+        os.mkdir(cached)
+        with open(os.path.join(cached, 'out.txt'), 'w') as f:
+            f.write('FROBNITZ')
+        cache = BuildCache.fromconfig(config)
+        self.assertTrue(cache.store(fingerprint(runner), cached))
+        prepared = list()
+        runner.build_prepare = lambda: prepared.append(True)
+        self.assertTrue(runner.generate())
+        self.assertEqual([], prepared)
+        self.assertEqual(['out.txt'], os.listdir(dirname))
+
+#
+# -- end of file
@@ -11,15 +11,21 @@ import os
 import uuid
 import errno
 import codecs
+import sys
 import random
+import unittest
+import subprocess
 from tempfile import NamedTemporaryFile as ntf
 from argparse import Namespace
 
 from tldptesttools import TestInventoryBase, TestToolsFilesystem
 from tldp.typeguesser import knowndoctypes
-from tldp.inventory import stypes, status_types
+from tldp.inventory import Inventory, stypes, status_types
 from tldp.sources import SourceDocument
 from tldp.outputs import OutputDirectory
+from tldp.watch import libc
+from tldp.vcs import readrevisions
+from tldp.utils import which, hashfunctions
 
 # -- Test Data
 import example
@@ -37,6 +43,14 @@ sampledocs = opj(opd(__file__), 'sample-documents')
 
 widths = Namespace(status=20, stem=50)
 
+try:
+    libc()
+    HAVE_INOTIFY = True
+except OSError:
+    HAVE_INOTIFY = False
+
+GIT = which('git')
+
 
 class TestDriverDetail(TestInventoryBase):
 
@@ -107,6 +121,43 @@ class TestDriverShowDoctypes(TestToolsFilesystem):
         self.assertEqual(exitcode, os.EX_OK)
 
 
+class TestDriverShowPlan(TestToolsFilesystem):
+
+    def test_show_plan(self):
+        f = io.StringIO()
+        config = Namespace(show_plan='docbook4xml')
+        result = tldp.driver.show_plan(config, file=f)
+        self.assertEqual(result, os.EX_OK)
+        stdout = f.getvalue()
+        self.assertTrue('Docbook4XML' in stdout)
+        self.assertTrue('make_validated_source' in stdout)
+
+    def test_show_plan_unknown(self):
+        config = Namespace(show_plan='frobnitz')
+        result = tldp.driver.show_plan(config)
+        self.assertTrue('Unknown doctype' in result)
+
+    def test_run_show_plan(self):
+        exitcode = tldp.driver.run(['--show-plan', 'Linuxdoc'])
+        self.assertEqual(exitcode, os.EX_OK)
+
+
+class TestDriverStartup(unittest.TestCase):
+
+    def test_no_eager_imports(self):
+        code = ('import sys, tldp.driver; '
+                'print(sorted(set(sys.modules) & '
+                'set(["networkx", "lxml", "asyncio", "sqlite3", '
+                '"multiprocessing", "tldp.hashcache", "tldp.vcs", '
+                '"tldp.snapshot", "tldp.watch", "tldp.daemon", '
+                '"tldp.toolcache"])))')
+        top = opd(opd(opa(tldp.driver.__file__)))
+        env = dict(os.environ, PYTHONPATH=top)
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         env=env)
+        self.assertEqual('[]', output.decode('ascii').strip())
+
+
 class TestDriverShowStatustypes(TestToolsFilesystem):
 
     def test_show_statustypes(self):
@@ -207,6 +258,138 @@ class TestDriverSummary(TestInventoryBase):
             self.assertTrue(name in data)
 
 
+class TestDriverWatch(TestInventoryBase):
+
+    def test_watch_extraargs(self):
+        result = tldp.driver.watch(Namespace(), 'bogus')
+        self.assertTrue('Extra arguments' in result)
+
+    def test_watch_pubdir(self):
+        self.config.pubdir = None
+        result = tldp.driver.watch(self.config)
+        self.assertTrue('Option --pubdir' in result)
+
+    @unittest.skipUnless(HAVE_INOTIFY, "inotify is not available")
+    def test_watch_no_work(self):
+        self.add_published('Frobnitz-HOWTO', random.choice(example.sources))
+        result = tldp.driver.watch(self.config, timeout=0.2)
+        self.assertEqual(os.EX_OK, result)
+
+
+class TestDriverServe(TestInventoryBase):
+
+    def test_serve_extraargs(self):
+        result = tldp.driver.serve(Namespace(), 'bogus')
+        self.assertTrue('Extra arguments' in result)
+
+    def test_answerQuery(self):
+        c = self.config
+        ex = random.choice(example.sources)
+        self.add_published('Published-HOWTO', ex)
+        self.add_new('New-HOWTO', ex)
+        inv = Inventory(c.pubdir, c.sourcedir)
+        reply = tldp.driver.answerQuery(c, inv, dict(action='status'))
+        self.assertEqual(dict(result=os.EX_OK,
+                              status={'Published-HOWTO': 'published',
+                                      'New-HOWTO': 'new'}), reply)
+        reply = tldp.driver.answerQuery(c, inv, dict(action='summary'))
+        self.assertEqual(os.EX_OK, reply['result'])
+        self.assertTrue('New-HOWTO' in reply['output'])
+        request = dict(action='detail', args=['new'], verbose=True)
+        reply = tldp.driver.answerQuery(c, inv, request)
+        self.assertTrue('New-HOWTO' in reply['output'])
+        self.assertFalse('Published-HOWTO' in reply['output'])
+        request = dict(action='detail', args=['Frobnitz-HOWTO'])
+        reply = tldp.driver.answerQuery(c, inv, request)
+        self.assertTrue('Unknown arguments' in reply['result'])
+        reply = tldp.driver.answerQuery(c, inv, dict(action='frobnitz'))
+        self.assertTrue('Unknown request' in reply['result'])
+
+    def test_askServer_no_server(self):
+        c = self.config
+        c.summary = True
+        self.assertIsNone(tldp.driver.askServer(c, []))
+
+
+@unittest.skipIf(GIT is None, "git is not available")
+class TestDriverChanged(TestInventoryBase):
+
+    def setUp(self):
+        super(TestDriverChanged, self).setUp()
+        self.config.vcs = 'git'
+        self.git('init', '-q')
+
+    def git(self, *args):
+        cmd = [GIT, '-c', 'user.name=ldptool', '-c', 'user.email=ldp@tldp',
+               '-c', 'commit.gpgsign=false']
+        cmd.extend(args)
+        return subprocess.check_output(cmd, cwd=self.tempdir)
+
+    def commit(self):
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'frobnitz')
+
+    def test_changed_needs_vcs(self):
+        self.config.vcs = 'none'
+        docs, error = tldp.driver.collectWorkset(self.config, ['changed'])
+        self.assertTrue('--vcs git' in error)
+
+    def test_changed_without_revision(self):
+        ex = random.choice(example.sources)
+        self.add_published('Published-HOWTO', ex)
+        self.add_new('New-HOWTO', ex)
+        docs, error = tldp.driver.collectWorkset(self.config, ['changed'])
+        self.assertEqual(['New-HOWTO'], [x.stem for x in docs])
+
+    def test_changed(self):
+        c = self.config
+        ex = random.choice(example.sources)
+        self.add_published('Published-HOWTO', ex)
+        self.add_published('Changed-HOWTO', ex)
+        self.commit()
+        tldp.driver.recordRevisions(c, [])
+        revisions = readrevisions(c.pubdir)
+        self.assertEqual([opa(c.sourcedir[0])], list(revisions.keys()))
+        docs, error = tldp.driver.collectWorkset(c, ['changed'])
+        self.assertEqual([], docs)
+        # -- committed, uncommitted and untracked changes all count
+        fname = opj(c.sourcedir[0], 'Changed-HOWTO' + ex.ext)
+        with open(fname, 'a') as f:
+            f.write('\n')
+        self.commit()
+        self.add_new('New-HOWTO', ex)
+        docs, error = tldp.driver.collectWorkset(c, ['changed'])
+        self.assertEqual(['Changed-HOWTO', 'New-HOWTO'],
+                         [x.stem for x in docs])
+        tldp.driver.recordRevisions(c, ['changed'])
+        self.assertNotEqual(revisions, readrevisions(c.pubdir))
+
+    def test_changed_names_like_index_sgml(self):
+        c = self.config
+        ex = example.ex_docbooksgml
+        self.add_published('x', ex)
+        self.add_published('Frobnitz-HOWTO', ex)
+        self.commit()
+        tldp.driver.recordRevisions(c, [])
+        # -- a document named like part of 'index.sgml' is not ignored
+        for stem in ('x', 'Frobnitz-HOWTO'):
+            with open(opj(c.sourcedir[0], stem + ex.ext), 'a') as f:
+                f.write('\n')
+        with open(opj(c.sourcedir[0], 'index.sgml'), 'w') as f:
+            f.write('\n')
+        docs, error = tldp.driver.collectWorkset(c, ['changed'])
+        self.assertEqual(['Frobnitz-HOWTO', 'x'], [x.stem for x in docs])
+
+    def test_no_record_after_partial_publish(self):
+        c = self.config
+        self.add_published('Published-HOWTO', random.choice(example.sources))
+        self.commit()
+        tldp.driver.recordRevisions(c, ['Published-HOWTO'])
+        c.skip = ['Published-HOWTO']
+        tldp.driver.recordRevisions(c, [])
+        self.assertEqual(dict(), readrevisions(c.pubdir))
+
+
 class TestcreateBuildDirectory(TestToolsFilesystem):
 
     def test_createBuildDirectory(self):
@@ -232,6 +415,15 @@ class Testbuilddir_setup(TestToolsFilesystem):
         ready, error = tldp.driver.builddir_setup(config)
         self.assertTrue(ready)
 
+    def test_builddir_setup_removed(self):
+        config = Namespace()
+        _, config.pubdir = self.adddir('pubdir')
+        _, config.builddir = self.adddir('builddir')
+        os.rmdir(config.builddir)
+        ready, error = tldp.driver.builddir_setup(config)
+        self.assertTrue(ready)
+        self.assertTrue(os.path.isdir(config.builddir))
+
 
 class TestremoveUnknownDoctypes(TestToolsFilesystem):
 
@@ -290,6 +482,37 @@ class Test_post_publish_cleanup(TestInventoryBase):
         self.assertTrue(os.path.isdir(doc.dtworkingdir))
 
 
+class TestDriverDocbuild(TestInventoryBase):
+
+    def test_buildjobs(self):
+        c = self.config
+        docs = [object()] * 4
+        c.jobs = 2
+        self.assertEqual(2, tldp.driver.buildjobs(c, docs))
+        c.jobs = 16
+        self.assertEqual(4, tldp.driver.buildjobs(c, docs))
+        c.jobs = 0
+        self.assertTrue(tldp.driver.buildjobs(c, docs) >= 1)
+        c.script = True
+        self.assertEqual(1, tldp.driver.buildjobs(c, docs))
+
+    def test_docbuild_parallel_result_shape(self):
+        c = self.config
+        c.build = True
+        c.jobs = 2
+        ex = example.ex_linuxdoc
+        for stem in ('A-HOWTO', 'B-HOWTO', 'C-HOWTO'):
+            self.add_new(stem, ex)
+        inv = tldp.inventory.Inventory(c.pubdir, c.sourcedir)
+        docs = inv.all.values()
+        tldp.driver.prepare_docs_build_mode(c, docs)
+        _, results = tldp.driver.docbuild(c, docs)
+        self.assertEqual(len(docs), len(results))
+        for (result, doc), expected in zip(results, docs):
+            self.assertIs(doc, expected)
+            self.assertIn(result, (True, False))
+
+
 class TestDriverRun(TestInventoryBase):
 
     def test_run(self):
@@ -315,6 +538,20 @@ class TestDriverRun(TestInventoryBase):
         # -- improvement: check for 'No work to do.' from logger
         self.assertEqual(exitcode, os.EX_OK)
 
+    @unittest.skipUnless('blake2b' in hashfunctions, "blake2b unavailable")
+    def test_run_records_hashes_on_publish(self):
+        self.add_published('Published-HOWTO', example.ex_linuxdoc)
+        odoc = OutputDirectory(opj(self.config.pubdir, 'Published-HOWTO'))
+        argv = self.argv + ['--hashalgorithm', 'blake2b']
+        exitcode = tldp.driver.run(argv + ['--list', 'all'])
+        self.assertEqual(exitcode, os.EX_OK)
+        self.assertEqual('md5', odoc.algorithm)
+        exitcode = tldp.driver.run(argv + ['--publish'])
+        self.assertEqual(exitcode, os.EX_OK)
+        self.assertEqual('blake2b', odoc.algorithm)
+        inv = Inventory(self.config.pubdir, self.config.sourcedir)
+        self.assertEqual(['Published-HOWTO'], list(inv.published.keys()))
+
     def test_run_loglevel_resetting(self):
         '''just exercise the loglevel settings'''
         argv = ['--doctypes', '--loglevel', 'debug']
@@ -404,6 +641,22 @@ class TestDriverProcessSkips(TestInventoryBase):
         self.assertEqual(excluded.stem, 'Docbook4XML-HOWTO')
         self.assertEqual(len(inc) + 1, len(inv.all.keys()))
 
+    def test_skipDocuments_collection(self):
+        c = self.config
+        self.add_published('Published-HOWTO', example.ex_linuxdoc)
+        self.add_stale('Stale-HOWTO', example.ex_linuxdoc)
+        self.add_new('Docbook4XML-HOWTO', example.ex_docbook4xml)
+        self.add_orphan('Orphan-HOWTO', example.ex_linuxdoc)
+        c.skip = ['Docbook4XML', 'stale', 'Published-HOWTO']
+        inv = tldp.inventory.Inventory(c.pubdir, c.sourcedir)
+        inc, exc = tldp.driver.processSkips(c, inv.all)
+        self.assertEqual(['Orphan-HOWTO'], [x.stem for x in inc])
+        self.assertEqual(set(['Published-HOWTO', 'Stale-HOWTO',
+                              'Docbook4XML-HOWTO']),
+                         set(x.stem for x in exc))
+        self.assertEqual((inc, exc),
+                         tldp.driver.processSkips(c, inv.all.values()))
+
 
 class TestDriverScript(TestInventoryBase):
 
@@ -0,0 +1,139 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import socket
+import threading
+from argparse import Namespace
+
+from tldptesttools import TestToolsFilesystem
+
+# -- SUT
+from tldp.fopserver import FopServer, fopstep
+
+# -- a stand-in for FopServer.java: answers RENDER requests by copying the
+#    FO file to the PDF file (or with ERROR, if the FO file is empty or the
+#    request names a FOP configuration the server was not started with)
+fakeserver = '''
+import sys, socket, shutil
+listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+listener.bind(sys.argv[1])
+listener.listen(5)
+while True:
+    conn, _ = listener.accept()
+    request = conn.makefile('rb').readline().decode('utf-8').rstrip('\\n')
+    if request:
+        fields = request.split('\\t')
+        fo, pdf, confs = fields[1], fields[2], fields[3:]
+        if set(confs) - set(sys.argv[2:]):
+            conn.sendall(b'ERROR unknown FOP configuration\\n')
+        elif open(fo).read():
+            shutil.copy(fo, pdf)
+            conn.sendall(b'OK\\n')
+        else:
+            conn.sendall(b'ERROR empty FO file\\n')
+    conn.close()
+'''
+
+
+class Frobnitz(object):
+
+    def make_pdf_with_fop(self):
+        pass
+
+
+class TestFopServer(TestToolsFilesystem):
+
+    def setUp(self):
+        super(TestFopServer, self).setUp()
+        self.script = os.path.join(self.tempdir, 'fakeserver.py')
+        with open(self.script, 'w') as f:
+            f.write(fakeserver)
+        self.command = '"%s" "%s"' % (sys.executable, self.script)
+        self.fo = os.path.join(self.tempdir, 'Frobnitz-HOWTO.fo')
+        self.pdf = os.path.join(self.tempdir, 'Frobnitz-HOWTO.pdf')
+        self.config = Namespace(script=False, fopserver=True,
+                                fopserver_command=self.command)
+        self.runner = Namespace(
+            source=Namespace(stem='Frobnitz-HOWTO'),
+            output=Namespace(name_fo=self.fo, name_pdf=self.pdf),
+            config=self.config)
+
+    def test_render(self):
+        with open(self.fo, 'w') as f:
+            f.write('<fo:root/>')
+        server = FopServer.fromconfig(self.config,
+                                      [Namespace(doctype=Frobnitz)])
+        self.assertIsNotNone(server)
+        try:
+            self.assertTrue(fopstep(self.runner))
+            with open(self.pdf) as f:
+                self.assertEqual('<fo:root/>', f.read())
+            with open(self.fo, 'w'):
+                pass
+            self.assertFalse(fopstep(self.runner))
+        finally:
+            server.stop()
+        self.assertFalse(os.path.exists(self.config.fopserver_socket))
+        # -- server gone:  caller falls back to fop
+        self.assertIsNone(fopstep(self.runner))
+
+    def test_render_fopconf(self):
+        conf = os.path.join(self.tempdir, 'fop.xconf')
+        with open(conf, 'w') as f:
+            f.write('<fop version="1.0"/>')
+        with open(self.fo, 'w') as f:
+            f.write('<fo:root/>')
+        self.config.docbook4xml_fopconf = conf
+        server = FopServer.fromconfig(self.config,
+                                      [Namespace(doctype=Frobnitz)])
+        self.assertIsNotNone(server)
+        try:
+            self.assertEqual([conf], server.confs)
+            self.assertTrue(fopstep(self.runner, conf))
+            self.assertTrue(fopstep(self.runner))
+            other = os.path.join(self.tempdir, 'other.xconf')
+            self.assertFalse(fopstep(self.runner, other))
+        finally:
+            server.stop()
+
+    def test_fromconfig_no_fop_doctypes(self):
+        docs = [Namespace(doctype=Namespace)]
+        self.assertIsNone(FopServer.fromconfig(self.config, docs))
+        self.config.script = True
+        self.assertIsNone(FopServer.fromconfig(self.config, docs))
+
+    def test_start_failure(self):
+        server = FopServer('"%s" -c "import sys; sys.exit(1)"'
+                           % (sys.executable,))
+        self.assertFalse(server.start(timeout=10))
+        self.assertIsNone(server.tmpdir)
+        server = FopServer(os.path.join(self.tempdir, 'no-such-java'))
+        self.assertFalse(server.start(timeout=10))
+
+    def test_no_answer(self):
+        path = os.path.join(self.tempdir, 'mute.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(1)
+
+        def mute():
+            conn, _ = listener.accept()
+            conn.close()
+
+        t = threading.Thread(target=mute)
+        t.start()
+        self.config.fopserver_socket = path
+        try:
+            self.assertIsNone(fopstep(self.runner))
+        finally:
+            t.join()
+            listener.close()
+
+#
+# -- end of file
@@ -0,0 +1,117 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import time
+from argparse import Namespace
+
+from tldptesttools import TestToolsFilesystem
+
+# -- SUT
+from tldp.hashcache import Hasher, HashCache, HASHCACHE
+from tldp.utils import md5file, md5files, gitblobfile
+
+
+class TestHashCache(TestToolsFilesystem):
+
+    def setUp(self):
+        super(TestHashCache, self).setUp()
+        self.docdir = os.path.join(self.tempdir, 'docs')
+        os.mkdir(self.docdir)
+        self.dbname = os.path.join(self.tempdir, HASHCACHE)
+
+    def writefile(self, content, name='Frobnitz-HOWTO.xml'):
+        fname = os.path.join(self.docdir, name)
+        with open(fname, 'w') as f:
+            f.write(content)
+        # -- pretend the file was written long ago (not racily clean)
+        then = time.time() - 3600
+        os.utime(fname, (then, then))
+        return fname
+
+    def test_hit_after_miss(self):
+        fname = self.writefile('frobnitz')
+        hc = HashCache(self.dbname)
+        self.assertEqual(md5file(fname), hc.hashfile(fname))
+        self.assertEqual((0, 1), (hc.hits, hc.misses))
+        self.assertEqual(md5file(fname), hc.hashfile(fname))
+        self.assertEqual((1, 1), (hc.hits, hc.misses))
+
+    def test_modification_detected(self):
+        fname = self.writefile('frobnitz')
+        hc = HashCache(self.dbname)
+        hc.hashfile(fname)
+        self.writefile('wascally wabbit')
+        self.assertEqual(md5file(fname), hc.hashfile(fname))
+        self.assertEqual(2, hc.misses)
+
+    def test_racy_file_not_stored(self):
+        fname = self.writefile('frobnitz')
+        os.utime(fname, None)
+        hc = HashCache(self.dbname)
+        hc.hashfile(fname)
+        hc.hashfile(fname)
+        self.assertEqual((0, 2), (hc.hits, hc.misses))
+
+    def test_persistence(self):
+        fname = self.writefile('frobnitz')
+        hc = HashCache(self.dbname)
+        hc.hashfile(fname)
+        hc.close()
+        hc = HashCache(self.dbname)
+        self.assertEqual(md5file(fname), hc.hashfile(fname))
+        self.assertEqual((1, 0), (hc.hits, hc.misses))
+
+    def test_missing_file(self):
+        hc = HashCache(self.dbname)
+        self.assertIsNone(hc.hashfile(os.path.join(self.tempdir, 'nope')))
+
+    def test_md5files_hasher(self):
+        self.writefile('frobnitz', name='a.xml')
+        self.writefile('wabbit', name='b.xml')
+        expected = md5files(self.docdir, relative=self.docdir)
+        hc = HashCache(self.dbname)
+        md5files(self.docdir, relative=self.docdir, hasher=hc)
+        found = md5files(self.docdir, relative=self.docdir, hasher=hc)
+        self.assertEqual(2, hc.hits)
+        self.assertEqual(expected, found)
+
+    def test_algorithms_kept_apart(self):
+        fname = self.writefile('frobnitz')
+        HashCache(self.dbname).hashfile(fname)
+        hc = HashCache(self.dbname, algorithm='gitblob')
+        self.assertEqual(gitblobfile(fname), hc.hashfile(fname))
+        self.assertEqual((0, 1), (hc.hits, hc.misses))
+
+    def test_hashfiles(self):
+        names = [self.writefile(str(x), name='%d.xml' % (x,))
+                 for x in range(10)]
+        hc = HashCache(self.dbname)
+        hc.hashfile(names[3])
+        missing = os.path.join(self.docdir, 'missing.xml')
+        found = hc.hashfiles(names + [missing])
+        self.assertEqual([md5file(x) for x in names] + [None], found)
+        self.assertEqual((1, 10), (hc.hits, hc.misses))
+
+    def test_hasher(self):
+        fname = self.writefile('frobnitz')
+        hasher = Hasher.fromconfig(Namespace(hashalgorithm='bogus'))
+        self.assertEqual('md5', hasher.algorithm)
+        self.assertEqual(md5file(fname), hasher.hashfile(fname))
+        self.assertIsNone(hasher.hashfile(fname + '-ENOENT'))
+
+    def test_fromconfig(self):
+        cachedir = os.path.join(self.tempdir, 'cache')
+        config = Namespace(hashcache=False, cachedir=cachedir)
+        self.assertIsNone(HashCache.fromconfig(config))
+        config.hashcache = True
+        hc = HashCache.fromconfig(config)
+        self.assertIsInstance(hc, HashCache)
+        self.assertTrue(os.path.isfile(os.path.join(cachedir, HASHCACHE)))
+
+#
+# -- end of file
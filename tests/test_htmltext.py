@@ -0,0 +1,118 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import codecs
+import unittest
+from argparse import Namespace
+
+from tldptesttools import TestToolsFilesystem
+
+# -- SUT
+import tldp.doctypes.htmltext as htmltext
+import tldp.doctypes.xmltools as xmltools
+
+page = '''<html><head><meta http-equiv="Content-Type"
+  content="text/html; charset=iso-8859-1"><title>Frobnitz</title>
+<style>p { color: red }</style></head>
+<body>
+<h1>The Frobnitz
+  HOWTO</h1>
+<p>Frobnitzes are not wabbits.&nbsp;Caf&eacute; &#169; &#x41;.</p>
+<ul><li>first</li><li>second
+  <ol><li>nested</li></ol></li></ul>
+<pre>  $ frobnitz --all
+  done</pre>
+<hr>
+<dl><dt>term</dt><dd>definition</dd></dl>
+<p>Wabbit<br>season</p>
+</body></html>
+'''
+
+expected = '''The Frobnitz HOWTO
+
+Frobnitzes are not wabbits. Caf\xe9 \xa9 A.
+
+  * first
+  * second
+      1. nested
+
+  $ frobnitz --all
+  done
+
+===============================================================================
+
+term
+    definition
+
+Wabbit
+season
+'''
+
+
+class TestHTMLText(TestToolsFilesystem):
+
+    def convert(self, html, width=htmltext.WIDTH):
+        out = io.StringIO()
+        conv = htmltext.HTMLText(out, width=width)
+        conv.feed(html)
+        conv.close()
+        return out.getvalue()
+
+    def test_layout(self):
+        self.assertEqual(expected, self.convert(page))
+
+    def test_fill(self):
+        words = ' '.join(['wabbit'] * 30)
+        lines = self.convert('<p>' + words + '</p>').splitlines()
+        self.assertTrue(all(len(x) <= htmltext.WIDTH for x in lines))
+        self.assertEqual(words, ' '.join(lines))
+
+    def test_file_charset_streaming(self):
+        fname = os.path.join(self.tempdir, 'Frobnitz-HOWTO.html')
+        with codecs.open(fname, 'w', encoding='iso-8859-1') as f:
+            f.write(page.replace('Caf&eacute;', 'Caf\xe9'))
+        out = io.StringIO()
+        chunksize = htmltext.CHUNKSIZE
+        try:
+            htmltext.CHUNKSIZE = 7
+            htmltext.filetotext(fname, out)
+        finally:
+            htmltext.CHUNKSIZE = chunksize
+        self.assertEqual(expected, out.getvalue())
+
+    @unittest.skipUnless(xmltools.available(), "lxml is not installed")
+    def test_tree(self):
+        from lxml import etree
+        xhtml = page.replace('<hr>', '<hr/>').replace('<br>', '<br/>')
+        xhtml = xhtml.replace('charset=iso-8859-1">', 'charset=utf-8"/>')
+        xhtml = xhtml.replace('&nbsp;', '&#160;').replace('&eacute;', '\xe9')
+        xhtml = xhtml.replace('<html>',
+                              '<html xmlns="http://www.w3.org/1999/xhtml">')
+        tree = etree.ElementTree(etree.fromstring(xhtml.encode('utf-8')))
+        out = io.StringIO()
+        htmltext.treetotext(tree, out)
+        self.assertEqual(expected, out.getvalue())
+
+    def test_textstep(self):
+        dirname = os.path.join(self.tempdir, 'Frobnitz-HOWTO')
+        os.mkdir(dirname)
+        output = Namespace(dirname=dirname,
+                           name_htmls=os.path.join(dirname, 'a.html'),
+                           name_txt=os.path.join(dirname, 'a.txt'))
+        with open(output.name_htmls, 'w') as f:
+            f.write('<p>Frobnitz</p>')
+        runner = Namespace(source=Namespace(stem='Frobnitz-HOWTO'),
+                           output=output, config=Namespace(script=False))
+        self.assertIsNone(htmltext.textstep(runner, 'html2text'))
+        self.assertTrue(htmltext.textstep(runner, 'builtin'))
+        with codecs.open(output.name_txt, encoding='utf-8') as f:
+            self.assertEqual('Frobnitz\n', f.read())
+
+#
+# -- end of file
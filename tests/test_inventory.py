@@ -5,7 +5,7 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
-
+import os
 import random
 
 from tldptesttools import TestInventoryBase
@@ -98,5 +98,71 @@ class TestInventoryUsage(TestInventoryBase):
         self.assertEqual(0, len(i.orphan))
         self.assertEqual(1, len(i.broken))
 
+    def test_update(self):
+        c = self.config
+        ex = random.choice(example.sources)
+        self.add_new('Frobnitz-New-HOWTO', ex)
+        self.add_published('Frobnitz-Published-HOWTO', ex)
+        i = Inventory(c.pubdir, c.sourcedir)
+        self.assertEqual(1, len(i.new))
+        # -- publish the new one, remove the source of the published one,
+        #    and add another
+        self.add_published('Frobnitz-New-HOWTO', ex)
+        for fname in os.listdir(c.sourcedir[0]):
+            if fname.startswith('Frobnitz-Published-HOWTO'):
+                os.unlink(os.path.join(c.sourcedir[0], fname))
+        self.add_new('Frobnitz-Other-HOWTO', ex)
+        i.update(['Frobnitz-New-HOWTO', 'Frobnitz-Published-HOWTO'])
+        self.assertEqual(['Frobnitz-New-HOWTO'], i.published.keys())
+        self.assertEqual(['Frobnitz-Published-HOWTO'], i.orphan.keys())
+        self.assertEqual(0, len(i.new))
+        self.assertFalse('Frobnitz-Published-HOWTO' in i.source)
+        i.update(['Frobnitz-Other-HOWTO'])
+        self.assertEqual(['Frobnitz-Other-HOWTO'], i.new.keys())
+
+    def test_classify_in_place(self):
+        c = self.config
+        ex = random.choice(example.sources)
+        self.add_published('Frobnitz-Published-HOWTO', ex)
+        i = Inventory(c.pubdir, c.sourcedir)
+        stem = 'Frobnitz-Published-HOWTO'
+        self.assertIs(i.source[stem], i.published[stem])
+        self.assertIs(i.output[stem], i.published[stem].output)
+
+    def test_check_lazily(self):
+        c = self.config
+        ex = random.choice(example.sources)
+        self.add_stale('Frobnitz-Stale-HOWTO', ex)
+        self.add_broken('Frobnitz-Broken-HOWTO', ex)
+        i = Inventory(c.pubdir, c.sourcedir)
+        self.assertEqual(2, len(i.unchecked))
+        self.assertEqual(0, len(i.new))
+        self.assertEqual(2, len(i.unchecked))
+        self.assertEqual(['Frobnitz-Stale-HOWTO'], i.stale.keys())
+        self.assertEqual(0, len(i.unchecked))
+        self.assertEqual(['Frobnitz-Broken-HOWTO'], i.broken.keys())
+
+    def test_sources_are_checked(self):
+        c = self.config
+        ex = random.choice(example.sources)
+        self.add_stale('Frobnitz-Stale-HOWTO', ex)
+        i = Inventory(c.pubdir, c.sourcedir)
+        stem = 'Frobnitz-Stale-HOWTO'
+        self.assertEqual('stale', i.sources[stem].status)
+        i = Inventory(c.pubdir, c.sourcedir)
+        self.assertEqual('stale', i.outputs[stem].status)
+
+    def test_status_class_views(self):
+        c = self.config
+        ex = random.choice(example.sources)
+        self.add_new('Frobnitz-New-HOWTO', ex)
+        i = Inventory(c.pubdir, c.sourcedir)
+        self.assertIs(i.work, i.work)
+        self.assertEqual(['Frobnitz-New-HOWTO'], i.work.keys())
+        self.add_published('Frobnitz-New-HOWTO', ex)
+        i.update(['Frobnitz-New-HOWTO'])
+        self.assertEqual(0, len(i.work))
+        self.assertEqual(['Frobnitz-New-HOWTO'], i.all.keys())
+
 #
 # -- end of file
@@ -0,0 +1,138 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import time
+import random
+
+from tldptesttools import TestInventoryBase
+
+# -- Test Data
+import example
+
+# -- SUT
+from tldp.inventory import Inventory
+from tldp.snapshot import InventorySnapshot
+
+
+class TestInventorySnapshot(TestInventoryBase):
+
+    def setUp(self):
+        super(TestInventorySnapshot, self).setUp()
+        self.config.snapshot = True
+        self.config.rescan = False
+
+    def age(self):
+        '''pretend everything was written long ago (not racily clean)'''
+        then = time.time() - 3600
+        for root, dirs, files in os.walk(self.tempdir):
+            for name in dirs + files:
+                os.utime(os.path.join(root, name), (then, then))
+
+    def inventory(self):
+        c = self.config
+        snapshot = InventorySnapshot.fromconfig(c)
+        inv = Inventory(c.pubdir, c.sourcedir, snapshot=snapshot)
+        snapshot.save()
+        return inv, snapshot
+
+    def populate(self):
+        ex = random.choice(example.sources)
+        self.add_published('Published-HOWTO', ex)
+        self.add_new('New-HOWTO', ex)
+        self.add_orphan('Orphan-HOWTO', ex)
+        self.add_broken('Broken-HOWTO', ex)
+        self.age()
+        return ex
+
+    def test_reuse(self):
+        self.populate()
+        first, snapshot = self.inventory()
+        self.assertEqual((0, 6), (snapshot.hits, snapshot.misses))
+        second, snapshot = self.inventory()
+        self.assertEqual((6, 0), (snapshot.hits, snapshot.misses))
+        for status in ('published', 'new', 'orphan', 'broken', 'stale'):
+            self.assertEqual(getattr(first, status).keys(),
+                             getattr(second, status).keys())
+        self.assertTrue(second.broken['Broken-HOWTO'].output.missing)
+
+    def test_saved_entries_reused_in_process(self):
+        ex = self.populate()
+        c = self.config
+        snapshot = InventorySnapshot.fromconfig(c)
+        Inventory(c.pubdir, c.sourcedir, snapshot=snapshot)
+        snapshot.save()
+        os.unlink(snapshot.fname)
+        fname = os.path.join(c.sourcedir[0], 'Published-HOWTO' + ex.ext)
+        with open(fname, 'a') as f:
+            f.write('\n')
+        snapshot.hits = snapshot.misses = 0
+        inv = Inventory(c.pubdir, c.sourcedir, snapshot=snapshot)
+        self.assertEqual((5, 1), (snapshot.hits, snapshot.misses))
+        self.assertTrue('Published-HOWTO' in inv.stale)
+
+    def test_changed_source_is_rescanned(self):
+        ex = self.populate()
+        self.inventory()
+        c = self.config
+        fname = os.path.join(c.sourcedir[0], 'Published-HOWTO' + ex.ext)
+        with open(fname, 'a') as f:
+            f.write('\n')
+        inv, snapshot = self.inventory()
+        self.assertEqual((5, 1), (snapshot.hits, snapshot.misses))
+        self.assertTrue('Published-HOWTO' in inv.stale)
+
+    def test_changed_output_is_rescanned(self):
+        self.populate()
+        self.inventory()
+        c = self.config
+        os.unlink(os.path.join(c.pubdir, 'Published-HOWTO', 'index.html'))
+        inv, snapshot = self.inventory()
+        self.assertEqual((5, 1), (snapshot.hits, snapshot.misses))
+        self.assertTrue('Published-HOWTO' in inv.broken)
+
+    def test_removed_document_is_dropped(self):
+        self.populate()
+        self.inventory()
+        c = self.config
+        for fname in os.listdir(c.sourcedir[0]):
+            if fname.startswith('New-HOWTO'):
+                os.unlink(os.path.join(c.sourcedir[0], fname))
+        inv, snapshot = self.inventory()
+        self.assertFalse('New-HOWTO' in inv.source)
+        self.assertEqual(5, len(snapshot.seen['sources']) +
+                         len(snapshot.seen['outputs']))
+
+    def test_racy_entries_not_saved(self):
+        ex = random.choice(example.sources)
+        self.add_published('Published-HOWTO', ex)
+        self.inventory()
+        _, snapshot = self.inventory()
+        self.assertEqual((0, 2), (snapshot.hits, snapshot.misses))
+
+    def test_rescan(self):
+        self.populate()
+        self.inventory()
+        self.config.rescan = True
+        _, snapshot = self.inventory()
+        self.assertEqual((0, 6), (snapshot.hits, snapshot.misses))
+
+    def test_unreadable_snapshot(self):
+        self.populate()
+        _, snapshot = self.inventory()
+        with open(snapshot.fname, 'wb') as f:
+            f.write(b'frobnitz')
+        inv, snapshot = self.inventory()
+        self.assertEqual((0, 6), (snapshot.hits, snapshot.misses))
+        self.assertTrue('Published-HOWTO' in inv.published)
+
+    def test_fromconfig_disabled(self):
+        self.config.snapshot = False
+        self.assertIsNone(InventorySnapshot.fromconfig(self.config))
+
+#
+# -- end of file
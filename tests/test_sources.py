@@ -7,6 +7,7 @@ from __future__ import unicode_literals
 
 import os
 import errno
+import pickle
 import random
 import unittest
 from argparse import Namespace
@@ -99,6 +100,24 @@ class TestNullSourceCollection(TestToolsFilesystem):
         self.assertIsInstance(s, SourceCollection)
         self.assertTrue('docs' in str(s))
 
+    def test_SourceCollection_sorted_and_indexed(self):
+        s = SourceCollection()
+        for stem, status in (('b', 'new'), ('A', 'stale'), ('c', 'new')):
+            s[stem] = Namespace(stem=stem, status=status)
+        self.assertEqual(['A', 'b', 'c'], s.keys())
+        s.keys().pop()
+        self.assertEqual(['A', 'b', 'c'], list(s.iterkeys()))
+        self.assertEqual(['A', 'b', 'c'], [k for k, _ in s.iteritems()])
+        self.assertEqual(['b', 'c'], s.index('status')['new'])
+        selected = s.select('status', ['stale', 'new'])
+        self.assertEqual(['A', 'b', 'c'], [x.stem for x in selected])
+        del s['b']
+        self.assertEqual(['c'], s.index('status')['new'])
+        s['c'].status = 'stale'
+        s.invalidate()
+        self.assertEqual(['A', 'c'], s.index('status')['stale'])
+        self.assertFalse('new' in s.index('status'))
+
 
 class TestInvalidSourceCollection(TestToolsFilesystem):
 
@@ -153,6 +172,16 @@ class TestSourceDocument(TestToolsFilesystem):
             self.assertTrue(fn in str(doc))
             self.assertTrue(fn in doc.md5sums)
 
+    def test_pickle(self):
+        ex = example.ex_linuxdoc_dir
+        doc = SourceDocument(os.path.dirname(ex.filename))
+        doc.working = 'frobnitz'
+        copy = pickle.loads(pickle.dumps(doc, 2))
+        for attr in ('filename', 'dirname', 'basename', 'stem', 'ext',
+                     'doctype', 'status', 'md5sums', 'working'):
+            self.assertEqual(getattr(doc, attr), getattr(copy, attr))
+        self.assertFalse(hasattr(doc, '__dict__'))
+
     def test_fromfifo_should_fail(self):
         fifo = os.path.join(self.tempdir, 'fifofile')
         os.mkfifo(fifo)
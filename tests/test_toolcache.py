@@ -0,0 +1,135 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import stat
+import time
+from argparse import Namespace
+
+from tldptesttools import TestToolsFilesystem
+
+# -- SUT
+from tldp.toolcache import ToolCache, TOOLCACHE, toolversion
+from tldp.cascadingconfig import LazyDefault, LazyNamespace
+from tldp.utils import which, isexecutable, isreadablefile
+
+
+class Frobnitz(object):
+    required = {'frobnitz_wabbit': isexecutable,
+                'frobnitz_xsl': isreadablefile,
+                'frobnitz_missing': isexecutable,
+                }
+
+
+class TestToolCache(TestToolsFilesystem):
+
+    def setUp(self):
+        super(TestToolCache, self).setUp()
+        self.bindir = os.path.join(self.tempdir, 'bin')
+        os.mkdir(self.bindir)
+        self.fname = os.path.join(self.tempdir, TOOLCACHE)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = os.pathsep.join((self.bindir, self.path))
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        super(TestToolCache, self).tearDown()
+
+    def addtool(self, name, version):
+        fname = os.path.join(self.bindir, name)
+        with open(fname, 'w') as f:
+            f.write('#! /bin/sh\necho\necho "%s $1"\n' % (version,))
+        os.chmod(fname, stat.S_IRWXU)
+        return fname
+
+    def age(self, fname):
+        then = time.time() - 3600
+        os.utime(fname, (then, then))
+
+    def test_toolversion(self):
+        wabbit = self.addtool('wabbit', 'wabbit 1.0')
+        self.assertEqual('wabbit 1.0 --version', toolversion(wabbit))
+        fop = self.addtool('fop', 'FOP Version 2.1')
+        self.assertEqual('FOP Version 2.1 -version', toolversion(fop))
+        self.assertIsNone(toolversion(os.path.join(self.bindir, 'gone')))
+
+    def test_which(self):
+        wabbit = self.addtool('wabbit', 'wabbit 1.0')
+        self.age(self.bindir)
+        tools = ToolCache(self.fname)
+        self.assertEqual(wabbit, tools.which('wabbit'))
+        self.assertIsNone(tools.which('hasenpfeffer'))
+        self.assertEqual(wabbit, tools.which(wabbit))
+        tools.close()
+        tools = ToolCache(self.fname)
+        self.assertEqual(wabbit, tools.which('wabbit'))
+        self.assertIsNone(tools.which('hasenpfeffer'))
+        self.assertEqual((2, 0), (tools.hits, tools.misses))
+
+    def test_which_path_changed(self):
+        self.age(self.bindir)
+        tools = ToolCache(self.fname)
+        self.assertIsNone(tools.which('hasenpfeffer'))
+        tools.close()
+        # -- installing a program changes the mtime of its directory
+        hasenpfeffer = self.addtool('hasenpfeffer', 'hasenpfeffer 2')
+        tools = ToolCache(self.fname)
+        self.assertEqual(hasenpfeffer, tools.which('hasenpfeffer'))
+        self.assertEqual((0, 1), (tools.hits, tools.misses))
+
+    def test_version(self):
+        wabbit = self.addtool('wabbit', 'wabbit 1.0')
+        self.age(wabbit)
+        tools = ToolCache(self.fname)
+        self.assertEqual('wabbit 1.0 --version', tools.version(wabbit))
+        tools.close()
+        tools = ToolCache(self.fname)
+        self.assertEqual('wabbit 1.0 --version', tools.version(wabbit))
+        self.assertEqual((1, 0), (tools.hits, tools.misses))
+        self.addtool('wabbit', 'wabbit 1.1')
+        self.assertEqual('wabbit 1.1 --version', tools.version(wabbit))
+
+    def test_unreadable(self):
+        with open(self.fname, 'w') as f:
+            f.write('{frobnitz')
+        tools = ToolCache(self.fname)
+        self.assertIsNone(tools.which('hasenpfeffer'))
+        self.assertTrue(tools.save())
+
+    def test_configure(self):
+        wabbit = self.addtool('wabbit', 'wabbit 1.0')
+        xsl = os.path.join(self.tempdir, 'frobnitz.xsl')
+        with open(xsl, 'w') as f:
+            f.write('<xsl/>')
+        config = LazyNamespace(
+            frobnitz_wabbit=LazyDefault(which, 'wabbit'),
+            frobnitz_xsl=LazyDefault(os.path.join, self.tempdir,
+                                     'frobnitz.xsl'),
+            frobnitz_missing=LazyDefault(which, 'hasenpfeffer'))
+        tools = ToolCache()
+        tools.configure(config, [Frobnitz])
+        self.assertEqual(wabbit, vars(config)['frobnitz_wabbit'])
+        self.assertEqual(xsl, vars(config)['frobnitz_xsl'])
+        self.assertIsNone(vars(config)['frobnitz_missing'])
+        self.assertEqual(set(['frobnitz_wabbit', 'frobnitz_xsl']),
+                         config.toolschecked)
+        self.assertEqual(dict(), config.toolversions)
+        tools.configure(config, [Frobnitz], versions=True)
+        self.assertEqual({wabbit: 'wabbit 1.0 --version'},
+                         config.toolversions)
+
+    def test_fromconfig(self):
+        config = Namespace(toolcache=True, cachedir=self.tempdir)
+        self.assertEqual(self.fname, ToolCache.fromconfig(config).fname)
+        config.toolcache = False
+        tools = ToolCache.fromconfig(config)
+        self.assertIsNone(tools.fname)
+        self.assertTrue(tools.save())
+        self.assertFalse(os.path.exists(self.fname))
+
+#
+# -- end of file
@@ -10,6 +10,8 @@ import stat
 import uuid
 import errno
 import posix
+import pickle
+import hashlib
 import unittest
 from tempfile import mkdtemp
 from tempfile import NamedTemporaryFile as ntf
@@ -17,13 +19,17 @@ from tempfile import NamedTemporaryFile as ntf
 from tldptesttools import TestToolsFilesystem
 
 # -- SUT
-from tldp.utils import which, execute
+from tldp.utils import which, execute, execute_pipeline
 from tldp.utils import statfile, statfiles, stem_and_ext
 from tldp.utils import arg_isexecutable, isexecutable
 from tldp.utils import arg_isreadablefile, isreadablefile
 from tldp.utils import arg_isdirectory, arg_isloglevel
 from tldp.utils import arg_isstr
 from tldp.utils import swapdirs
+from tldp.utils import hashfile, hashmany, hashfunctions, md5file, md5files
+from tldp.utils import writemd5sums, readmd5sums, Digests
+from tldp.utils import scanfiles, fallbackscandir, direntries, fscounts
+from tldp.utils import scandir
 
 
 class Test_isexecutable_and_friends(unittest.TestCase):
@@ -115,6 +121,18 @@ class Test_execute(TestToolsFilesystem):
         devnull.close()
         self.assertEqual(0, result)
 
+    def test_execute_cwd(self):
+        exe = which('pwd')
+        opwd = os.getcwd()
+        rundir = mkdtemp(dir=self.tempdir)
+        with ntf(dir=self.tempdir, mode='w+') as f:
+            result = execute([exe], stdout=f, logdir=self.tempdir, cwd=rundir)
+            f.seek(0)
+            reported = f.read().strip()
+        self.assertEqual(0, result)
+        self.assertTrue(os.path.samefile(rundir, reported))
+        self.assertEqual(opwd, os.getcwd())
+
     def test_execute_returns_nonzero(self):
         exe = which('false')
         result = execute([exe], logdir=self.tempdir)
@@ -136,6 +154,26 @@ class Test_execute(TestToolsFilesystem):
         self.assertTrue('nonexistent' in e.filename)
 
 
+class Test_execute_pipeline(TestToolsFilesystem):
+
+    def test_execute_pipeline_stdout(self):
+        cmds = [[which('printf'), 'frobnitz\\n'], [which('tr'), 'a-z', 'A-Z']]
+        with ntf(dir=self.tempdir, mode='w+') as f:
+            result = execute_pipeline(cmds, stdout=f, logdir=self.tempdir)
+            f.seek(0)
+            self.assertEqual('FROBNITZ\n', f.read())
+        self.assertEqual(0, result)
+
+    def test_execute_pipeline_returns_nonzero(self):
+        cmds = [[which('false')], [which('cat')]]
+        result = execute_pipeline(cmds, logdir=self.tempdir)
+        self.assertEqual(1, result)
+
+    def test_execute_pipeline_single(self):
+        result = execute_pipeline([[which('true')]], logdir=self.tempdir)
+        self.assertEqual(0, result)
+
+
 class Test_which(unittest.TestCase):
 
     def test_good_which_python(self):
@@ -202,6 +240,50 @@ class Test_statfiles(unittest.TestCase):
         self.assertEqual(0, len(statinfo))
 
 
+class Test_scanfiles(TestToolsFilesystem):
+
+    def setUp(self):
+        super(Test_scanfiles, self).setUp()
+        self.files = list()
+        for reldir in ('a', 'a/b', 'c'):
+            _, d = self.adddir(reldir)
+            fname = os.path.join(d, 'frobnitz')
+            with open(fname, 'w'):
+                pass
+            self.files.append(fname)
+        os.symlink(os.path.join(self.tempdir, 'a'),
+                   os.path.join(self.tempdir, 'link'))
+
+    def test_scanfiles(self):
+        found = scanfiles(self.tempdir)
+        self.assertEqual(sorted(self.files), sorted(x for x, _ in found))
+        self.assertEqual([(self.files[0], None)], scanfiles(self.files[0]))
+        self.assertEqual([], scanfiles(self.files[0] + '-ENOENT'))
+
+    def test_statfiles_counts(self):
+        before = fscounts.copy()
+        statinfo = statfiles(self.tempdir)
+        counts = fscounts - before
+        self.assertEqual(3, len(statinfo))
+        # -- one stat() for the top and one per file; one read per directory;
+        #    without os.scandir, an lstat() per entry and a stat() of the link
+        stats = 9 if scandir is fallbackscandir else 4
+        self.assertEqual(dict(stat=stats, scandir=4), dict(counts))
+
+    def test_fallbackscandir(self):
+        native = dict((x.name, x) for x in direntries(self.tempdir))
+        fallback = dict((x.name, x) for x in fallbackscandir(self.tempdir))
+        self.assertEqual(sorted(native), sorted(fallback))
+        for name, entry in native.items():
+            other = fallback[name]
+            self.assertEqual(entry.path, other.path)
+            self.assertEqual(entry.is_dir(), other.is_dir())
+            self.assertEqual(entry.is_file(), other.is_file())
+            self.assertEqual(entry.is_symlink(), other.is_symlink())
+            self.assertEqual(entry.stat(follow_symlinks=False).st_ino,
+                             other.stat(follow_symlinks=False).st_ino)
+
+
 class Test_statfile(TestToolsFilesystem):
 
     def test_statfile_bogustype(self):
@@ -226,6 +308,85 @@ class Test_statfile(TestToolsFilesystem):
         self.assertIsInstance(stbuf, posix.stat_result)
 
 
+class Test_hashfile(TestToolsFilesystem):
+
+    def writefile(self, name, content):
+        fname = os.path.join(self.tempdir, name)
+        with open(fname, 'wb') as f:
+            f.write(content)
+        return fname
+
+    def test_hashfile_chunks(self):
+        content = os.urandom(1024) * 2049  # -- a bit over 2 chunks
+        fname = self.writefile('big', content)
+        self.assertEqual(hashlib.md5(content).hexdigest(), md5file(fname))
+        self.assertEqual(hashlib.sha1(content).hexdigest(),
+                         hashfile(fname, 'sha1'))
+
+    @unittest.skipUnless('blake2b' in hashfunctions, "no blake2b")
+    def test_hashfile_blake2b(self):
+        fname = self.writefile('small', b'frobnitz')
+        self.assertEqual(hashlib.blake2b(b'frobnitz').hexdigest(),
+                         hashfunctions['blake2b'](fname))
+
+    def test_hashmany_keeps_order(self):
+        names = [self.writefile(str(x), str(x).encode('ascii'))
+                 for x in range(20)]
+        self.assertEqual([md5file(x) for x in names], hashmany(names))
+
+    def test_md5files_algorithm(self):
+        self.writefile('a', b'frobnitz')
+        md5s = md5files(self.tempdir, relative=self.tempdir)
+        self.assertEqual(dict(a=hashlib.md5(b'frobnitz').hexdigest()), md5s)
+        gitblobs = md5files(self.tempdir, relative=self.tempdir,
+                            algorithm='gitblob')
+        self.assertNotEqual(md5s, gitblobs)
+
+    def test_readmd5sums(self):
+        fname = os.path.join(self.tempdir, 'MD5SUMS')
+        self.assertEqual(('md5', dict()), readmd5sums(fname))
+        md5s = dict(a='0123', b='4567')
+        writemd5sums(fname, md5s, header='# -- MD5SUMS for Frobnitz')
+        self.assertEqual(('md5', md5s), readmd5sums(fname))
+        writemd5sums(fname, md5s, algorithm='blake2b')
+        self.assertEqual(('blake2b', md5s), readmd5sums(fname))
+
+
+class Test_Digests(unittest.TestCase):
+
+    md5s = {'a.sgml': hashlib.md5(b'a').hexdigest(),
+            'b/b.xml': hashlib.md5(b'b').hexdigest(),
+            'b/images/c.png': hashlib.md5(b'c').hexdigest()}
+
+    def test_mapping(self):
+        d = Digests(self.md5s)
+        self.assertEqual(self.md5s, d)
+        self.assertEqual(d, self.md5s)
+        self.assertEqual(self.md5s, dict(d.items()))
+        self.assertEqual(sorted(self.md5s), sorted(d))
+        self.assertEqual(3 * 16, len(d.packed))
+        self.assertTrue('b/b.xml' in d)
+        self.assertFalse('b.xml' in d)
+        with self.assertRaises(KeyError):
+            d['b/c.png']
+
+    def test_compare(self):
+        d = Digests(self.md5s)
+        self.assertEqual(Digests(self.md5s), d)
+        other = dict(self.md5s, **{'a.sgml': hashlib.md5(b'x').hexdigest()})
+        self.assertNotEqual(other, d)
+        self.assertNotEqual(Digests(other), d)
+        self.assertEqual(Digests(), dict())
+
+    def test_pickle(self):
+        d = Digests(self.md5s)
+        self.assertEqual(d, pickle.loads(pickle.dumps(d, 2)))
+
+    def test_bad_digests(self):
+        with self.assertRaises(ValueError):
+            Digests({'a': '0123', 'b': '012345'})
+
+
 class Test_stem_and_ext(unittest.TestCase):
 
     def test_stem_and_ext_final_slash(self):
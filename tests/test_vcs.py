@@ -0,0 +1,154 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import random
+import shutil
+import unittest
+import subprocess
+from argparse import Namespace
+from tempfile import mkdtemp
+
+from tldptesttools import TestInventoryBase
+
+# -- Test Data
+import example
+
+# -- SUT
+from tldp.inventory import Inventory
+from tldp.sources import SourceDocument
+from tldp.outputs import OutputDirectory
+from tldp.utils import gitblobfile, which, writemd5sums
+from tldp.vcs import GitIndex
+
+GIT = which('git')
+
+
+@unittest.skipIf(GIT is None, "git is not available")
+class TestGitIndex(TestInventoryBase):
+
+    def setUp(self):
+        super(TestGitIndex, self).setUp()
+        self.sourcedir = self.config.sourcedir[0]
+        self.git('init', '-q', self.tempdir)
+
+    def git(self, *args):
+        cmd = [GIT, '-c', 'user.name=ldptool', '-c', 'user.email=ldp@tldp',
+               '-c', 'commit.gpgsign=false']
+        cmd.extend(args)
+        return subprocess.check_output(cmd, cwd=self.sourcedir)
+
+    def commit(self):
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'frobnitz')
+
+    def write(self, name, content):
+        fname = os.path.join(self.sourcedir, name)
+        with open(fname, 'w') as f:
+            f.write(content)
+        return fname
+
+    def test_gitblobfile(self):
+        fname = self.write('a.txt', 'frobnitz\n')
+        blob = self.git('hash-object', fname).decode('ascii').strip()
+        self.assertEqual(blob, gitblobfile(fname))
+
+    def test_hashfile(self):
+        tracked = self.write('a.txt', 'frobnitz\n')
+        changed = self.write('b.txt', 'wascally\n')
+        self.commit()
+        self.write('b.txt', 'wabbit\n')
+        untracked = self.write('c.txt', 'hasenpfeffer\n')
+        hasher = GitIndex(GIT)
+        for fname in (tracked, changed, untracked):
+            self.assertEqual(gitblobfile(fname), hasher.hashfile(fname))
+        self.assertEqual((1, 2), (hasher.hits, hasher.misses))
+        self.assertIsNone(hasher.hashfile(os.path.join(self.sourcedir, 'd')))
+
+    def test_sync_rereads_index(self):
+        fname = self.write('a.txt', 'frobnitz\n')
+        self.commit()
+        hasher = GitIndex(GIT)
+        hasher.hashfile(fname)
+        self.write('a.txt', 'wabbit\n')
+        hasher.sync()
+        self.assertEqual(gitblobfile(fname), hasher.hashfile(fname))
+
+    def test_not_a_repository(self):
+        dirname = mkdtemp(prefix='tldp-test-')
+        self.addCleanup(shutil.rmtree, dirname)
+        fname = os.path.join(dirname, 'a.txt')
+        with open(fname, 'w') as f:
+            f.write('frobnitz\n')
+        hasher = GitIndex(GIT)
+        self.assertEqual(gitblobfile(fname), hasher.hashfile(fname))
+        self.assertEqual((0, 1), (hasher.hits, hasher.misses))
+
+    def test_published_with_md5(self):
+        ex = random.choice(example.sources)
+        self.add_published('Published-HOWTO', ex)
+        self.add_stale('Stale-HOWTO', ex)
+        self.commit()
+        c = self.config
+        inv = Inventory(c.pubdir, c.sourcedir, hasher=GitIndex(GIT))
+        self.assertTrue('Published-HOWTO' in inv.published)
+        self.assertFalse('Published-HOWTO' in inv.stale)
+        self.assertTrue('Stale-HOWTO' in inv.stale)
+
+    def test_published_with_md5_rehashed_once(self):
+        ex = random.choice(example.sources)
+        self.add_published('Published-HOWTO', ex)
+        self.commit()
+        c = self.config
+        inv = Inventory(c.pubdir, c.sourcedir, hasher=GitIndex(GIT))
+        self.assertTrue('Published-HOWTO' in inv.published)
+        sdoc = inv.published['Published-HOWTO']
+        self.assertTrue('md5' in sdoc.rehashed)
+        # -- classifying the documents writes nothing into the pubdir
+        self.assertEqual('md5', sdoc.output.algorithm)
+        self.assertEqual(1, inv.recordhashes())
+        self.assertEqual('gitblob', sdoc.output.algorithm)
+        self.assertEqual(0, inv.recordhashes())
+        # -- the second run reads neither the sources nor the files
+        hasher = GitIndex(GIT)
+        inv = Inventory(c.pubdir, c.sourcedir, hasher=hasher)
+        self.assertTrue('Published-HOWTO' in inv.published)
+        self.assertIsNone(inv.published['Published-HOWTO'].rehashed)
+        self.assertEqual(0, hasher.misses)
+
+    def test_published_with_gitblob(self):
+        ex = random.choice(example.sources)
+        self.add_new('Published-HOWTO', ex)
+        self.commit()
+        c = self.config
+        hasher = GitIndex(GIT)
+        sdoc = SourceDocument(os.path.join(self.sourcedir,
+                                           'Published-HOWTO' + ex.ext),
+                              hasher=hasher)
+        self.assertEqual('gitblob', sdoc.algorithm)
+        odoc = OutputDirectory(os.path.join(c.pubdir, 'Published-HOWTO'))
+        os.mkdir(odoc.dirname)
+        writemd5sums(odoc.MD5SUMS, sdoc.md5sums, algorithm=sdoc.algorithm)
+        self.assertEqual('gitblob', odoc.algorithm)
+        self.assertEqual(sdoc.md5sums, odoc.md5sums)
+        inv = Inventory(c.pubdir, c.sourcedir, hasher=GitIndex(GIT))
+        self.assertFalse('Published-HOWTO' in inv.stale)
+        # -- and without --vcs git, the sources are rehashed to compare
+        inv = Inventory(c.pubdir, c.sourcedir)
+        self.assertFalse('Published-HOWTO' in inv.stale)
+        with open(sdoc.filename, 'a') as f:
+            f.write('\n')
+        inv = Inventory(c.pubdir, c.sourcedir, hasher=GitIndex(GIT))
+        self.assertTrue('Published-HOWTO' in inv.stale)
+
+    def test_fromconfig(self):
+        self.assertIsNone(GitIndex.fromconfig(Namespace(vcs='none')))
+        self.assertIsInstance(GitIndex.fromconfig(Namespace(vcs='git')),
+                              GitIndex)
+
+#
+# -- end of file
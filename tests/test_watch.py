@@ -0,0 +1,87 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import unittest
+
+from tldptesttools import TestToolsFilesystem
+
+# -- SUT
+from tldp.watch import SourceWatcher, libc, entrystem
+
+try:
+    libc()
+    HAVE_INOTIFY = True
+except OSError:
+    HAVE_INOTIFY = False
+
+
+class Test_entrystem(unittest.TestCase):
+
+    def test_entrystem(self):
+        self.assertEqual('Frobnitz-HOWTO', entrystem('Frobnitz-HOWTO.xml',
+                                                     False))
+        self.assertEqual('Frobnitz.HOWTO', entrystem('Frobnitz.HOWTO', True))
+
+
+@unittest.skipUnless(HAVE_INOTIFY, "inotify is not available")
+class TestSourceWatcher(TestToolsFilesystem):
+
+    def setUp(self):
+        super(TestSourceWatcher, self).setUp()
+        _, self.sourcedir = self.adddir('sources')
+        _, self.docdir = self.adddir('sources/Frobnitz-HOWTO/images')
+        self.docdir = os.path.dirname(self.docdir)
+        self.watcher = SourceWatcher([self.sourcedir])
+
+    def tearDown(self):
+        self.watcher.close()
+        super(TestSourceWatcher, self).tearDown()
+
+    def write(self, *names):
+        with open(os.path.join(self.sourcedir, *names), 'w') as f:
+            f.write('frobnitz')
+
+    def test_nothing_changed(self):
+        self.assertEqual(set(), self.watcher.wait(0.1, timeout=0.1))
+
+    def test_file_document(self):
+        self.write('Wascally-Wabbit-HOWTO.sgml')
+        stems = self.watcher.wait(0.1, timeout=5)
+        self.assertEqual(set(['Wascally-Wabbit-HOWTO']), stems)
+
+    def test_directory_document(self):
+        self.write('Frobnitz-HOWTO', 'images', 'logo.png')
+        self.write('Frobnitz-HOWTO', 'Frobnitz-HOWTO.xml')
+        stems = self.watcher.wait(0.1, timeout=5)
+        self.assertEqual(set(['Frobnitz-HOWTO']), stems)
+        shutil.rmtree(self.docdir)
+        stems = self.watcher.wait(0.1, timeout=5)
+        self.assertEqual(set(['Frobnitz-HOWTO']), stems)
+
+    def test_new_directory_is_watched(self):
+        os.mkdir(os.path.join(self.sourcedir, 'Wascally-Wabbit-HOWTO'))
+        self.assertEqual(set(['Wascally-Wabbit-HOWTO']),
+                         self.watcher.wait(0.1, timeout=5))
+        self.write('Wascally-Wabbit-HOWTO', 'Wascally-Wabbit-HOWTO.xml')
+        self.assertEqual(set(['Wascally-Wabbit-HOWTO']),
+                         self.watcher.wait(0.1, timeout=5))
+
+    def test_index_sgml_ignored(self):
+        self.write('Frobnitz-HOWTO', 'index.sgml')
+        self.write('index.sgml')
+        self.assertEqual(set(), self.watcher.wait(0.1, timeout=0.5))
+
+    def test_names_like_index_sgml(self):
+        self.write('x.sgml')
+        self.write('Frobnitz-HOWTO', 'sgml')
+        self.assertEqual(set(['x', 'Frobnitz-HOWTO']),
+                         self.watcher.wait(0.1, timeout=5))
+
+#
+# -- end of file
@@ -0,0 +1,189 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import unittest
+from argparse import Namespace
+
+from tldptesttools import TestToolsFilesystem
+
+# -- SUT
+import tldp.doctypes.xmltools as xmltools
+
+greeting = '''<?xml version="1.0"?>
+<xsl:stylesheet version="1.0"
+    xmlns:xsl="http://www.w3.org/1999/XSL/Transform"
+    xmlns:exsl="http://exslt.org/common"
+    extension-element-prefixes="exsl">
+  <xsl:output method="text"/>
+  <xsl:param name="salutation" select="'Hello'"/>
+  <xsl:param name="base.dir" select="''"/>
+  <xsl:template match="/">
+    <xsl:value-of select="concat($salutation, ', ', /doc/name)"/>
+    <exsl:document href="{concat($base.dir, 'chunk.txt')}" method="text">
+      <xsl:value-of select="/doc/name"/>
+    </exsl:document>
+  </xsl:template>
+</xsl:stylesheet>
+'''
+
+
+@unittest.skipUnless(xmltools.available(), "lxml is not installed")
+class TestXsltransform(TestToolsFilesystem):
+
+    def setUp(self):
+        super(TestXsltransform, self).setUp()
+        self.xsl = os.path.join(self.tempdir, 'greeting.xsl')
+        with open(self.xsl, 'w') as f:
+            f.write(greeting)
+        self.doc = os.path.join(self.tempdir, 'doc.xml')
+        with open(self.doc, 'w') as f:
+            f.write('<doc><name>Frobnitz</name></doc>')
+        dirname = os.path.join(self.tempdir, 'Frobnitz-HOWTO')
+        os.mkdir(dirname)
+        self.runner = Namespace(
+            source=Namespace(stem='Frobnitz-HOWTO'),
+            output=Namespace(dirname=dirname),
+            config=Namespace(script=False))
+        self.result = os.path.join(dirname, 'result.txt')
+
+    def read(self, fname):
+        with open(fname) as f:
+            return f.read()
+
+    def test_transform_with_params(self):
+        params = {'salutation': 'Howdy'}
+        self.assertTrue(xmltools.xsltransform(self.runner, self.xsl, self.doc,
+                                              output=self.result,
+                                              params=params))
+        self.assertEqual('Howdy, Frobnitz', self.read(self.result))
+
+    def test_base_dir_is_output_dir(self):
+        self.assertTrue(xmltools.xsltransform(self.runner, self.xsl, self.doc))
+        chunk = os.path.join(self.runner.output.dirname, 'chunk.txt')
+        self.assertEqual('Frobnitz', self.read(chunk))
+
+    def test_stylesheet_compiled_once(self):
+        before = xmltools.stylesheets.compiled
+        for _ in range(3):
+            xmltools.xsltransform(self.runner, self.xsl, self.doc,
+                                  output=self.result)
+        self.assertEqual(1, xmltools.stylesheets.compiled - before)
+
+    def test_xsltstep_fallback(self):
+        missing = os.path.join(self.tempdir, 'missing.xsl')
+        self.assertFalse(xmltools.xsltstep(self.runner, 'lxml', missing,
+                                           self.doc, output=self.result))
+        self.assertFalse(xmltools.xsltstep(self.runner, 'shell', self.xsl,
+                                           self.doc, output=self.result))
+        self.assertFalse(os.path.exists(self.result))
+        self.assertTrue(xmltools.xsltstep(self.runner, 'lxml', self.xsl,
+                                          self.doc, output=self.result))
+
+
+dtd = '''<!ELEMENT doc (name+)>
+<!ATTLIST doc xmlns:xi CDATA #FIXED "http://www.w3.org/2001/XInclude">
+<!ELEMENT name (#PCDATA)>
+<!ENTITY frob "Frobnitz">
+'''
+
+rng = '''<element name="doc" xmlns="http://relaxng.org/ns/structure/1.0">
+  <oneOrMore><element name="name"><text/></element></oneOrMore>
+</element>
+'''
+
+document = '''<?xml version="1.0"?>
+<!DOCTYPE doc SYSTEM "doc.dtd">
+<doc xmlns:xi="http://www.w3.org/2001/XInclude">
+  <name>&frob;</name>
+  <xi:include href="part.xml"/>
+</doc>
+'''
+
+
+@unittest.skipUnless(xmltools.available(), "lxml is not installed")
+class TestValidatestep(TestToolsFilesystem):
+
+    def setUp(self):
+        super(TestValidatestep, self).setUp()
+        for name, content in (('doc.dtd', dtd),
+                              ('doc.rng', rng),
+                              ('doc.xml', document),
+                              ('part.xml', '<name>Wabbit</name>'),
+                              ('bad.xml', '<doc><bogus/></doc>')):
+            with open(os.path.join(self.tempdir, name), 'w') as f:
+                f.write(content)
+        self.runner = Namespace(
+            source=Namespace(stem='Frobnitz-HOWTO'),
+            output=Namespace(dirname=self.tempdir),
+            config=Namespace(script=False), validtree=None)
+        self.doc = os.path.join(self.tempdir, 'doc.xml')
+        self.rng = os.path.join(self.tempdir, 'doc.rng')
+
+    def test_xinclude_entities_dtd(self):
+        output = os.path.join(self.tempdir, 'valid.xml')
+        self.assertTrue(xmltools.validatestep(self.runner, 'lxml', self.doc,
+                                              output=output, xinclude=True,
+                                              dtd=True))
+        with open(output) as f:
+            content = f.read()
+        self.assertIn('<name>Frobnitz</name>', content)
+        self.assertIn('<name>Wabbit</name>', content)
+        names = self.runner.validtree.xpath('//name/text()')
+        self.assertEqual(['Frobnitz', 'Wabbit'], names)
+
+    def test_dtd_invalid_before_xinclude(self):
+        # -- xi:include is not declared in the DTD (xmllint --postvalid)
+        self.assertFalse(xmltools.validatestep(self.runner, 'lxml', self.doc,
+                                               dtd=True))
+
+    def test_relaxng_reuses_tree(self):
+        xmltools.validatestep(self.runner, 'lxml', self.doc, xinclude=True)
+        tree = self.runner.validtree
+        before = xmltools.schemas.compiled
+        self.assertTrue(xmltools.validatestep(self.runner, 'lxml', tree,
+                                              rngfile=self.rng))
+        self.assertTrue(xmltools.validatestep(self.runner, 'lxml', tree,
+                                              rngfile=self.rng))
+        self.assertIs(tree, self.runner.validtree)
+        self.assertEqual(1, xmltools.schemas.compiled - before)
+
+    def test_relaxng_invalid(self):
+        bad = os.path.join(self.tempdir, 'bad.xml')
+        self.assertFalse(xmltools.validatestep(self.runner, 'lxml', bad,
+                                               rngfile=self.rng))
+
+    def test_fallback(self):
+        missing = os.path.join(self.tempdir, 'missing.xml')
+        self.assertIsNone(xmltools.validatestep(self.runner, 'lxml', missing))
+        self.assertIsNone(xmltools.validatestep(self.runner, 'shell',
+                                                self.doc))
+
+
+class TestHandedtree(unittest.TestCase):
+
+    def runner(self, stepjobs):
+        return Namespace(validtree=['frobnitz'],
+                         config=Namespace(stepjobs=stepjobs))
+
+    def test_serial_build_shares_tree(self):
+        runner = self.runner(1)
+        self.assertIs(runner.validtree, xmltools.handedtree(runner))
+
+    def test_concurrent_steps_get_copies(self):
+        runner = self.runner(2)
+        tree = xmltools.handedtree(runner)
+        self.assertEqual(runner.validtree, tree)
+        self.assertIsNot(runner.validtree, tree)
+
+    def test_no_tree(self):
+        runner = self.runner(2)
+        runner.validtree = None
+        self.assertIsNone(xmltools.handedtree(runner))
+
+#
+# -- end of file
@@ -172,8 +172,10 @@ class TestInventoryBase(unittest.TestCase):
         c.pubdir = os.path.join(self.tempdir, 'outputs')
         c.builddir = os.path.join(self.tempdir, 'builddir')
         c.sourcedir = os.path.join(self.tempdir, 'sources')
+        c.cachedir = os.path.join(self.tempdir, 'cache')
         argv = list()
         argv.extend(['--builddir', c.builddir])
+        argv.extend(['--cachedir', c.cachedir])
         argv.extend(['--pubdir', c.pubdir])
         argv.extend(['--sourcedir', c.sourcedir])
         self.argv = argv
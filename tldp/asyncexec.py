@@ -0,0 +1,250 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''asyncio execution backend for document builds (Python 3.5 and newer)
+
+Under the default (process) engine, each document build occupies a worker
+process, which spends nearly all of its time blocked in Popen.wait().  The
+AsyncEngine instead supervises every tool invocation from a single event loop
+with asyncio.create_subprocess_exec().  A global semaphore limits the number
+of tools running at any moment.
+
+The build steps of the doctype handlers are ordinary (synchronous) methods.
+So, each document build runs in a thread of a small executor, and every call
+the build makes to execute() or execute_pipeline() is handed to the event
+loop, where it waits for the semaphore and the child processes.
+
+This is the limit of the design:  the event loop replaces the blocking waits
+for child processes, not the threads.  The Python side of a build (and the
+in-process lxml engine) still runs in a thread, so at most twice jobs
+documents are in flight.  Driving the builds themselves as coroutines would
+mean rewriting every build step of every doctype.
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import errno
+import asyncio
+import functools
+from tempfile import mkstemp
+from concurrent.futures import ThreadPoolExecutor
+
+from tldp.utils import isexecutable, conditionallogging
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+async def execute(cmd, stdin=None, stdout=None, stderr=None,
+                  logdir=None, env=os.environ, cwd=None, semaphore=None):
+    '''coroutine with the same calling conventions as tldp.utils.execute()
+
+    The only addition is semaphore, an asyncio.Semaphore which must be
+    acquired before the child process is started.  It is released when the
+    child process exits.
+
+    Returns: the numeric exit code of the process
+    '''
+    prefix = os.path.basename(cmd[0]) + '.' + str(os.getpid()) + '-'
+
+    assert isexecutable(cmd[0])
+
+    if logdir is None:
+        raise ValueError("logdir must be a directory, cannot be None.")
+
+    if not os.path.isdir(logdir):
+        raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), logdir)
+
+    mytfile = functools.partial(mkstemp, prefix=prefix, dir=logdir)
+    if stdout is None:
+        stdout, stdoutname = mytfile(suffix='.stdout')
+    else:
+        stdoutname = None
+
+    if stderr is None:
+        stderr, stderrname = mytfile(suffix='.stderr')
+    else:
+        stderrname = None
+
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(1)
+
+    async with semaphore:
+        logger.debug("About to execute: %r (in %s)", cmd, cwd)
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdin=stdin, stdout=stdout, stderr=stderr,
+            env=env, cwd=cwd, start_new_session=True)
+        result = await proc.wait()
+
+    if result != 0:
+        logger.error("Non-zero exit (%s) for process: %r", result, cmd)
+        logger.error("Find STDOUT/STDERR in %s/%s*", logdir, prefix)
+    if isinstance(stdout, int) and stdoutname:
+        os.close(stdout)
+        conditionallogging(result, 'STDOUT', stdoutname)
+    if isinstance(stderr, int) and stderrname:
+        os.close(stderr)
+        conditionallogging(result, 'STDERR', stderrname)
+    return result
+
+
+async def execute_pipeline(cmds, stdin=None, stdout=None, logdir=None,
+                           env=os.environ, cwd=None, semaphore=None):
+    '''coroutine with the calling conventions of utils.execute_pipeline()
+
+    The whole pipeline counts as one tool invocation:  it holds semaphore
+    from the start of its first process until all of them have exited.
+
+    Returns: the exit code of the rightmost command that failed, or 0
+    '''
+    if len(cmds) == 1:
+        return await execute(cmds[0], stdin=stdin, stdout=stdout,
+                             logdir=logdir, env=env, cwd=cwd,
+                             semaphore=semaphore)
+
+    for cmd in cmds:
+        assert isexecutable(cmd[0])
+
+    if logdir is None:
+        raise ValueError("logdir must be a directory, cannot be None.")
+
+    if not os.path.isdir(logdir):
+        raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), logdir)
+
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(1)
+
+    logs = list()
+    async with semaphore:
+        procs = list()
+        pipein = stdin
+        for n, cmd in enumerate(cmds):
+            prefix = os.path.basename(cmd[0]) + '.' + str(os.getpid()) + '-'
+            mytfile = functools.partial(mkstemp, prefix=prefix, dir=logdir)
+            piperead = None
+            if n < len(cmds) - 1:
+                piperead, pipeout = os.pipe()
+            elif stdout is None:
+                pipeout, stdoutname = mytfile(suffix='.stdout')
+                logs.append((pipeout, 'STDOUT', stdoutname))
+            else:
+                pipeout = stdout
+            stderr, stderrname = mytfile(suffix='.stderr')
+            logs.append((stderr, 'STDERR', stderrname))
+            logger.debug("About to execute: %r (in %s)", cmd, cwd)
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdin=pipein, stdout=pipeout, stderr=stderr,
+                    env=env, cwd=cwd, start_new_session=True)
+            except BaseException:
+                if piperead is not None:
+                    os.close(piperead)
+                raise
+            finally:
+                # -- the children hold their ends of the pipes, so that the
+                #    writer sees SIGPIPE, as in sh
+                if n:
+                    os.close(pipein)
+                if piperead is not None:
+                    os.close(pipeout)
+            pipein = piperead
+            procs.append(proc)
+        results = [await proc.wait() for proc in procs]
+
+    result = 0
+    for cmd, r in zip(cmds, results):
+        if r != 0:
+            logger.error("Non-zero exit (%s) for process: %r", r, cmd)
+            result = r
+    if result != 0:
+        logger.error("Find STDOUT/STDERR in %s", logdir)
+    for fd, prefix, fname in logs:
+        os.close(fd)
+        conditionallogging(result, prefix, fname)
+    return result
+
+
+class AsyncEngine(object):
+    '''run many document builds from a single event loop
+
+    jobs: the number of tool invocations which may run at the same time;
+          twice that many document builds are kept in flight, so that the
+          Python side of one build (removing and creating directories,
+          writing checksums) does not leave a CPU idle
+    '''
+    def __init__(self, jobs):
+        self.jobs = max(1, jobs)
+        self.loop = None
+        self.semaphore = None
+
+    def execute(self, cmd, **kwargs):
+        '''drop-in replacement for tldp.utils.execute() (any thread)
+
+        Called from the build threads; schedules the coroutine on the event
+        loop and waits for the result.
+        '''
+        coro = execute(cmd, semaphore=self.semaphore, **kwargs)
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result()
+
+    def execute_pipeline(self, cmds, **kwargs):
+        '''drop-in replacement for tldp.utils.execute_pipeline() (any thread)
+
+        A pipeline waits for the same semaphore as a single command.
+        '''
+        coro = execute_pipeline(cmds, semaphore=self.semaphore, **kwargs)
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result()
+
+    async def build(self, executor, runner, x, count, results, stepstats,
+                    **kwargs):
+        stem = runner.source.stem
+        status = 'progress, %d failures, %d successes'
+        status = status % (results.count(False), results.count(True),)
+        logger.info("%s (%d of %d) initiating build [%s]",
+                    stem, x, count, status)
+        generate = functools.partial(runner.generate, **kwargs)
+        result = await self.loop.run_in_executor(executor, generate)
+        results.append(result)
+        stepstats.update(runner.stepstats)
+        return result
+
+    async def buildall(self, config, docs, stepstats, **kwargs):
+        self.semaphore = asyncio.Semaphore(self.jobs)
+        results = list()
+        count = len(docs)
+        with ThreadPoolExecutor(max_workers=2 * self.jobs) as executor:
+            builds = list()
+            for x, source in enumerate(docs, 1):
+                runner = source.doctype(
+                    source=source, output=source.working, config=config,
+                    execute=self.execute,
+                    execute_pipeline=self.execute_pipeline)
+                builds.append(self.build(executor, runner, x, count,
+                                         results, stepstats, **kwargs))
+            return await asyncio.gather(*builds)
+
+    def docbuild(self, config, docs, stepstats, **kwargs):
+        '''build docs; returns a list of results in the same order as docs
+
+        The step cache statistics of each build are added to stepstats, a
+        collections.Counter.
+        '''
+        logger.info("Building %d documents with asyncio engine, %d jobs.",
+                    len(docs), self.jobs)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            coro = self.buildall(config, docs, stepstats, **kwargs)
+            return list(self.loop.run_until_complete(coro))
+        finally:
+            asyncio.set_event_loop(None)
+            self.loop.close()
+            self.loop = None
+
+#
+# -- end of file
@@ -0,0 +1,293 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import errno
+import shutil
+import hashlib
+import logging
+from tempfile import mkdtemp
+
+from tldp.utils import statfile, statfiles
+
+logger = logging.getLogger(__name__)
+
+BUILDCACHE = 'outputs'
+STEPCACHE = 'steps'
+
+stringtypes = (str, type(''))  # -- str and unicode in python2
+
+
+def configsignature(name, value, versions=None):
+    '''return lines describing a config value (and the file it names)
+
+    versions is optional, {program: version string} (see ToolCache); a
+    program with a known version is identified by it, rather than by the
+    size and mtime of the file.
+    '''
+    lines = ['config %s %r' % (name, value)]
+    if versions and versions.get(value):
+        lines.append('version %s %s' % (value, versions[value]))
+    elif isinstance(value, stringtypes) and os.path.isfile(value):
+        st = os.stat(value)
+        lines.append('file %s %d %d' % (value, st.st_size, st.st_mtime))
+    return lines
+
+
+def fingerprint(runner):
+    '''return a hex digest identifying the output of a build
+
+    Two builds with the same fingerprint produce the same output directory.
+    The fingerprint covers:
+
+      - the doctype class (and the ldptool version)
+      - the document stem, which names most of the output files
+      - the MD5 sums of all of the source files
+      - all configuration values belonging to the doctype (or its parent
+        classes), e.g. docbook4xml_xsltproc, docbook4xml_xslchunk; when such
+        a value is a file (a tool or a stylesheet), the version the tool
+        reports (see tldp.toolcache), or else the size and mtime of the
+        file, so that an upgraded toolchain produces a new fingerprint
+      - the names, sizes and mtimes of the files in the resource directories
+    '''
+    from tldp import VERSION  # -- avoid circular import at module load
+
+    cls = runner.__class__
+    source = runner.source
+    config = runner.config
+    fp = list()
+    fp.append('ldptool %s' % (VERSION,))
+    fp.append('doctype %s.%s' % (cls.__module__, cls.__name__))
+    fp.append('stem %s' % (source.stem,))
+    for fname, hashval in sorted(source.md5sums.items()):
+        fp.append('source %s %s' % (hashval, fname))
+
+    # -- a doctype may use the configuration of its parent classes, e.g.
+    #    Asciidoc uses the docbook4xml_* tools
+    prefixes = tuple(x.__name__.lower() + '_' for x in cls.__mro__)
+    versions = getattr(config, 'toolversions', None)
+    for name in sorted(vars(config)):
+        if not name.startswith(prefixes):
+            continue
+        fp.extend(configsignature(name, getattr(config, name), versions))
+
+    for d in config.resources:
+        fp.append('resources %s' % (d,))
+        fullpath = os.path.join(source.dirname, d)
+        for fname, st in sorted(statfiles(fullpath, relative=source.dirname)
+                                .items()):
+            fp.append('resource %s %d %d' % (fname, st.st_size, st.st_mtime))
+
+    fp = '\n'.join(fp).encode('utf-8')
+    return hashlib.sha1(fp).hexdigest()
+
+
+def linktree(src, dst):
+    '''recreate directory src as dst, hardlinking files where possible
+
+    Symbolic links are recreated (not followed).  If a file cannot be
+    hardlinked (e.g. src and dst are on different filesystems), it is copied.
+
+    Returns: the total size of the regular files in the tree
+    '''
+    size = 0
+    os.mkdir(dst)
+    for name in os.listdir(src):
+        s = os.path.join(src, name)
+        d = os.path.join(dst, name)
+        if os.path.islink(s):
+            os.symlink(os.readlink(s), d)
+        elif os.path.isdir(s):
+            size += linktree(s, d)
+        else:
+            try:
+                os.link(s, d)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+                shutil.copy2(s, d)
+            size += os.lstat(d).st_size
+    return size
+
+
+class BuildCache(object):
+    '''a local store of finished output directories, keyed on fingerprint()
+
+    The store lives in CACHEDIR/outputs.  Each entry is a complete output
+    directory named by its fingerprint, with a sidecar file recording its
+    size.  Files are shared by hardlinks between the store, the build
+    directory and (after --publish) the public output directory, so a hit
+    costs almost no space or time.  Nothing may therefore rewrite a file of
+    a finished output directory in place; a file is replaced by writing a
+    new one and renaming it over the old (as writemd5sums() does), which
+    leaves the cached copy intact.  The mtime of each entry is refreshed on
+    every hit; when the store grows beyond maxsize bytes, the least recently
+    used entries are removed.
+    '''
+    option = 'buildcache'
+    subdir = BUILDCACHE
+
+    def __repr__(self):
+        return '<%s:%s>' % (self.__class__.__name__, self.dirname,)
+
+    @classmethod
+    def fromconfig(cls, config):
+        '''return a cache in config.cachedir (or None if disabled)'''
+        if not getattr(config, cls.option, False):
+            return None
+        if getattr(config, 'script', False):
+            return None
+        cachedir = getattr(config, 'cachedir', None)
+        if not cachedir:
+            return None
+        maxsize = getattr(config, 'buildcache_size', 0) * 1024 * 1024
+        dirname = os.path.join(cachedir, cls.subdir)
+        try:
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                logger.warning("Not using %s in %s: %s",
+                               cls.option, dirname, e)
+                return None
+        return cls(dirname, maxsize=maxsize)
+
+    def __init__(self, dirname, maxsize=0):
+        self.dirname = dirname
+        self.maxsize = maxsize
+
+    def entry(self, key):
+        return os.path.join(self.dirname, key)
+
+    def materialize(self, key, dirname):
+        '''replace directory dirname with the cached output; True on a hit'''
+        entry = self.entry(key)
+        if not os.path.isdir(entry):
+            return False
+        try:
+            os.utime(entry, None)
+            if os.path.exists(dirname):
+                shutil.rmtree(dirname)
+            linktree(entry, dirname)
+        except (OSError, IOError) as e:
+            # -- e.g. entry evicted by a concurrent build; build normally
+            logger.warning("Could not use cached build %s: %s", entry, e)
+            if os.path.exists(dirname):
+                shutil.rmtree(dirname)
+            os.mkdir(dirname)
+            return False
+        return True
+
+    def store(self, key, dirname):
+        '''add a copy of the output directory dirname to the cache'''
+        entry = self.entry(key)
+        if os.path.isdir(entry):
+            return True
+        tmpdir = mkdtemp(prefix='.' + key + '-', dir=self.dirname)
+        tmpentry = os.path.join(tmpdir, key)
+        try:
+            size = linktree(dirname, tmpentry)
+            with open(entry + '.size', 'w') as f:
+                f.write('%d\n' % (size,))
+            os.rename(tmpentry, entry)
+        except (OSError, IOError) as e:
+            logger.warning("Could not store build in cache %s: %s", entry, e)
+            return False
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        self.evict()
+        return True
+
+    def entries(self):
+        '''return a list of (mtime, size, key) for each entry in the cache'''
+        entries = list()
+        for key in os.listdir(self.dirname):
+            if key.startswith('.') or key.endswith('.size'):
+                continue
+            st = statfile(self.entry(key))
+            if st is None:
+                continue
+            try:
+                with open(self.entry(key) + '.size') as f:
+                    size = int(f.read())
+            except (IOError, OSError, ValueError):
+                size = sum(x.st_size for x in
+                           statfiles(self.entry(key)).values())
+            entries.append((st.st_mtime, size, key))
+        return entries
+
+    def evict(self):
+        '''remove least recently used entries until within maxsize'''
+        if not self.maxsize:
+            return
+        entries = sorted(self.entries(), reverse=True)
+        total = 0
+        for mtime, size, key in entries:
+            total += size
+            if total <= self.maxsize:
+                continue
+            logger.debug("Removing build cache entry %s (%d bytes).",
+                         key, size)
+            shutil.rmtree(self.entry(key), ignore_errors=True)
+            try:
+                os.unlink(self.entry(key) + '.size')
+            except OSError:
+                pass
+
+
+class StepCache(BuildCache):
+    '''a local store of the files written by individual build steps
+
+    The store lives in CACHEDIR/steps and shares the layout and the LRU
+    eviction (--buildcache-size) of the BuildCache.  Each entry holds the
+    output files of one invocation of a build step, named by position; see
+    tldp.doctypes.common.memoize for the construction of the key.
+    '''
+    option = 'stepcache'
+    subdir = STEPCACHE
+
+    def restore(self, key, fnames):
+        '''copy the cached files to fnames; True on a hit'''
+        entry = self.entry(key)
+        if not os.path.isdir(entry):
+            return False
+        try:
+            os.utime(entry, None)
+            for n, fname in enumerate(fnames):
+                shutil.copy2(os.path.join(entry, str(n)), fname)
+        except (OSError, IOError) as e:
+            logger.warning("Could not use cached step %s: %s", entry, e)
+            return False
+        return True
+
+    def store(self, key, fnames):
+        '''add copies of the files fnames to the cache'''
+        entry = self.entry(key)
+        if os.path.isdir(entry):
+            return True
+        tmpdir = mkdtemp(prefix='.' + key + '-', dir=self.dirname)
+        tmpentry = os.path.join(tmpdir, key)
+        try:
+            os.mkdir(tmpentry)
+            size = 0
+            for n, fname in enumerate(fnames):
+                shutil.copy2(fname, os.path.join(tmpentry, str(n)))
+                size += os.stat(fname).st_size
+            with open(entry + '.size', 'w') as f:
+                f.write('%d\n' % (size,))
+            os.rename(tmpentry, entry)
+        except (OSError, IOError) as e:
+            logger.warning("Could not store step in cache %s: %s", entry, e)
+            return False
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        self.evict()
+        return True
+
+#
+# -- end of file
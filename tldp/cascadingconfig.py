@@ -25,6 +25,59 @@ except ImportError:
     from ConfigParser import SafeConfigParser as ConfigParser
 
 
+class LazyDefault(object):
+    '''a default value which is computed only when first needed
+
+    For defaults which are costly to find, e.g. a tool in the PATH or a
+    stylesheet among several candidate locations.  The value is func(*args),
+    which should be a plain function (so that a configuration can still be
+    pickled).  A LazyNamespace computes the value when the attribute is first
+    read.  str() of a LazyDefault (e.g. in --help) names the search instead
+    of making it.
+
+    argparse applies the type of an option only to a default which is a
+    string; CascadingConfig sets the type of each LazyDefault, which is
+    applied to the computed value (unless None), as it was to the eager
+    defaults.
+    '''
+    def __repr__(self):
+        args = ', '.join(repr(x) for x in self.args)
+        return '<%s %s(%s)>' % (self.__class__.__name__,
+                                self.func.__name__, args)
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self.type = None
+
+    def __str__(self):
+        search = ' '.join([self.func.__name__] + [str(x) for x in self.args])
+        return '<found when needed: %s>' % (search,)
+
+    def resolve(self):
+        value = self.func(*self.args)
+        if value is not None and self.type is not None:
+            value = self.type(value)
+        return value
+
+
+class LazyNamespace(Namespace):
+    '''an argparse.Namespace which computes any LazyDefault when first read'''
+
+    def __getattribute__(self, name):
+        value = Namespace.__getattribute__(self, name)
+        if isinstance(value, LazyDefault):
+            value = value.resolve()
+            setattr(self, name, value)
+        return value
+
+    def resolve(self):
+        '''compute all remaining LazyDefault values'''
+        for name in list(vars(self)):
+            getattr(self, name)
+        return self
+
+
 def dict_to_argv_longform(d):
     '''creates from a dictionary, an invocation parseable by argparse
 
@@ -462,6 +515,9 @@ class CascadingConfig(object):
 
     def read_defaults(self):
         '''read the defaults that the developer set in the ArgumentParser'''
+        for action in self.argparser._actions:
+            if isinstance(action.default, LazyDefault):
+                action.default.type = action.type
         self.defaults = self.argparser.parse_args([])
 
     def read_cli(self):
@@ -519,14 +575,13 @@ class CascadingConfig(object):
             order = self.order
         sources = [(x, getattr(self, x)) for x in order]
         sources.reverse()
-        config = Namespace()
+        config = LazyNamespace()
         for sourcename, source in sources:
-            for name in vars(source):
-                newval = getattr(source, name)
-                logger.debug("Source %s: %s=%s", sourcename, name, newval)
-                oldval = getattr(config, name, None)
+            for name, newval in vars(source).items():
+                logger.debug("Source %s: %s=%r", sourcename, name, newval)
+                oldval = vars(config).get(name)
                 if oldval is not None:
-                    logger.debug("Source %s: replacing %s=%s with %s=%s",
+                    logger.debug("Source %s: replacing %s=%r with %s=%r",
                                  sourcename, name, oldval, name, newval)
                 setattr(config, name, newval)
         self.config = config
@@ -586,6 +641,7 @@ class CascadingConfig(object):
                 diagfunc = getattr(self, opt)
             delattr(self.config, opt)
         if diagfunc:
+                self.config.resolve()
                 sys.exit(diagfunc())
 
 #
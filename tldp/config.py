@@ -13,7 +13,10 @@ import copy as _copy
 import logging
 
 from tldp.utils import arg_isloglevel, arg_isreadablefile
+from tldp.utils import arg_isnonnegativeint
 from tldp.cascadingconfig import CascadingConfig, DefaultFreeArgumentParser
+from tldp.cascadingconfig import LazyDefault
+from tldp.fopserver import fopserver_command_finder
 
 import tldp.typeguesser
 
@@ -22,6 +25,14 @@ logger = logging.getLogger(__name__)
 DEFAULT_CONFIGFILE = '/etc/ldptool/ldptool.ini'
 
 
+def default_cachedir():
+    '''return $XDG_CACHE_HOME/ldptool (or ~/.cache/ldptool)'''
+    cachehome = os.environ.get('XDG_CACHE_HOME')
+    if not cachehome:
+        cachehome = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cachehome, 'ldptool')
+
+
 class DirectoriesExist(argparse._AppendAction):
 
     def __call__(self, parser, namespace, values, option_string=None):
@@ -87,6 +98,54 @@ def collectconfiguration(tag, argv):
                     default=None, action=DirectoryExists,
                     help='a scratch directory used for building')
 
+    ap.add_argument('--cachedir', '--cache-dir', '--cache-directory',
+                    default=default_cachedir(), type=str,
+                    help='a directory for persistent caches [%(default)s]')
+
+    ap.add_argument('--hashcache',
+                    action=StoreTrueOrNargBool, nargs='?', default=True,
+                    help='reuse source file hashes if unchanged [%(default)s]')
+
+    ap.add_argument('--hashalgorithm',
+                    choices=['md5', 'blake2b'], default='md5',
+                    help='hash algorithm for source files [%(default)s]')
+
+    ap.add_argument('--vcs',
+                    choices=['none', 'git'], default='none',
+                    help='take source file hashes from VCS [%(default)s]')
+
+    ap.add_argument('--snapshot',
+                    action=StoreTrueOrNargBool, nargs='?', default=True,
+                    help='reuse unchanged parts of last scan [%(default)s]')
+
+    ap.add_argument('--rescan',
+                    action=StoreTrueOrNargBool, nargs='?', default=False,
+                    help='ignore (and replace) the snapshot [%(default)s]')
+
+    ap.add_argument('--toolcache',
+                    action=StoreTrueOrNargBool, nargs='?', default=True,
+                    help='remember tool locations and versions [%(default)s]')
+
+    ap.add_argument('--buildcache',
+                    action=StoreTrueOrNargBool, nargs='?', default=False,
+                    help='reuse identical builds from cachedir [%(default)s]')
+
+    ap.add_argument('--stepcache',
+                    action=StoreTrueOrNargBool, nargs='?', default=False,
+                    help='reuse intermediate build files [%(default)s]')
+
+    ap.add_argument('--buildcache-size',
+                    default=1024, type=arg_isnonnegativeint,
+                    help='cache size limit in MiB; 0 = none [%(default)s]')
+
+    ap.add_argument('--fopserver',
+                    action=StoreTrueOrNargBool, nargs='?', default=False,
+                    help='render PDFs in one FOP process [%(default)s]')
+
+    ap.add_argument('--fopserver-command',
+                    default=LazyDefault(fopserver_command_finder), type=str,
+                    help='command to start FopServer [%(default)s]')
+
     ap.add_argument('--configfile', '--config-file', '--cfg',
                     '-c',
                     default=DEFAULT_CONFIGFILE,
@@ -105,6 +164,31 @@ def collectconfiguration(tag, argv):
                     default=[], action='append', type=str,
                     help='skip this stem during processing')
 
+    ap.add_argument('--jobs',
+                    '-j',
+                    default=1, type=arg_isnonnegativeint,
+                    help='parallel builds; 0 = one per CPU [%(default)s]')
+
+    ap.add_argument('--engine',
+                    default='process', choices=['process', 'asyncio'],
+                    help='how to run concurrent builds [%(default)s]')
+
+    ap.add_argument('--stepjobs',
+                    default=1, type=arg_isnonnegativeint,
+                    help='parallel build steps per document [%(default)s]')
+
+    ap.add_argument('--watch-debounce',
+                    default=2.0, type=float,
+                    help='seconds of quiet before --watch acts [%(default)s]')
+
+    ap.add_argument('--serve-socket',
+                    default=None, type=str,
+                    help='socket for --serve [in cachedir]')
+
+    ap.add_argument('--serve-client',
+                    action=StoreTrueOrNargBool, nargs='?', default=True,
+                    help='use a running --serve for queries [%(default)s]')
+
     ap.add_argument('--resources',
                     default=['images', 'resources'], action='append', type=str,
                     help='subdirs to copy during build [%(default)s]')
@@ -127,6 +211,15 @@ def collectconfiguration(tag, argv):
                    action='store_true', default=False,
                    help='dump runnable script [%(default)s]')
 
+    g.add_argument('--watch',
+                   '-w',
+                   action='store_true', default=False,
+                   help='publish documents as they change [%(default)s]')
+
+    g.add_argument('--serve',
+                   action='store_true', default=False,
+                   help='answer --list/--summary from memory [%(default)s]')
+
     g.add_argument('--detail', '--list',
                    '-l',
                    action='store_true', default=False,
@@ -147,6 +240,10 @@ def collectconfiguration(tag, argv):
                    action='store_true', default=False,
                    help='show status types and classes [%(default)s]')
 
+    g.add_argument('--show-plan', '--plan',
+                   default=None, type=str, metavar='DOCTYPE',
+                   help='show the build steps of a doctype')
+
     # -- collect up the distributed configuration fragments
     #
     for cls in tldp.typeguesser.knowndoctypes:
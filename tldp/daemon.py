@@ -0,0 +1,185 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''a long-running inventory server, answering queries on a Unix socket
+
+ldptool --serve scans the inventory once and keeps it in memory.  With
+inotify (see tldp.watch), changes in the sourcedirs and the pubdir are
+applied to it as they happen.  Each --summary and --list (--detail) run of
+ldptool first asks the server for the same pubdir and sourcedirs, if one is
+running, and so does not have to scan anything itself.
+
+The protocol is one JSON object per line in each direction, and one request
+per connection, e.g.
+
+  {"action": "summary" | "detail" | "status", "args": [...],
+   "verbose": false, "skip": [...]}
+
+  {"result": 0 | "error message", "output": "...", "status": {stem: ...}}
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import json
+import errno
+import select
+import socket
+import logging
+
+from tldp.snapshot import inventorykey
+
+logger = logging.getLogger(__name__)
+
+QUERYTIMEOUT = 60
+MSG_NOSIGNAL = getattr(socket, 'MSG_NOSIGNAL', 0)
+
+
+def socketpath(config):
+    '''return the socket of the server for config (or None)'''
+    path = getattr(config, 'serve_socket', None)
+    if path:
+        return path
+    cachedir = getattr(config, 'cachedir', None)
+    if not (cachedir and config.pubdir and config.sourcedir):
+        return None
+    key = inventorykey(config.pubdir, config.sourcedir)[:16]
+    return os.path.join(cachedir, 'ldptool-' + key + '.sock')
+
+
+def send(sock, message):
+    data = json.dumps(message).encode('utf-8') + b'\n'
+    # -- ldptool restores the default SIGPIPE action (see tldp.fopserver)
+    sock.sendall(data, MSG_NOSIGNAL)
+
+
+def receive(sock):
+    f = sock.makefile('rb')
+    try:
+        line = f.readline()
+    finally:
+        f.close()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+def ask(path, request, timeout=QUERYTIMEOUT):
+    '''send request to the server at path; return its reply
+
+    Returns: the reply, or None if no server answered
+    '''
+    if not path or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        send(sock, request)
+        return receive(sock)
+    except (socket.error, IOError, OSError, ValueError) as e:
+        logger.info("No answer from server %s (%s).", path, e)
+        return None
+    finally:
+        sock.close()
+
+
+def listen(path):
+    '''return a socket listening at path, replacing a stale socket file'''
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except (socket.error, OSError):
+            logger.debug("Removing stale socket %s.", path)
+            os.unlink(path)
+        else:
+            raise OSError(errno.EADDRINUSE, "server already running", path)
+        finally:
+            probe.close()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(umask)
+    sock.listen(16)
+    return sock
+
+
+class InventoryDaemon(object):
+    '''answer requests on a Unix socket, applying changes as they happen
+
+    handler(request) returns the reply to a request; onchange(stems) is
+    called with the stems reported by the watcher (a tldp.watch
+    SourceWatcher, optional), or with None if everything should be scanned
+    again.  Pending changes are applied before each request is answered.
+    '''
+
+    def __repr__(self):
+        return '<%s:%s>' % (self.__class__.__name__, self.path,)
+
+    def __init__(self, path, handler, watcher=None, onchange=None):
+        self.path = path
+        self.handler = handler
+        self.watcher = watcher
+        self.onchange = onchange
+
+    def serve(self, timeout=None):
+        '''answer requests; forever, or until idle for timeout seconds'''
+        listener = listen(self.path)
+        logger.info("Serving inventory queries on %s.", self.path)
+        try:
+            while True:
+                fds = [listener]
+                if self.watcher is not None:
+                    fds.append(self.watcher.fd)
+                try:
+                    readable, _, _ = select.select(fds, [], [], timeout)
+                except select.error as e:
+                    if e.args[0] != errno.EINTR:
+                        raise
+                    continue
+                if not readable:
+                    return
+                self.refresh()
+                if listener in readable:
+                    conn, _ = listener.accept()
+                    self.handle(conn)
+        finally:
+            listener.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def refresh(self):
+        '''apply any changes reported by the watcher'''
+        if self.watcher is None or not self.watcher.readable(0):
+            return
+        stems = self.watcher.stems(self.watcher.read())
+        if stems is None or stems:
+            self.onchange(stems)
+
+    def handle(self, conn):
+        conn.settimeout(QUERYTIMEOUT)
+        try:
+            request = receive(conn)
+            if request is None:
+                return
+            logger.debug("Received request %r.", request)
+            try:
+                reply = self.handler(request)
+            except Exception as e:
+                # -- one bad query must not take the server down
+                logger.exception("Failed to answer %r.", request)
+                reply = dict(result="Server error: %s" % (e,))
+            send(conn, reply)
+        except (socket.error, IOError, OSError, ValueError) as e:
+            logger.warning("Dropped request: %s", e)
+        finally:
+            conn.close()
+
+#
+# -- end of file
@@ -10,8 +10,10 @@ import logging
 
 from tldp.utils import which
 from tldp.utils import arg_isexecutable, isexecutable
+from tldp.cascadingconfig import LazyDefault
 from tldp.doctypes.common import depends
 from tldp.doctypes.docbook4xml import Docbook4XML
+from tldp.doctypes.xmltools import validatestep
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +37,10 @@ class Asciidoc(Docbook4XML):
 
     @depends(make_docbook45)
     def make_validated_source(self, **kwargs):
+        result = validatestep(self, self.config.docbook4xml_engine,
+                              self.output.validsource, dtd=True)
+        if result is not None:
+            return result
         s = '"{config.asciidoc_xmllint}" --noout --valid "{output.validsource}"'
         return self.shellscript(s, **kwargs)
 
@@ -43,10 +49,10 @@ class Asciidoc(Docbook4XML):
         descrip = 'executables and data files for %s' % (cls.formatname,)
         g = p.add_argument_group(title=cls.__name__, description=descrip)
         g.add_argument('--asciidoc-asciidoc', type=arg_isexecutable,
-                       default=which('asciidoc'),
+                       default=LazyDefault(which, 'asciidoc'),
                        help='full path to asciidoc [%(default)s]')
         g.add_argument('--asciidoc-xmllint', type=arg_isexecutable,
-                       default=which('xmllint'),
+                       default=LazyDefault(which, 'xmllint'),
                        help='full path to xmllint [%(default)s]')
 
 #
@@ -0,0 +1,203 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''structured commands for the build steps of the doctype handlers
+
+Each build step describes its tool invocation as a shell command template,
+e.g.
+
+    "{config.docbook4xml_xsltproc}" > "{output.name_htmls}" \\
+        --nonet "{config.docbook4xml_xslsingle}" "{output.validsource}"
+
+Under --build, Command.fromtemplate() turns such a template into an argv
+list (or a pipeline of argv lists) with optional stdin and stdout files,
+which are executed directly, without writing a script and starting bash for
+it.  The template is split into words before the {fields} are filled in, so
+a value containing spaces or shell metacharacters (e.g. an odd document
+stem) stays a single argument.  Under --script, the same Command is written
+out as shell text.
+
+Only simple commands, pipelines (|) and the redirections <, > and >> are
+understood.  Anything else (e.g. &&, ;, $VARIABLES, globbing, cd) raises
+CommandSyntaxError, and the caller falls back to running the template as a
+bash script.
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import re
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote  # -- python2
+
+tokens = re.compile(r'''
+      (?P<space>[ \t]+|\\\n)
+    | (?P<newline>\n)
+    | (?P<comment>\#[^\n]*)
+    | (?P<op>&&|\|\||>>|[|;&<>()])
+    | (?P<word>(?:[^\s'"\\|&;<>()]|\\.|'[^']*'|"(?:[^"\\]|\\.)*")+)
+    ''', re.X | re.S)
+
+wordparts = re.compile(r'''
+      '(?P<single>[^']*)'
+    | "(?P<double>(?:[^"\\]|\\.)*)"
+    | \\(?P<escaped>.)
+    | (?P<bare>[^'"\\]+)
+    ''', re.X | re.S)
+
+# -- shell syntax which a Command cannot express
+unsupported_bare = re.compile(r'[$`*?\[~]')
+unsupported_double = re.compile(r'[$`]')
+
+redirections = ('<', '>', '>>')
+
+WIDTH = 76
+
+# -- commands which only make sense inside a shell
+builtins = set(['cd', 'exec', 'exit', 'export', 'set', 'source', '.',
+                'eval', 'unset', 'umask', 'ulimit', 'read', 'trap'])
+
+
+class CommandSyntaxError(ValueError):
+    pass
+
+
+def unquote(word):
+    '''remove the shell quoting from a word; raise if it needs expansion'''
+    result = list()
+    for m in wordparts.finditer(word):
+        kind = m.lastgroup
+        text = m.group(kind)
+        if kind == 'bare':
+            if unsupported_bare.search(text):
+                raise CommandSyntaxError("expansion in %r" % (word,))
+        elif kind == 'double':
+            if unsupported_double.search(text):
+                raise CommandSyntaxError("expansion in %r" % (word,))
+            text = re.sub(r'\\([\\"])', r'\1', text)
+        result.append(text)
+    return ''.join(result)
+
+
+def lex(template):
+    '''split a template into (kind, text) tokens, following sh(1) rules'''
+    pos = 0
+    result = list()
+    wordend = None
+    while pos < len(template):
+        m = tokens.match(template, pos)
+        if m is None:
+            raise CommandSyntaxError("cannot parse %r" % (template[pos:],))
+        kind = m.lastgroup
+        if kind == 'op' and m.group() in redirections and wordend == pos:
+            # -- e.g. 2>/dev/null: a redirection of another file descriptor
+            raise CommandSyntaxError("fd redirection in %r" % (template,))
+        if kind in ('word', 'op', 'newline'):
+            result.append((kind, m.group()))
+        wordend = m.end() if kind == 'word' else None
+        pos = m.end()
+    return result
+
+
+class Command(object):
+    '''a pipeline of argv lists, with optional stdin and stdout files
+
+    pipeline: list of argv lists (usually just one)
+    stdin:    filename for the standard input of the first command, or None
+    stdout:   filename for the standard output of the last command, or None
+    append:   True if stdout is to be appended to (>>)
+    '''
+
+    def __repr__(self):
+        return '<%s:%s>' % (self.__class__.__name__, self.shelltext(),)
+
+    def __init__(self, pipeline, stdin=None, stdout=None, append=False):
+        self.pipeline = pipeline
+        self.stdin = stdin
+        self.stdout = stdout
+        self.append = append
+
+    def __eq__(self, other):
+        return vars(self) == vars(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    @classmethod
+    def fromtemplate(cls, template, **fields):
+        '''parse a step's shell template and fill in its {fields}
+
+        Returns: a Command; raises CommandSyntaxError if the template uses
+        shell features beyond a simple command or pipeline
+        '''
+        pipeline = [list()]
+        files = dict()
+        ended = False
+        it = iter(lex(template))
+        for kind, text in it:
+            if kind == 'newline':
+                # -- blank and comment lines before the command are fine
+                ended = ended or bool(pipeline[0] or files)
+                continue
+            if ended:
+                raise CommandSyntaxError("more than one command")
+            if kind == 'op' and text == '|':
+                if not pipeline[-1]:
+                    raise CommandSyntaxError("empty command in pipeline")
+                pipeline.append(list())
+                continue
+            if kind == 'op' and text in redirections:
+                target = next(it, (None, None))
+                if target[0] != 'word' or text in files:
+                    raise CommandSyntaxError("bad redirection %s" % (text,))
+                files[text] = unquote(target[1]).format(**fields)
+                continue
+            if kind == 'op':
+                raise CommandSyntaxError("unsupported operator %s" % (text,))
+            pipeline[-1].append(unquote(text).format(**fields))
+        if not all(pipeline):
+            raise CommandSyntaxError("empty command")
+        for argv in pipeline:
+            if argv[0] in builtins:
+                raise CommandSyntaxError("shell builtin %s" % (argv[0],))
+        if '>' in files and '>>' in files:
+            raise CommandSyntaxError("conflicting redirections")
+        stdout = files.get('>', files.get('>>'))
+        return cls(pipeline, stdin=files.get('<'), stdout=stdout,
+                   append='>>' in files)
+
+    def shelltext(self):
+        '''return the command as (bash) shell text, for --script'''
+        lines = list()
+        for n, argv in enumerate(self.pipeline):
+            words = [quote(argv[0])]
+            if n == 0 and self.stdin is not None:
+                words.append('< ' + quote(self.stdin))
+            if n == len(self.pipeline) - 1 and self.stdout is not None:
+                op = '>>' if self.append else '>'
+                words.append(op + ' ' + quote(self.stdout))
+            args = [quote(x) for x in argv[1:]]
+            oneline = ' '.join(words + args)
+            if len(oneline) <= WIDTH:
+                lines.append(oneline)
+            else:
+                # -- one option (with its values) per continuation line
+                lines.append(' '.join(words))
+                for arg in args:
+                    if arg.startswith('-') or \
+                            len(lines[-1]) + len(arg) >= WIDTH:
+                        lines[-1] += ' \\'
+                        lines.append('    ' + arg)
+                    else:
+                        lines[-1] += ' ' + arg
+            if n < len(self.pipeline) - 1:
+                lines[-1] += ' |'
+        return '\n'.join(lines)
+
+#
+# -- end of file
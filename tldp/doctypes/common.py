@@ -14,12 +14,23 @@ import errno
 import codecs
 import shutil
 import logging
-import inspect
+import hashlib
+import threading
+from string import Formatter
 from tempfile import NamedTemporaryFile as ntf
 from functools import wraps
-import networkx as nx
+from collections import OrderedDict, Counter
 
-from tldp.utils import execute, logtimings, writemd5sums
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # -- python2
+
+from tldp.utils import execute, execute_pipeline, which, isexecutable
+from tldp.utils import logtimings, writemd5sums, md5file
+from tldp.buildcache import BuildCache, StepCache, fingerprint
+from tldp.buildcache import configsignature
+from tldp.doctypes.commands import Command, CommandSyntaxError
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +55,185 @@ def depends(*predecessors):
     return anon
 
 
+class BuildPlan(object):
+    '''the build steps of a doctype, compiled once for each class
+
+    The steps are the methods decorated with @depends, and the methods they
+    depend on.  The plan records
+
+      - order:  the names of the steps, in the order a serial build runs them
+      - depends:  {name: frozenset of the names of its predecessors}
+      - levels:  tuples of names; each step depends only on steps in earlier
+        levels, so the steps within one level may run concurrently
+
+    The order is that of a depth-first topological sort, visiting the steps
+    (and their successors) in the order of their names; it is the order
+    ldptool has always used (formerly computed by networkx).
+    '''
+
+    def __repr__(self):
+        return '<%s:%s (%d steps)>' % (
+               self.__class__.__name__, self.doctype.__name__, len(self.order))
+
+    @classmethod
+    def fromclass(cls, doctype):
+        '''compile the plan from the @depends declarations of doctype'''
+        successors = OrderedDict()
+        for name in sorted(dir(doctype)):
+            predecessors = getattr(getattr(doctype, name, None), 'depends',
+                                   None)
+            if not predecessors:
+                continue
+            for pred in predecessors:
+                assert callable(getattr(doctype, pred, None))
+                successors.setdefault(pred, list())
+                successors.setdefault(name, list())
+                if name not in successors[pred]:
+                    successors[pred].append(name)
+        return cls(doctype, topologicalorder(successors), successors)
+
+    def __init__(self, doctype, order, successors):
+        self.doctype = doctype
+        self.order = tuple(order)
+        depends = dict((name, set()) for name in self.order)
+        for name, names in successors.items():
+            for successor in names:
+                depends[successor].add(name)
+        self.depends = dict((k, frozenset(v)) for k, v in depends.items())
+        level = dict()
+        for name in self.order:
+            level[name] = 1 + max([level[x] for x in self.depends[name]] or
+                                  [-1])
+        self.levels = tuple(tuple(x for x in self.order if level[x] == n)
+                            for n in range(1 + max(level.values() or [-1])))
+
+    def detail(self, file=sys.stdout):
+        '''print the steps, in order, with their levels and predecessors'''
+        level = dict((name, n) for n, names in enumerate(self.levels, 1)
+                     for name in names)
+        width = max([len(x) for x in self.order] or [0])
+        for n, name in enumerate(self.order, 1):
+            after = ', '.join(x for x in self.order if x in self.depends[name])
+            print('  {:>3} level {:<3} {:{w}}  {}'.format(
+                  n, level[name], name, after, w=width).rstrip(), file=file)
+
+
+def topologicalorder(successors):
+    '''return the nodes of a DAG, each before all of its successors
+
+    successors is an (ordered) {node: [successor, ...]}.  The nodes are
+    explored depth-first, in order, and the reverse of the postorder is
+    returned.  Raises ValueError if the graph contains a cycle.
+    '''
+    seen = set()
+    explored = set()
+    postorder = list()
+    for node in successors:
+        if node in explored:
+            continue
+        fringe = [node]
+        while fringe:
+            w = fringe[-1]
+            if w in explored:
+                fringe.pop()
+                continue
+            seen.add(w)
+            new = list()
+            for n in successors[w]:
+                if n not in explored:
+                    if n in seen:
+                        raise ValueError("build steps contain a cycle at " + n)
+                    new.append(n)
+            if new:
+                fringe.extend(new)
+            else:
+                explored.add(w)
+                postorder.append(w)
+                fringe.pop()
+    postorder.reverse()
+    return postorder
+
+
+# -- the BuildPlan of each doctype class, compiled on first use
+#
+buildplans = dict()
+
+
+class MemoizedStep(object):
+    '''the declared inputs and outputs of a build step (see memoize)'''
+
+    def __init__(self, name, inputs, outputs, sources):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.sources = sources
+
+    def files(self, runner, names):
+        '''render the filename templates (relative to output.dirname)'''
+        fnames = list()
+        for name in names:
+            fname = name.format(source=runner.source, output=runner.output,
+                                config=runner.config)
+            fnames.append(os.path.join(runner.output.dirname, fname))
+        return fnames
+
+    def key(self, runner, script):
+        '''return the cache key for running script in this step (or None)
+
+        The key covers the doctype and step names, the script template, the
+        value of every {config.*} field in the template (and the version, or
+        size and mtime, of the files they name), the MD5 sums of the source
+        document (if sources) and of the declared input files.
+        '''
+        from tldp import VERSION  # -- avoid circular import at module load
+
+        cls = runner.__class__
+        k = list()
+        k.append('ldptool %s' % (VERSION,))
+        k.append('step %s.%s.%s' % (cls.__module__, cls.__name__, self.name))
+        k.append(script)
+        versions = getattr(runner.config, 'toolversions', None)
+        fields = set(x[1] for x in Formatter().parse(script) if x[1])
+        for field in sorted(fields):
+            if field.startswith('config.'):
+                name = field[len('config.'):]
+                value = getattr(runner.config, name, None)
+                k.extend(configsignature(name, value, versions))
+        if self.sources:
+            for fname, hashval in sorted(runner.source.md5sums.items()):
+                k.append('source %s %s' % (hashval, fname))
+        for name, fname in zip(self.inputs, self.files(runner, self.inputs)):
+            if not os.path.isfile(fname):
+                return None
+            k.append('input %s %s' % (name, md5file(fname)))
+        k = '\n'.join(k).encode('utf-8')
+        return hashlib.sha1(k).hexdigest()
+
+
+def memoize(inputs=(), outputs=(), sources=False):
+    '''decorator to cache the files a build step writes (see --stepcache)
+
+    For steps which are pure functions of their inputs.  The inputs and
+    outputs are filename templates, like the shell script templates, and are
+    relative to the output directory, e.g. '{output.name_fo}'.  If sources is
+    True, the step depends on (all of) the source document.
+
+    Under --stepcache, when the step calls shellscript() with the same
+    template, tools and inputs as an earlier run, the outputs are restored
+    from the cache and no tool runs.
+    '''
+    def anon(f):
+        step = MemoizedStep(f.__name__, inputs, outputs, sources)
+
+        @wraps(f)
+        def method(self, *args, **kwargs):
+            kwargs['memoize'] = step
+            return f(self, *args, **kwargs)
+        method.memoize = step
+        return method
+    return anon
+
+
 class SignatureChecker(object):
 
     @classmethod
@@ -69,7 +259,11 @@ class BaseDoctype(object):
         self.source = kwargs.get('source', None)
         self.output = kwargs.get('output', None)
         self.config = kwargs.get('config', None)
+        self.execute = kwargs.get('execute', execute)
+        self.execute_pipeline = kwargs.get('execute_pipeline',
+                                           execute_pipeline)
         self.removals = set()
+        self.stepstats = Counter()
         assert self.source is not None
         assert self.output is not None
         assert self.config is not None
@@ -88,18 +282,35 @@ class BaseDoctype(object):
                     else:
                         raise e
 
+    def unused(self, tool):
+        '''True if a required tool is not needed with the selected engines'''
+        if tool.endswith('_html2text'):
+            prefix = tool[:-len('html2text')]
+            engine = getattr(self.config, prefix + 'textengine', None)
+            return engine == 'builtin'
+        return False
+
     def build_precheck(self):
+        '''True if the required tools are configured (and usable)
+
+        Tools already checked for this run (see ToolCache.configure) are not
+        checked again.
+        '''
         classname = self.__class__.__name__
         if self.config.script:
             return True
+        checked = getattr(self.config, 'toolschecked', frozenset())
         for tool, validator in self.required.items():
+            if self.unused(tool):
+                continue
             thing = getattr(self.config, tool, None)
             logger.debug("%s, tool = %s, thing = %s", classname, tool, thing)
             if thing is None:
                 logger.error("%s missing required tool %s, skipping...",
                              classname, tool)
                 return False
-            assert validator(thing)
+            if tool not in checked:
+                assert validator(thing)
         return True
 
     def clear_output(self, **kwargs):
@@ -136,16 +347,20 @@ class BaseDoctype(object):
         return True
 
     def chdir_output(self, **kwargs):
-        '''chdir to the output directory (or write the script that would)'''
-        logger.debug("%s chdir to dir   %s.",
-                     self.output.stem, self.output.dirname)
+        '''write the script that would chdir to the output directory
+
+        Under --build, nothing changes the working directory of this process.
+        Instead, execute_shellscript() passes the output directory to the
+        child process as its working directory.
+        '''
         if self.config.script:
+            logger.debug("%s chdir to dir   %s.",
+                         self.output.stem, self.output.dirname)
             s = '''
 # - - - - - {source.stem} - - - - - -
 
 cd -- "{output.dirname}"'''
             return self.shellscript(s, **kwargs)
-        os.chdir(self.output.dirname)
         return True
 
     def generate_md5sums(self, **kwargs):
@@ -170,7 +385,8 @@ cd -- "{output.dirname}"'''
                          md5s)
             return self.shellscript(s, **kwargs)
         header = '# -- MD5SUMS for {}'.format(self.source.stem)
-        writemd5sums(md5file, self.source.md5sums, header=header)
+        writemd5sums(md5file, self.source.md5sums, header=header,
+                     algorithm=self.source.algorithm)
         return True
 
     def copy_static_resources(self, **kwargs):
@@ -202,7 +418,10 @@ cd -- "{output.dirname}"'''
         pass
 
     def shellscript(self, script, **kwargs):
+        step = kwargs.pop('memoize', None)
         if self.config.build:
+            if step is not None:
+                return self.memoized_shellscript(step, script, **kwargs)
             return self.execute_shellscript(script, **kwargs)
         elif self.config.script:
             return self.dump_shellscript(script, **kwargs)
@@ -210,6 +429,27 @@ cd -- "{output.dirname}"'''
             etext = '%s in shellscript, neither --build nor --script'
             raise Exception(etext % (self.source.stem,))
 
+    def memoized_shellscript(self, step, script, **kwargs):
+        '''execute_shellscript(), unless the outputs are in the step cache'''
+        cache = StepCache.fromconfig(self.config)
+        if cache is None:
+            return self.execute_shellscript(script, **kwargs)
+        stem = self.source.stem
+        name = '%s.%s' % (self.__class__.__name__, step.name)
+        key = step.key(self, script)
+        outputs = step.files(self, step.outputs)
+        if key is not None and cache.restore(key, outputs):
+            logger.info("%s step cache HIT %s %s.", stem, name, key)
+            self.stepstats[(name, 'hits')] += 1
+            return True
+        logger.debug("%s step cache miss %s %s.", stem, name, key)
+        self.stepstats[(name, 'misses')] += 1
+        result = self.execute_shellscript(script, **kwargs)
+        if result and key is not None:
+            if all(os.path.isfile(x) for x in outputs):
+                cache.store(key, outputs)
+        return result
+
     @logtimings(logger.debug)
     def dump_shellscript(self, script, preamble=preamble,
                          postamble=postamble, **kwargs):
@@ -217,7 +457,12 @@ cd -- "{output.dirname}"'''
         output = self.output
         config = self.config
         file = kwargs.get('file', sys.stdout)
-        s = script.format(output=output, source=source, config=config)
+        try:
+            command = Command.fromtemplate(script, output=output,
+                                           source=source, config=config)
+            s = command.shelltext()
+        except CommandSyntaxError:
+            s = script.format(output=output, source=source, config=config)
         print('', file=file)
         print(s, file=file)
         return True
@@ -225,6 +470,77 @@ cd -- "{output.dirname}"'''
     @logtimings(logger.debug)
     def execute_shellscript(self, script, preamble=preamble,
                             postamble=postamble, **kwargs):
+        '''run a step's shell template in the output directory
+
+        The template is run as a Command (directly, without a shell), unless
+        it needs shell features a Command does not have; then it is written
+        to a script in the log directory and run by bash.
+        '''
+        source = self.source
+        output = self.output
+        config = self.config
+        try:
+            command = Command.fromtemplate(script, output=output,
+                                           source=source, config=config)
+        except CommandSyntaxError as e:
+            logger.debug("%s running template as a bash script: %s",
+                         source.stem, e)
+            return self.execute_bashscript(script, preamble=preamble,
+                                           postamble=postamble, **kwargs)
+        return self.execute_command(command)
+
+    def execute_command(self, command):
+        '''run a Command (see tldp.doctypes.commands) in the output directory
+
+        Files named in the Command are relative to the output directory.
+        Programs named without a directory are looked up in PATH.
+        '''
+        stem = self.source.stem
+        dirname = self.output.dirname
+        pipeline = list()
+        for argv in command.pipeline:
+            tool = argv[0]
+            if os.sep not in tool:
+                tool = which(tool)
+            elif not os.path.isabs(tool):
+                tool = os.path.join(dirname, tool)
+            if tool is None or not isexecutable(tool):
+                logger.error("%s cannot find executable %s", stem, argv[0])
+                return False
+            pipeline.append([tool] + argv[1:])
+
+        stdin = stdout = None
+        try:
+            if command.stdin is not None:
+                stdin = open(os.path.join(dirname, command.stdin), 'rb')
+            if command.stdout is not None:
+                mode = 'ab' if command.append else 'wb'
+                stdout = open(os.path.join(dirname, command.stdout), mode)
+            if len(pipeline) == 1:
+                result = self.execute(pipeline[0], stdin=stdin, stdout=stdout,
+                                      logdir=self.output.logdir, cwd=dirname)
+            else:
+                result = self.execute_pipeline(pipeline, stdin=stdin,
+                                               stdout=stdout,
+                                               logdir=self.output.logdir,
+                                               cwd=dirname)
+        except (IOError, OSError) as e:
+            logger.error("%s could not run %s: %s",
+                         stem, command.pipeline[0][0], e)
+            return False
+        finally:
+            for f in (stdin, stdout):
+                if f is not None:
+                    f.close()
+        if result != 0:
+            for line in command.shelltext().splitlines():
+                logger.info("Command: %s", line)
+            return False
+        return True
+
+    def execute_bashscript(self, script, preamble=preamble,
+                           postamble=postamble, **kwargs):
+        '''write a step's shell template to a script and run it with bash'''
         source = self.source
         output = self.output
         config = self.config
@@ -246,7 +562,7 @@ cd -- "{output.dirname}"'''
         os.chmod(tf.name, mode)
 
         cmd = [tf.name]
-        result = execute(cmd, logdir=logdir)
+        result = self.execute(cmd, logdir=logdir, cwd=output.dirname)
         if result != 0:
             with codecs.open(tf.name, encoding='utf-8') as f:
                 for line in f:
@@ -276,21 +592,25 @@ cd -- "{output.dirname}"'''
                 return False
         return True
 
+    @classmethod
+    def buildplan(cls):
+        '''return the BuildPlan of this class (see @depends)'''
+        plan = buildplans.get(cls)
+        if plan is None:
+            plan = buildplans[cls] = BuildPlan.fromclass(cls)
+        return plan
+
     def determinebuildorder(self):
-        graph = nx.DiGraph()
-        d = dict(inspect.getmembers(self, inspect.ismethod))
-        for name, member in d.items():
-            predecessors = getattr(member, 'depends', None)
-            if predecessors:
-                for pred in predecessors:
-                    method = d.get(pred, None)
-                    assert method is not None
-                    graph.add_edge(method, member)
-        order = nx.dag.topological_sort(graph)
-        return order
+        return [getattr(self, name) for name in self.buildplan().order]
 
     @logtimings(logger.debug)
     def build_fullrun(self, **kwargs):
+        stepjobs = getattr(self.config, 'stepjobs', 1)
+        if self.config.script or not stepjobs or stepjobs < 2:
+            return self.build_serial(**kwargs)
+        return self.build_concurrent(stepjobs, **kwargs)
+
+    def build_serial(self, **kwargs):
         stem = self.source.stem
         order = self.determinebuildorder()
         logger.debug("%s build order %r", self.source.stem, order)
@@ -304,17 +624,85 @@ cd -- "{output.dirname}"'''
                 return False
         return True
 
+    def build_concurrent(self, limit, **kwargs):
+        '''run the build steps, up to limit at a time, as the plan allows
+
+        Every step whose predecessors (see @depends) have all succeeded is
+        started in its own thread, as long as fewer than limit steps are
+        running.  After the first failure, no further steps are started; the
+        steps still running are allowed to finish and the build fails.
+        '''
+        stem = self.source.stem
+        classname = self.__class__.__name__
+        plan = self.buildplan()
+        logger.debug("%s build plan %r (%d concurrent steps)",
+                     stem, plan.order, limit)
+        waiting = OrderedDict((name, set(plan.depends[name]))
+                              for name in plan.order)
+        finished = queue.Queue()
+        succeeded = set()
+        running = 0
+        failed = False
+
+        def runstep(name):
+            try:
+                result = getattr(self, name)(**kwargs)
+            except Exception:
+                logger.exception("%s called method  %s.%s raised exception",
+                                 stem, classname, name)
+                result = False
+            finished.put((name, result))
+
+        while waiting or running:
+            if not failed:
+                for name, predecessors in list(waiting.items()):
+                    if running >= limit:
+                        break
+                    if not predecessors.issubset(succeeded):
+                        continue
+                    del waiting[name]
+                    logger.info("%s calling method %s.%s",
+                                stem, classname, name)
+                    t = threading.Thread(target=runstep, args=(name,),
+                                         name='%s.%s' % (stem, name))
+                    t.daemon = True
+                    t.start()
+                    running += 1
+            if not running:
+                break
+            name, result = finished.get()
+            running -= 1
+            if result:
+                succeeded.add(name)
+            else:
+                logger.error("%s called method  %s.%s failed, skipping...",
+                             stem, classname, name)
+                failed = True
+        return not failed and not waiting
+
     @logtimings(logger.info)
     def generate(self, **kwargs):
+        # -- an identical build (same sources, toolchain and configuration)
+        #    may already be in the build cache; materialize() replaces the
+        #    output dir, so look before preparing it
+        #
+        cache = BuildCache.fromconfig(self.config)
+        if cache is not None:
+            if not self.build_precheck():
+                return False
+            key = fingerprint(self)
+            if cache.materialize(key, self.output.dirname):
+                logger.info("%s build cache HIT %s.", self.source.stem, key)
+                self.hook_build_success()
+                return True
+            logger.debug("%s build cache miss %s.", self.source.stem, key)
+
         # -- perform build preparation steps;
         #     - check for all executables and data files
         #     - clear output dir
         #     - make output dir
-        #     - chdir to output dir
         #     - copy source images/resources to output dir
         #
-        if not self.config.script:
-            opwd = os.getcwd()
         if not self.build_prepare():
             return False
 
@@ -330,12 +718,11 @@ cd -- "{output.dirname}"'''
         #
         if result:
             self.hook_build_success()
+            if cache is not None:
+                cache.store(key, self.output.dirname)
         else:
             self.hook_build_failure()
 
-        if not self.config.script:
-            os.chdir(opwd)
-
         return result
 
 #
@@ -13,7 +13,12 @@ from tldp.utils import arg_isexecutable, isexecutable
 from tldp.utils import arg_isreadablefile, isreadablefile
 from tldp.utils import arg_isstr, isstr
 
+from tldp.cascadingconfig import LazyDefault
 from tldp.doctypes.common import BaseDoctype, SignatureChecker, depends
+from tldp.doctypes.common import memoize
+from tldp.doctypes.xmltools import xsltstep, validatestep, ENGINES
+from tldp.doctypes.htmltext import textstep, TEXTENGINES
+from tldp.fopserver import fopstep
 
 logger = logging.getLogger(__name__)
 
@@ -58,7 +63,20 @@ class Docbook4XML(BaseDoctype, SignatureChecker):
                 'docbook4xml_xslprint': isstr,
                 }
 
+    # -- the validated document, if parsed in-process (lxml engine)
+    validtree = None
+
+    # -- the single-page HTML, if made in-process (for the text engine)
+    htmlstree = None
+
+    @memoize(outputs=['{output.validsource}'], sources=True)
     def make_validated_source(self, **kwargs):
+        result = validatestep(self, self.config.docbook4xml_engine,
+                              self.source.filename,
+                              output=self.output.validsource,
+                              xinclude=True, dtd=True)
+        if result is not None:
+            return result
         s = '''"{config.docbook4xml_xmllint}" > "{output.validsource}" \\
                   --nonet \\
                   --noent \\
@@ -70,6 +88,12 @@ class Docbook4XML(BaseDoctype, SignatureChecker):
     @depends(make_validated_source)
     def make_name_htmls(self, **kwargs):
         '''create a single page HTML output'''
+        params = {'admon.graphics.path': 'images/'}
+        if xsltstep(self, self.config.docbook4xml_engine,
+                    self.config.docbook4xml_xslsingle,
+                    output=self.output.name_htmls, params=params,
+                    keep='htmlstree'):
+            return True
         s = '''"{config.docbook4xml_xsltproc}" > "{output.name_htmls}" \\
                   --nonet \\
                   --stringparam admon.graphics.path images/ \\
@@ -81,6 +105,9 @@ class Docbook4XML(BaseDoctype, SignatureChecker):
     @depends(make_name_htmls)
     def make_name_txt(self, **kwargs):
         '''create text output'''
+        result = textstep(self, self.config.docbook4xml_textengine, **kwargs)
+        if result is not None:
+            return result
         s = '''"{config.docbook4xml_html2text}" > "{output.name_txt}" \\
                   -style pretty \\
                   -nobs \\
@@ -88,24 +115,36 @@ class Docbook4XML(BaseDoctype, SignatureChecker):
         return self.shellscript(s, **kwargs)
 
     @depends(make_validated_source)
+    @memoize(inputs=['{output.validsource}'], outputs=['{output.name_fo}'])
     def make_fo(self, **kwargs):
         '''generate the Formatting Objects intermediate output'''
+        if not self.config.script:
+            self.removals.add(self.output.name_fo)
+        params = {'fop.extensions': '0', 'fop1.extensions': '1'}
+        if xsltstep(self, self.config.docbook4xml_engine,
+                    self.config.docbook4xml_xslprint,
+                    output=self.output.name_fo, params=params, nonet=False):
+            return True
         s = '''"{config.docbook4xml_xsltproc}" > "{output.name_fo}" \\
                   --stringparam fop.extensions 0 \\
                   --stringparam fop1.extensions 1 \\
                   "{config.docbook4xml_xslprint}" \\
                   "{output.validsource}"'''
-        if not self.config.script:
-            self.removals.add(self.output.name_fo)
         return self.shellscript(s, **kwargs)
 
     # -- this is conditionally built--see logic in make_name_pdf() below
     # @depends(make_fo)
     def make_pdf_with_fop(self, **kwargs):
         '''use FOP to create a PDF'''
+        result = fopstep(self, self.config.docbook4xml_fopconf)
+        if result is not None:
+            return result
         s = '''"{config.docbook4xml_fop}" \\
                   -fo "{output.name_fo}" \\
                   -pdf "{output.name_pdf}"'''
+        if self.config.docbook4xml_fopconf:
+            s += ''' \\
+                  -c "{config.docbook4xml_fopconf}"'''
         return self.shellscript(s, **kwargs)
 
     # -- this is conditionally built--see logic in make_name_pdf() below
@@ -136,6 +175,11 @@ class Docbook4XML(BaseDoctype, SignatureChecker):
     @depends(make_validated_source)
     def make_chunked_html(self, **kwargs):
         '''create chunked HTML output'''
+        params = {'admon.graphics.path': 'images/'}
+        if xsltstep(self, self.config.docbook4xml_engine,
+                    self.config.docbook4xml_xslchunk,
+                    params=params):
+            return True
         s = '''"{config.docbook4xml_xsltproc}" \\
                   --nonet \\
                   --stringparam admon.graphics.path images/ \\
@@ -159,6 +203,8 @@ class Docbook4XML(BaseDoctype, SignatureChecker):
     @depends(make_name_html, make_name_pdf, make_name_htmls, make_name_txt)
     def remove_validated_source(self, **kwargs):
         '''create final index.html symlink'''
+        self.validtree = None
+        self.htmlstree = None
         s = 'rm --verbose -- "{output.validsource}"'
         return self.shellscript(s, **kwargs)
 
@@ -167,29 +213,37 @@ class Docbook4XML(BaseDoctype, SignatureChecker):
         descrip = 'executables and data files for %s' % (cls.formatname,)
         g = p.add_argument_group(title=cls.__name__, description=descrip)
         gadd = g.add_argument
+        gadd('--docbook4xml-engine', choices=ENGINES, default='shell',
+             help='shell tools or in-process lxml [%(default)s]')
         gadd('--docbook4xml-xslchunk', type=arg_isreadablefile,
-             default=xslchunk_finder(),
+             default=LazyDefault(xslchunk_finder),
              help='full path to LDP HTML chunker XSL [%(default)s]')
         gadd('--docbook4xml-xslsingle', type=arg_isreadablefile,
-             default=xslsingle_finder(),
+             default=LazyDefault(xslsingle_finder),
              help='full path to LDP HTML single-page XSL [%(default)s]')
         gadd('--docbook4xml-xslprint', type=arg_isstr,
-             default=xslprint_finder(),
+             default=LazyDefault(xslprint_finder),
              help='full path to LDP FO print XSL [%(default)s]')
         gadd('--docbook4xml-xmllint', type=arg_isexecutable,
-             default=which('xmllint'),
+             default=LazyDefault(which, 'xmllint'),
              help='full path to xmllint [%(default)s]')
         gadd('--docbook4xml-xsltproc', type=arg_isexecutable,
-             default=which('xsltproc'),
+             default=LazyDefault(which, 'xsltproc'),
              help='full path to xsltproc [%(default)s]')
         gadd('--docbook4xml-html2text', type=arg_isexecutable,
-             default=which('html2text'),
+             default=LazyDefault(which, 'html2text'),
              help='full path to html2text [%(default)s]')
+        gadd('--docbook4xml-textengine', choices=TEXTENGINES,
+             default='html2text',
+             help='html2text or builtin HTML to text [%(default)s]')
         gadd('--docbook4xml-fop', type=arg_isexecutable,
-             default=which('fop'),
+             default=LazyDefault(which, 'fop'),
              help='full path to fop [%(default)s]')
+        gadd('--docbook4xml-fopconf', type=arg_isreadablefile,
+             default=None,
+             help='FOP configuration file (fop -c) [%(default)s]')
         gadd('--docbook4xml-dblatex', type=arg_isexecutable,
-             default=which('dblatex'),
+             default=LazyDefault(which, 'dblatex'),
              help='full path to dblatex [%(default)s]')
 
 #
@@ -12,7 +12,12 @@ from tldp.utils import which, firstfoundfile
 from tldp.utils import arg_isexecutable, isexecutable
 from tldp.utils import arg_isreadablefile, isreadablefile
 
+from tldp.cascadingconfig import LazyDefault
 from tldp.doctypes.common import BaseDoctype, SignatureChecker, depends
+from tldp.doctypes.common import memoize
+from tldp.doctypes.xmltools import xsltstep, validatestep, ENGINES
+from tldp.doctypes.htmltext import textstep, TEXTENGINES
+from tldp.fopserver import fopstep
 
 logger = logging.getLogger(__name__)
 
@@ -65,7 +70,19 @@ class Docbook5XML(BaseDoctype, SignatureChecker):
                 'docbook5xml_xslsingle': isreadablefile,
                 }
 
+    # -- the xincluded document, if parsed in-process (lxml engine)
+    validtree = None
+
+    # -- the single-page HTML, if made in-process (for the text engine)
+    htmlstree = None
+
+    @memoize(outputs=['{output.validsource}'], sources=True)
     def make_xincluded_source(self, **kwargs):
+        result = validatestep(self, self.config.docbook5xml_engine,
+                              self.source.filename,
+                              output=self.output.validsource, xinclude=True)
+        if result is not None:
+            return result
         s = '''"{config.docbook5xml_xmllint}" > "{output.validsource}" \\
                   --nonet \\
                   --noent \\
@@ -75,7 +92,14 @@ class Docbook5XML(BaseDoctype, SignatureChecker):
 
     @depends(make_xincluded_source)
     def validate_source(self, **kwargs):
-        '''consider lxml.etree and other validators'''
+        '''validate against the RelaxNG schema (jing or lxml.etree)'''
+        source = self.validtree
+        if source is None:
+            source = self.output.validsource
+        result = validatestep(self, self.config.docbook5xml_engine, source,
+                              rngfile=self.config.docbook5xml_rngfile)
+        if result is not None:
+            return result
         s = '''"{config.docbook5xml_jing}" \\
                   "{config.docbook5xml_rngfile}" \\
                   "{output.validsource}"'''
@@ -84,6 +108,12 @@ class Docbook5XML(BaseDoctype, SignatureChecker):
     @depends(validate_source)
     def make_name_htmls(self, **kwargs):
         '''create a single page HTML output'''
+        params = {'admon.graphics.path': 'images/'}
+        if xsltstep(self, self.config.docbook5xml_engine,
+                    self.config.docbook5xml_xslsingle,
+                    output=self.output.name_htmls, params=params,
+                    keep='htmlstree'):
+            return True
         s = '''"{config.docbook5xml_xsltproc}" > "{output.name_htmls}" \\
                   --nonet \\
                   --stringparam admon.graphics.path images/ \\
@@ -95,6 +125,9 @@ class Docbook5XML(BaseDoctype, SignatureChecker):
     @depends(make_name_htmls)
     def make_name_txt(self, **kwargs):
         '''create text output'''
+        result = textstep(self, self.config.docbook5xml_textengine, **kwargs)
+        if result is not None:
+            return result
         s = '''"{config.docbook5xml_html2text}" > "{output.name_txt}" \\
                   -style pretty \\
                   -nobs \\
@@ -102,24 +135,36 @@ class Docbook5XML(BaseDoctype, SignatureChecker):
         return self.shellscript(s, **kwargs)
 
     @depends(validate_source)
+    @memoize(inputs=['{output.validsource}'], outputs=['{output.name_fo}'])
     def make_fo(self, **kwargs):
         '''generate the Formatting Objects intermediate output'''
+        if not self.config.script:
+            self.removals.add(self.output.name_fo)
+        params = {'fop.extensions': '0', 'fop1.extensions': '1'}
+        if xsltstep(self, self.config.docbook5xml_engine,
+                    self.config.docbook5xml_xslprint,
+                    output=self.output.name_fo, params=params, nonet=False):
+            return True
         s = '''"{config.docbook5xml_xsltproc}" > "{output.name_fo}" \\
                   --stringparam fop.extensions 0 \\
                   --stringparam fop1.extensions 1 \\
                   "{config.docbook5xml_xslprint}" \\
                   "{output.validsource}"'''
-        if not self.config.script:
-            self.removals.add(self.output.name_fo)
         return self.shellscript(s, **kwargs)
 
     # -- this is conditionally built--see logic in make_name_pdf() below
     # @depends(make_fo)
     def make_pdf_with_fop(self, **kwargs):
         '''use FOP to create a PDF'''
+        result = fopstep(self, self.config.docbook5xml_fopconf)
+        if result is not None:
+            return result
         s = '''"{config.docbook5xml_fop}" \\
                   -fo "{output.name_fo}" \\
                   -pdf "{output.name_pdf}"'''
+        if self.config.docbook5xml_fopconf:
+            s += ''' \\
+                  -c "{config.docbook5xml_fopconf}"'''
         return self.shellscript(s, **kwargs)
 
     # -- this is conditionally built--see logic in make_name_pdf() below
@@ -150,6 +195,11 @@ class Docbook5XML(BaseDoctype, SignatureChecker):
     @depends(make_name_htmls, validate_source)
     def make_chunked_html(self, **kwargs):
         '''create chunked HTML output'''
+        params = {'admon.graphics.path': 'images/'}
+        if xsltstep(self, self.config.docbook5xml_engine,
+                    self.config.docbook5xml_xslchunk,
+                    params=params):
+            return True
         s = '''"{config.docbook5xml_xsltproc}" \\
                   --nonet \\
                   --stringparam admon.graphics.path images/ \\
@@ -173,6 +223,8 @@ class Docbook5XML(BaseDoctype, SignatureChecker):
     @depends(make_name_htmls, make_name_html, make_name_pdf, make_name_txt)
     def remove_xincluded_source(self, **kwargs):
         '''remove the xincluded source file'''
+        self.validtree = None
+        self.htmlstree = None
         s = 'rm --verbose -- "{output.validsource}"'
         return self.shellscript(s, **kwargs)
 
@@ -181,36 +233,44 @@ class Docbook5XML(BaseDoctype, SignatureChecker):
         descrip = 'executables for %s' % (cls.formatname,)
         g = p.add_argument_group(title=cls.__name__, description=descrip)
         gadd = g.add_argument
+        gadd('--docbook5xml-engine', choices=ENGINES, default='shell',
+             help='shell tools or in-process lxml [%(default)s]')
         gadd('--docbook5xml-xslchunk', type=arg_isreadablefile,
-             default=xslchunk_finder(),
+             default=LazyDefault(xslchunk_finder),
              help='full path to LDP HTML chunker XSL [%(default)s]')
         gadd('--docbook5xml-xslsingle', type=arg_isreadablefile,
-             default=xslsingle_finder(),
+             default=LazyDefault(xslsingle_finder),
              help='full path to LDP HTML single-page XSL [%(default)s]')
         gadd('--docbook5xml-xslprint', type=arg_isreadablefile,
-             default=xslprint_finder(),
+             default=LazyDefault(xslprint_finder),
              help='full path to LDP FO print XSL [%(default)s]')
 
         gadd('--docbook5xml-rngfile', type=arg_isreadablefile,
-             default=rngfile_finder(),
+             default=LazyDefault(rngfile_finder),
              help='full path to docbook.rng [%(default)s]')
         gadd('--docbook5xml-xmllint', type=arg_isexecutable,
-             default=which('xmllint'),
+             default=LazyDefault(which, 'xmllint'),
              help='full path to xmllint [%(default)s]')
         gadd('--docbook5xml-xsltproc', type=arg_isexecutable,
-             default=which('xsltproc'),
+             default=LazyDefault(which, 'xsltproc'),
              help='full path to xsltproc [%(default)s]')
         gadd('--docbook5xml-html2text', type=arg_isexecutable,
-             default=which('html2text'),
+             default=LazyDefault(which, 'html2text'),
              help='full path to html2text [%(default)s]')
+        gadd('--docbook5xml-textengine', choices=TEXTENGINES,
+             default='html2text',
+             help='html2text or builtin HTML to text [%(default)s]')
         gadd('--docbook5xml-fop', type=arg_isexecutable,
-             default=which('fop'),
+             default=LazyDefault(which, 'fop'),
              help='full path to fop [%(default)s]')
+        gadd('--docbook5xml-fopconf', type=arg_isreadablefile,
+             default=None,
+             help='FOP configuration file (fop -c) [%(default)s]')
         gadd('--docbook5xml-dblatex', type=arg_isexecutable,
-             default=which('dblatex'),
+             default=LazyDefault(which, 'dblatex'),
              help='full path to dblatex [%(default)s]')
         gadd('--docbook5xml-jing', type=arg_isexecutable,
-             default=which('jing'),
+             default=LazyDefault(which, 'jing'),
              help='full path to jing [%(default)s]')
 
 
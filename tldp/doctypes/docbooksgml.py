@@ -13,7 +13,10 @@ from tldp.utils import which, firstfoundfile
 from tldp.utils import arg_isexecutable, isexecutable
 from tldp.utils import arg_isreadablefile, isreadablefile
 
+from tldp.cascadingconfig import LazyDefault
 from tldp.doctypes.common import BaseDoctype, SignatureChecker, depends
+from tldp.doctypes.common import memoize
+from tldp.doctypes.htmltext import textstep, TEXTENGINES
 
 logger = logging.getLogger(__name__)
 
@@ -77,6 +80,7 @@ class DocbookSGML(BaseDoctype, SignatureChecker):
         return self.shellscript(s, **kwargs)
 
     @depends(move_blank_indexsgml_into_source)
+    @memoize(outputs=['HTML.index'], sources=True)
     def make_data_indexsgml(self, **kwargs):
         '''collect document's index entries into a data file (HTML.index)'''
         if self.indexsgml:
@@ -89,6 +93,7 @@ class DocbookSGML(BaseDoctype, SignatureChecker):
         return self.shellscript(s, **kwargs)
 
     @depends(make_data_indexsgml)
+    @memoize(inputs=['HTML.index'], outputs=['index.sgml'], sources=True)
     def make_indexsgml(self, **kwargs):
         '''generate the final document index file (index.sgml)'''
         if self.indexsgml:
@@ -120,14 +125,15 @@ class DocbookSGML(BaseDoctype, SignatureChecker):
     @depends(move_indexsgml_into_source)
     def cleaned_indexsgml(self, **kwargs):
         '''clean the junk from the output dir after building the index.sgml'''
-        # -- be super cautious before removing a bunch of files
+        # -- be super cautious before removing a bunch of files; the find
+        #    below runs in the output directory (see execute_shellscript),
+        #    which must never be the source directory
         if not self.config.script:
-            cwd = os.getcwd()
-            if not os.path.samefile(cwd, self.output.dirname):
+            dirname = self.output.dirname
+            if not os.path.isdir(dirname) or \
+                    os.path.samefile(dirname, self.source.dirname):
                 logger.error("%s (cowardly) refusing to clean directory %s",
-                             self.source.stem, cwd)
-                logger.error("%s expected to find %s",
-                             self.source.stem, self.output.dirname)
+                             self.source.stem, dirname)
                 return False
         preserve = os.path.basename(self.output.MD5SUMS)
         s = '''find . -mindepth 1 -maxdepth 1 -not -type d -not -name {} -delete -print'''
@@ -157,12 +163,40 @@ class DocbookSGML(BaseDoctype, SignatureChecker):
     @depends(make_name_htmls)
     def make_name_txt(self, **kwargs):
         '''create text output (from single-page HTML)'''
+        result = textstep(self, self.config.docbooksgml_textengine, **kwargs)
+        if result is not None:
+            return result
         s = '''"{config.docbooksgml_html2text}" > "{output.name_txt}" \\
                   -style pretty \\
                   -nobs \\
                   "{output.name_htmls}"'''
         return self.shellscript(s, **kwargs)
 
+    @depends(make_name_htmls)
+    def make_html(self, **kwargs):
+        '''create chunked HTML outputs'''
+        s = '''"{config.docbooksgml_jw}" \\
+                 -f docbook \\
+                 -b html \\
+                 --dsl "{config.docbooksgml_ldpdsl}#html" \\
+                 -V '%callout-graphics-path%=images/callouts/' \\
+                 -V '%stock-graphics-extension%=.png' \\
+                 --output . \\
+                 "{source.filename}"'''
+        return self.shellscript(s, **kwargs)
+
+    @depends(make_html)
+    def make_name_html(self, **kwargs):
+        '''rename openjade's index.html to LDP standard name STEM.html'''
+        s = 'mv -v --no-clobber -- "{output.name_indexhtml}" "{output.name_html}"'
+        return self.shellscript(s, **kwargs)
+
+    @depends(make_name_html)
+    def make_name_indexhtml(self, **kwargs):
+        '''create final index.html symlink'''
+        s = 'ln -svr -- "{output.name_html}" "{output.name_indexhtml}"'
+        return self.shellscript(s, **kwargs)
+
     def make_pdf_with_jw(self, **kwargs):
         '''use jw (openjade) to create a PDF'''
         s = '''"{config.docbooksgml_jw}" \\
@@ -181,7 +215,9 @@ class DocbookSGML(BaseDoctype, SignatureChecker):
                      "{source.filename}"'''
         return self.shellscript(s, **kwargs)
 
-    @depends(cleaned_indexsgml)
+    # -- jw writes its work files into the output directory under fixed
+    #    names, so two jw steps must never run at the same time (--stepjobs)
+    @depends(make_html)
     def make_name_pdf(self, **kwargs):
         stem = self.source.stem
         classname = self.__class__.__name__
@@ -195,55 +231,33 @@ class DocbookSGML(BaseDoctype, SignatureChecker):
                     stem, classname, 'make_pdf_with_dblatex')
         return self.make_pdf_with_dblatex(**kwargs)
 
-    @depends(make_name_htmls)
-    def make_html(self, **kwargs):
-        '''create chunked HTML outputs'''
-        s = '''"{config.docbooksgml_jw}" \\
-                 -f docbook \\
-                 -b html \\
-                 --dsl "{config.docbooksgml_ldpdsl}#html" \\
-                 -V '%callout-graphics-path%=images/callouts/' \\
-                 -V '%stock-graphics-extension%=.png' \\
-                 --output . \\
-                 "{source.filename}"'''
-        return self.shellscript(s, **kwargs)
-
-    @depends(make_html)
-    def make_name_html(self, **kwargs):
-        '''rename openjade's index.html to LDP standard name STEM.html'''
-        s = 'mv -v --no-clobber -- "{output.name_indexhtml}" "{output.name_html}"'
-        return self.shellscript(s, **kwargs)
-
-    @depends(make_name_html)
-    def make_name_indexhtml(self, **kwargs):
-        '''create final index.html symlink'''
-        s = 'ln -svr -- "{output.name_html}" "{output.name_indexhtml}"'
-        return self.shellscript(s, **kwargs)
-
     @classmethod
     def argparse(cls, p):
         descrip = 'executables and data files for %s' % (cls.formatname,)
         g = p.add_argument_group(title=cls.__name__, description=descrip)
         g.add_argument('--docbooksgml-docbookdsl', type=arg_isreadablefile,
-                       default=docbookdsl_finder(),
+                       default=LazyDefault(docbookdsl_finder),
                        help='full path to html/docbook.dsl [%(default)s]')
         g.add_argument('--docbooksgml-ldpdsl', type=arg_isreadablefile,
-                       default=ldpdsl_finder(),
+                       default=LazyDefault(ldpdsl_finder),
                        help='full path to ldp/ldp.dsl [%(default)s]')
         g.add_argument('--docbooksgml-jw', type=arg_isexecutable,
-                       default=which('jw'),
+                       default=LazyDefault(which, 'jw'),
                        help='full path to jw [%(default)s]')
         g.add_argument('--docbooksgml-html2text', type=arg_isexecutable,
-                       default=which('html2text'),
+                       default=LazyDefault(which, 'html2text'),
                        help='full path to html2text [%(default)s]')
+        g.add_argument('--docbooksgml-textengine', choices=TEXTENGINES,
+                       default='html2text',
+                       help='html2text or builtin HTML to text [%(default)s]')
         g.add_argument('--docbooksgml-openjade', type=arg_isexecutable,
-                       default=which('openjade'),
+                       default=LazyDefault(which, 'openjade'),
                        help='full path to openjade [%(default)s]')
         g.add_argument('--docbooksgml-dblatex', type=arg_isexecutable,
-                       default=which('dblatex'),
+                       default=LazyDefault(which, 'dblatex'),
                        help='full path to dblatex [%(default)s]')
         g.add_argument('--docbooksgml-collateindex', type=arg_isexecutable,
-                       default=which('collateindex.pl'),
+                       default=LazyDefault(which, 'collateindex.pl'),
                        help='full path to collateindex [%(default)s]')
 
 #
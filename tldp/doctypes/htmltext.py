@@ -0,0 +1,324 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''render HTML as plain text, in the layout of html2text -style pretty -nobs
+
+Every doctype produces its text output from the single-page HTML output.
+The builtin text engine does that in-process, without starting html2text.
+The HTML is read (and the text written) in chunks, so memory use does not
+depend on the size of the document.  If the lxml XSLT engine has just
+produced the single-page HTML, its result tree is walked directly, without
+reading the file back.
+
+The layout follows html2text's "pretty" style:  paragraphs are filled to 79
+columns, list items are marked with "  * " (or "  1. "), definition lists,
+blockquotes and nested lists are indented, preformatted text is kept as is,
+and a horizontal rule is a row of "=".  No backspaces are used.
+
+Usage (as a script), e.g. in the output of --script:
+
+  python -c 'from tldp.doctypes.htmltext import main; main()' FILE.html
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import re
+import sys
+import codecs
+import logging
+import textwrap
+
+try:
+    from html.parser import HTMLParser
+    from html.entities import name2codepoint
+except ImportError:
+    from HTMLParser import HTMLParser  # -- python2
+    from htmlentitydefs import name2codepoint
+
+try:
+    unichr
+except NameError:
+    unichr = chr  # -- python3
+
+logger = logging.getLogger(__name__)
+
+TEXTENGINES = ['html2text', 'builtin']
+
+WIDTH = 79
+CHUNKSIZE = 65536
+SNIFFSIZE = 1024  # -- as in the HTML5 encoding prescan
+NBSP = '\xa0'
+CELLSEP = '\x00'
+
+# -- whitespace in HTML, but not the non-breaking space
+whitespace = re.compile('[ \t\r\n\f]+')
+charset = re.compile(br'''charset\s*=\s*["']?([-\w.:]+)''', re.I)
+
+blocks = set(['p', 'div', 'center', 'address', 'form', 'table', 'caption',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+rows = set(['tr', 'dt', 'br'])
+skipped = set(['head', 'script', 'style', 'title'])
+lists = set(['ul', 'ol', 'dir', 'menu'])
+
+
+class HTMLText(HTMLParser):
+    '''an HTMLParser which writes the text of the document to out'''
+
+    def __init__(self, out, width=WIDTH):
+        HTMLParser.__init__(self)
+        self.convert_charrefs = False  # -- handled below (as in python2)
+        self.out = out
+        self.width = width
+        self.words = list()
+        self.indent = list()
+        self.lists = list()
+        self.marker = None
+        self.pre = 0
+        self.skip = 0
+        self.vspace = 0
+        self.started = False
+
+    def space(self, n=1):
+        '''ask for (at least) n blank lines before the next text'''
+        self.vspace = max(self.vspace, n)
+
+    def emit(self, lines):
+        if self.started and self.vspace:
+            self.out.write('\n' * self.vspace)
+        self.vspace = 0
+        self.started = True
+        for line in lines:
+            self.out.write(line.replace(NBSP, ' ').rstrip() + '\n')
+
+    def flush(self):
+        '''write out the pending inline text as a filled paragraph'''
+        text = ''.join(self.words)
+        self.words = list()
+        indent = ''.join(self.indent)
+        first = indent
+        if self.marker is not None:
+            first = indent[:-len(self.marker)] + self.marker
+        if self.pre:
+            lines = text.split('\n')
+            if lines and not lines[-1].strip():
+                lines.pop()
+            if not lines:
+                return
+            self.emit([indent + x.expandtabs() for x in lines])
+            return
+        text = whitespace.sub(' ', text).strip()
+        text = text.replace(CELLSEP, '  ').strip()
+        if not text:
+            return
+        self.marker = None
+        width = max(self.width, len(first) + 20)
+        self.emit(textwrap.wrap(text, width=width, initial_indent=first,
+                                subsequent_indent=indent,
+                                break_long_words=False,
+                                break_on_hyphens=False))
+
+    def handle_starttag(self, tag, attrs):
+        if tag in skipped:
+            self.skip += 1
+            return
+        if self.skip:
+            return
+        if tag in blocks:
+            self.flush()
+            self.space(1)
+        elif tag in rows:
+            self.flush()
+        elif tag == 'pre':
+            self.flush()
+            self.space(1)
+            self.pre += 1
+        elif tag == 'hr':
+            self.flush()
+            self.space(1)
+            indent = ''.join(self.indent)
+            self.emit([indent + '=' * (self.width - len(indent))])
+            self.space(1)
+        elif tag in lists:
+            self.flush()
+            if not self.lists:
+                self.space(1)
+            self.lists.append([tag, 0, False])
+        elif tag == 'li':
+            self.flush()
+            if not self.lists:
+                self.lists.append(['ul', 0, False])
+            frame = self.lists[-1]
+            if frame[2]:
+                self.indent.pop()
+            frame[1] += 1
+            if frame[0] == 'ol':
+                marker = '  %d. ' % (frame[1],)
+            else:
+                marker = '  * '
+            self.indent.append(' ' * len(marker))
+            frame[2] = True
+            self.marker = marker
+        elif tag in ('dd', 'blockquote'):
+            self.flush()
+            if tag == 'blockquote':
+                self.space(1)
+            self.indent.append('    ')
+        elif tag in ('td', 'th'):
+            self.words.append(CELLSEP)
+        elif tag == 'img':
+            alt = dict(attrs).get('alt')
+            if alt:
+                self.words.append('[' + alt + ']')
+
+    def handle_endtag(self, tag):
+        if tag in skipped:
+            self.skip = max(0, self.skip - 1)
+            return
+        if self.skip:
+            return
+        if tag in blocks:
+            self.flush()
+            self.space(1)
+        elif tag in rows:
+            self.flush()
+        elif tag == 'pre':
+            self.flush()
+            self.pre = max(0, self.pre - 1)
+            self.space(1)
+        elif tag in lists:
+            self.flush()
+            if self.lists:
+                frame = self.lists.pop()
+                if frame[2]:
+                    self.indent.pop()
+            if not self.lists:
+                self.space(1)
+        elif tag in ('dd', 'blockquote'):
+            self.flush()
+            if self.indent:
+                self.indent.pop()
+            if tag == 'blockquote':
+                self.space(1)
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.words.append(data)
+
+    def handle_entityref(self, name):
+        codepoint = name2codepoint.get(name)
+        if codepoint is None:
+            self.handle_data('&' + name + ';')
+        else:
+            self.handle_data(unichr(codepoint))
+
+    def handle_charref(self, name):
+        try:
+            if name[:1] in ('x', 'X'):
+                codepoint = int(name[1:], 16)
+            else:
+                codepoint = int(name)
+            self.handle_data(unichr(codepoint))
+        except (ValueError, OverflowError):
+            self.handle_data('&#' + name + ';')
+
+    def close(self):
+        HTMLParser.close(self)
+        self.flush()
+
+
+def sniff_encoding(buf, default='utf-8'):
+    '''return the charset declared at the start of an HTML file'''
+    m = charset.search(buf)
+    if m:
+        name = m.group(1).decode('ascii')
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            pass
+    return default
+
+
+def filetotext(fname, out, width=WIDTH):
+    '''write the text of HTML file fname to out (a text file object)'''
+    conv = HTMLText(out, width=width)
+    with open(fname, 'rb') as f:
+        buf = f.read(SNIFFSIZE)
+        decoder = codecs.getincrementaldecoder(sniff_encoding(buf))('replace')
+        while buf:
+            conv.feed(decoder.decode(buf))
+            buf = f.read(CHUNKSIZE)
+        conv.feed(decoder.decode(b'', True))
+    conv.close()
+
+
+def walk(conv, elem):
+    tag = elem.tag
+    if isinstance(tag, (str, type(''))):  # -- not a comment or PI
+        name = tag.rpartition('}')[2].lower()
+        conv.handle_starttag(name, list(elem.attrib.items()))
+        if elem.text:
+            conv.handle_data(elem.text)
+        for child in elem:
+            walk(conv, child)
+        conv.handle_endtag(name)
+    if elem.tail:
+        conv.handle_data(elem.tail)
+
+
+def treetotext(tree, out, width=WIDTH):
+    '''write the text of a parsed (lxml) HTML tree to out'''
+    conv = HTMLText(out, width=width)
+    root = tree.getroot()
+    if root is not None:
+        walk(conv, root)
+    conv.flush()
+
+
+def textstep(runner, engine, **kwargs):
+    '''create output.name_txt from output.name_htmls (builtin engine)
+
+    If the runner has kept the single-page HTML tree (runner.htmlstree), the
+    tree is used instead of the file.
+
+    Returns: None if the caller should run html2text instead; otherwise
+    True on success and False on failure
+    '''
+    if engine != 'builtin':
+        return None
+    if runner.config.script:
+        s = '''"%s" > "{output.name_txt}" \\
+                  -c 'from tldp.doctypes.htmltext import main; main()' \\
+                  "{output.name_htmls}"'''
+        return runner.shellscript(s % (sys.executable,), **kwargs)
+    output = runner.output
+    tree = getattr(runner, 'htmlstree', None)
+    try:
+        with codecs.open(output.name_txt, 'w', encoding='utf-8') as f:
+            if tree is not None:
+                treetotext(tree, f)
+            else:
+                filetotext(output.name_htmls, f)
+    except (IOError, OSError) as e:
+        logger.error("%s could not create %s: %s",
+                     runner.source.stem, output.name_txt, e)
+        return False
+    return True
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    out = codecs.getwriter('utf-8')(getattr(sys.stdout, 'buffer', sys.stdout))
+    for fname in argv:
+        filetotext(fname, out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+#
+# -- end of file
@@ -10,7 +10,9 @@ import logging
 
 from tldp.utils import which
 from tldp.utils import arg_isexecutable, isexecutable
+from tldp.cascadingconfig import LazyDefault
 from tldp.doctypes.common import BaseDoctype, SignatureChecker, depends
+from tldp.doctypes.htmltext import textstep, TEXTENGINES
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +47,9 @@ class Linuxdoc(BaseDoctype, SignatureChecker):
     @depends(make_name_htmls)
     def make_name_txt(self, **kwargs):
         '''create text output (from single-page HTML)'''
+        result = textstep(self, self.config.linuxdoc_textengine, **kwargs)
+        if result is not None:
+            return result
         s = '''"{config.linuxdoc_html2text}" > "{output.name_txt}" \\
                   -style pretty \\
                   -nobs \\
@@ -79,16 +84,19 @@ class Linuxdoc(BaseDoctype, SignatureChecker):
         descrip = 'executables and data files for %s' % (cls.formatname,)
         g = p.add_argument_group(title=cls.__name__, description=descrip)
         g.add_argument('--linuxdoc-sgmlcheck', type=arg_isexecutable,
-                       default=which('sgmlcheck'),
+                       default=LazyDefault(which, 'sgmlcheck'),
                        help='full path to sgmlcheck [%(default)s]')
         g.add_argument('--linuxdoc-sgml2html', type=arg_isexecutable,
-                       default=which('sgml2html'),
+                       default=LazyDefault(which, 'sgml2html'),
                        help='full path to sgml2html [%(default)s]')
         g.add_argument('--linuxdoc-html2text', type=arg_isexecutable,
-                       default=which('html2text'),
+                       default=LazyDefault(which, 'html2text'),
                        help='full path to html2text [%(default)s]')
+        g.add_argument('--linuxdoc-textengine', choices=TEXTENGINES,
+                       default='html2text',
+                       help='html2text or builtin HTML to text [%(default)s]')
         g.add_argument('--linuxdoc-htmldoc', type=arg_isexecutable,
-                       default=which('htmldoc'),
+                       default=LazyDefault(which, 'htmldoc'),
                        help='full path to htmldoc [%(default)s]')
 
 #
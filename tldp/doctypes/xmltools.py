@@ -0,0 +1,297 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''in-process XML processing for the DocBook XML doctypes (requires lxml)
+
+The shell steps of Docbook4XML and Docbook5XML start xsltproc three times
+for every document, and each xsltproc parses and compiles the (very large)
+DocBook XSL stylesheets again.  With the lxml engine, each stylesheet is
+compiled once per process and reused for every document in the run.
+
+Similarly, validation (xmllint, or jing, which starts a JVM for every
+document) runs in-process; the validated tree is kept by the doctype and
+handed to the XSLT steps without parsing the file again.
+
+If lxml is not installed, or a stylesheet cannot be compiled or applied, the
+functions here tell the caller to fall back to its shell script.
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import copy
+import threading
+import logging
+
+# -- lxml.etree, imported when first needed (see available()); False if lxml
+#    is not installed
+etree = None
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ['shell', 'lxml']
+
+
+class CompiledPool(object):
+    '''compiled XSLT stylesheets (or schemas), reused across documents
+
+    An lxml.etree.XSLT object must not be used by two threads at the same
+    time, so the pool hands out each compiled object to one caller at a time
+    and compiles another only when all of them are busy (e.g. with
+    --stepjobs or the asyncio engine).  A file which cannot be compiled is
+    not tried again.
+    '''
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.idle = dict()
+        self.failed = dict()
+        self.compiled = 0
+
+    def compile(self, fname, nonet):
+        compiled = self.factory(fname, nonet)
+        with self.lock:
+            self.compiled += 1
+        logger.debug("Compiled %s (%d total).", fname, self.compiled)
+        return compiled
+
+    def acquire(self, fname, nonet=True):
+        key = (fname, nonet)
+        with self.lock:
+            if key in self.failed:
+                raise self.failed[key]
+            idle = self.idle.setdefault(key, list())
+            if idle:
+                return idle.pop()
+        try:
+            return self.compile(fname, nonet)
+        except (etree.XMLSyntaxError, etree.XSLTParseError,
+                etree.RelaxNGParseError, IOError) as e:
+            with self.lock:
+                self.failed[key] = e
+            raise
+
+    def release(self, fname, nonet, compiled):
+        with self.lock:
+            self.idle.setdefault((fname, nonet), list()).append(compiled)
+
+
+def compile_xslt(fname, nonet):
+    parser = etree.XMLParser(no_network=nonet)
+    ac = etree.XSLTAccessControl(read_network=not nonet, write_network=False)
+    return etree.XSLT(etree.parse(fname, parser), access_control=ac)
+
+
+def compile_relaxng(fname, nonet):
+    parser = etree.XMLParser(no_network=nonet)
+    return etree.RelaxNG(etree.parse(fname, parser))
+
+
+stylesheets = CompiledPool(compile_xslt)
+schemas = CompiledPool(compile_relaxng)
+
+
+def available():
+    '''True if lxml is installed (and imported)'''
+    global etree
+    if etree is None:
+        try:
+            from lxml import etree as lxmletree
+        except ImportError:
+            lxmletree = False
+        etree = lxmletree
+    return etree is not False
+
+
+def use_lxml(runner, engine):
+    '''True if the lxml engine should run this (non --script) build step'''
+    if runner.config.script or engine != 'lxml':
+        return False
+    if not available():
+        logger.warning("%s lxml is not installed, using shell engine",
+                       runner.source.stem)
+        return False
+    return True
+
+
+def writeresult(result, output):
+    '''write an XSLT result tree, honouring the xsl:output settings'''
+    with open(output, 'wb') as f:
+        f.write(bytes(result))
+
+
+def xsltransform(runner, xsl, source, output=None, params=None, nonet=True,
+                 keep=None):
+    '''apply stylesheet xsl to source; write the result to output
+
+    runner: the BaseDoctype instance, for logging and the output directory
+    xsl:    filename or URL of the stylesheet
+    source: filename of the input document, or a parsed lxml tree
+    output: filename for the result document; None if the stylesheet writes
+            its own output files (e.g. the DocBook chunker)
+    params: dict of string parameters, like xsltproc --stringparam
+    nonet:  refuse network access, like xsltproc --nonet
+    keep:   if not None, the name of a runner attribute in which to keep the
+            result tree for a later step (e.g. the builtin text engine)
+
+    The parameter base.dir is always set to the output directory, because
+    nothing changes the current working directory of this process.
+
+    Returns: True on success, False (after logging the reason) on failure
+    '''
+    stem = runner.source.stem
+    params = dict(params or dict())
+    params['base.dir'] = runner.output.dirname + os.sep
+    strparams = dict((k, etree.XSLT.strparam(v)) for k, v in params.items())
+    try:
+        xslt = stylesheets.acquire(xsl, nonet=nonet)
+    except (etree.XMLSyntaxError, etree.XSLTParseError, IOError) as e:
+        logger.warning("%s could not compile stylesheet %s: %s",
+                       stem, xsl, e)
+        return False
+    try:
+        if not hasattr(source, 'getroot'):
+            parser = etree.XMLParser(no_network=nonet)
+            source = etree.parse(source, parser)
+        result = xslt(source, **strparams)
+        if output is not None:
+            writeresult(result, output)
+        if keep is not None:
+            setattr(runner, keep, result)
+    except (etree.XMLSyntaxError, etree.XSLTApplyError, IOError) as e:
+        logger.warning("%s could not apply stylesheet %s: %s", stem, xsl, e)
+        for entry in xslt.error_log:
+            logger.info("%s %s", stem, entry)
+        return False
+    finally:
+        stylesheets.release(xsl, nonet, xslt)
+    return True
+
+
+# -- serializes the copies of a handed-over tree (see handedtree())
+handover = threading.Lock()
+
+
+def handedtree(runner):
+    '''return the tree handed over by validatestep(), or None
+
+    Under --stepjobs, the steps which read the tree may run at the same time
+    in different threads.  An lxml tree must not be shared between threads,
+    so each step then gets its own copy (still much cheaper than parsing and
+    validating the file again).
+    '''
+    tree = getattr(runner, 'validtree', None)
+    if tree is None:
+        return None
+    if (getattr(runner.config, 'stepjobs', 1) or 1) < 2:
+        return tree
+    with handover:
+        return copy.deepcopy(tree)
+
+
+def xsltstep(runner, engine, xsl, source=None, output=None, params=None,
+             nonet=True, keep=None):
+    '''run xsltransform() for a build step, if the lxml engine is selected
+
+    If source is None, the validated source is used: the tree handed over
+    by validatestep(), if there is one, or else output.validsource.
+
+    Returns: True if the step is done; False if the caller should run its
+    shell script instead (shell engine, --script, or lxml failure)
+    '''
+    if not use_lxml(runner, engine):
+        return False
+    if source is None:
+        source = handedtree(runner)
+    if source is None:
+        source = runner.output.validsource
+    if xsltransform(runner, xsl, source, output=output, params=params,
+                    nonet=nonet, keep=keep):
+        return True
+    logger.warning("%s lxml engine failed, falling back to shell",
+                   runner.source.stem)
+    return False
+
+
+def logerrors(runner, what, error_log):
+    for entry in error_log:
+        logger.error("%s %s: %s", runner.source.stem, what, entry)
+
+
+def validatestep(runner, engine, source, output=None, xinclude=False,
+                 dtd=False, rngfile=None):
+    '''parse, XInclude and validate a document for a build step with lxml
+
+    runner:   the BaseDoctype instance; on success, runner.validtree is set
+              to the resulting tree, for the following steps
+    source:   filename of the document, or a tree from an earlier step
+    output:   if not None, write the resulting document here, like
+              xmllint > output
+    xinclude: process XInclude elements, like xmllint --xinclude
+    dtd:      load the DTD and validate against it after the XInclude
+              processing, like xmllint --postvalid
+    rngfile:  validate against this RelaxNG schema, like jing; the schema is
+              compiled once per process
+
+    Entities are always substituted (xmllint --noent) and the network is
+    never used (xmllint --nonet).
+
+    Returns: None if the caller should run its shell script instead (shell
+    engine, --script, or lxml could not process the document); otherwise
+    True if the document is valid, False if it is not
+    '''
+    if not use_lxml(runner, engine):
+        return None
+    stem = runner.source.stem
+    try:
+        if hasattr(source, 'getroot'):
+            tree = source
+        else:
+            # -- the DTD is loaded for its entity declarations, even if
+            #    the document is not validated against it
+            parser = etree.XMLParser(no_network=True, resolve_entities=True,
+                                     load_dtd=True)
+            tree = etree.parse(source, parser)
+        if xinclude:
+            tree.xinclude()
+    except (etree.XMLSyntaxError, etree.XIncludeError, IOError) as e:
+        logger.warning("%s lxml could not read %s: %s, falling back to shell",
+                       stem, source, e)
+        return None
+
+    if dtd:
+        validator = tree.docinfo.externalDTD
+        if validator is None:
+            logger.warning("%s lxml could not load DTD %s, falling back to "
+                           "shell", stem, tree.docinfo.system_url)
+            return None
+        if not validator.validate(tree):
+            logerrors(runner, 'DTD validation', validator.error_log)
+            return False
+
+    if rngfile:
+        try:
+            validator = schemas.acquire(rngfile)
+        except (etree.XMLSyntaxError, etree.RelaxNGParseError, IOError) as e:
+            logger.warning("%s lxml could not compile schema %s: %s, "
+                           "falling back to shell", stem, rngfile, e)
+            return None
+        try:
+            if not validator.validate(tree):
+                logerrors(runner, 'RelaxNG validation', validator.error_log)
+                return False
+        finally:
+            schemas.release(rngfile, True, validator)
+
+    if output is not None:
+        encoding = tree.docinfo.encoding or 'UTF-8'
+        tree.write(output, encoding=encoding, xml_declaration=True)
+    runner.validtree = tree
+    return True
+
+#
+# -- end of file
@@ -6,25 +6,33 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
+import io
 import os
 import sys
+import copy
 import errno
 import signal
 import shutil
 import logging
-import inspect
 import collections
 from argparse import Namespace
 
 from tldp.typeguesser import knowndoctypes
-from tldp.sources import SourceDocument, arg_issourcedoc
+from tldp.sources import SourceDocument, arg_issourcedoc, scansourcedirs
+from tldp.sources import IGNORABLE_SOURCE, entrystem
 from tldp.outputs import OutputDirectory
+from tldp.ldpcollection import LDPDocumentCollection
 from tldp.inventory import Inventory, status_classes, status_types, stypes
 from tldp.config import collectconfiguration
 from tldp.utils import arg_isloglevel, arg_isdirectory
-from tldp.utils import swapdirs, sameFilesystem
+from tldp.utils import swapdirs, sameFilesystem, which, fscounts
 from tldp.doctypes.common import preamble, postamble
 
+# -- the caches, --vcs, --watch, --serve and the build machinery are
+#    imported by the functions which use them (see also asyncengine());
+#    most invocations need few of them, and --help and --doctypes none
+
+
 # -- Don't freak out with IOError when our STDOUT, handled with
 #    head, sed, awk, grep, etc; and, also deal with a user's ctrl-C
 #    the same way (i.e. no traceback, just stop)
@@ -50,6 +58,14 @@ ERR_NEEDPUBDIR = "Option --pubdir (and --sourcedir) required "
 ERR_NEEDSOURCEDIR = "Option --sourcedir (and --pubdir) required "
 ERR_UNKNOWNARGS = "Unknown arguments received: "
 ERR_EXTRAARGS = "Extra arguments received: "
+ERR_NEEDVCS = "Option --vcs git required "
+ERR_UNKNOWNDOCTYPE = "Unknown doctype (see --doctypes): "
+
+# -- selects the documents changed since the last published revision; a
+#    --publish of this (or of all work) records the new revision
+#
+CHANGED = 'changed'
+COMPLETE_SELECTIONS = (CHANGED, 'work', 'all')
 
 
 def show_doctypes(config, *args, **kwargs):
@@ -60,7 +76,7 @@ def show_doctypes(config, *args, **kwargs):
     print('', file=file)
     for doctype in knowndoctypes:
         classname = doctype.__name__
-        fname = os.path.abspath(inspect.getmodule(doctype).__file__)
+        fname = os.path.abspath(sys.modules[doctype.__module__].__file__)
         extensions = ', '.join(doctype.extensions)
         print('{}'.format(classname), file=file)
         print('      format name: {}'.format(doctype.formatname), file=file)
@@ -73,6 +89,22 @@ def show_doctypes(config, *args, **kwargs):
     return os.EX_OK
 
 
+def show_plan(config, *args, **kwargs):
+    if args:
+        return ERR_EXTRAARGS + ' '.join(args)
+    file = kwargs.get('file', sys.stdout)
+    doctypes, unknown = getDocumentClasses([config.show_plan])
+    if unknown:
+        return ERR_UNKNOWNDOCTYPE + config.show_plan
+    doctype = doctypes.pop()
+    print("Build plan for {} ({}):".format(doctype.__name__,
+                                           doctype.formatname), file=file)
+    print('', file=file)
+    doctype.buildplan().detail(file=file)
+    print('', file=file)
+    return os.EX_OK
+
+
 def show_statustypes(config, *args, **kwargs):
     if args:
         return ERR_EXTRAARGS + ' '.join(args)
@@ -106,7 +138,7 @@ def summary(config, *args, **kwargs):
     file = kwargs.get('file', sys.stdout)
     inv = kwargs.get('inv', None)
     if inv is None:
-        inv = Inventory(config.pubdir, config.sourcedir)
+        inv = createInventory(config)
     width = Namespace()
     width.doctype = max([len(x.__name__) for x in knowndoctypes])
     width.status = max([len(x) for x in status_types])
@@ -210,11 +242,11 @@ def createBuildDirectory(d):
 def builddir_setup(config):
     '''create --builddir; ensure it shares a filesystem with --pubdir'''
     if not config.builddir:
-        builddir = opj(opd(opa(config.pubdir)), 'ldptool-build')
-        ready, error = createBuildDirectory(builddir)
-        if not ready:
-            return ready, error
-        config.builddir = builddir
+        config.builddir = opj(opd(opa(config.pubdir)), 'ldptool-build')
+    # -- (re)create it; publish() removes an empty --builddir
+    ready, error = createBuildDirectory(config.builddir)
+    if not ready:
+        return ready, error
 
     if not sameFilesystem(config.pubdir, config.builddir):
         return False, "--pubdir and --builddir must be on the same filesystem"
@@ -270,8 +302,29 @@ def prepare_docs_build_mode(config, docs):
     return True, None
 
 
-def docbuild(config, docs, **kwargs):
-    buildsuccess = False
+def buildjobs(config, docs):
+    '''return the number of documents which may be built concurrently'''
+    if config.script:
+        return 1
+    jobs = getattr(config, 'jobs', 1)
+    if jobs is None:
+        jobs = 1
+    elif jobs == 0:
+        import multiprocessing
+        jobs = multiprocessing.cpu_count()
+    return max(1, min(jobs, len(docs)))
+
+
+def docbuild_worker(args):
+    '''build a single document in a worker process (see docbuild_parallel)'''
+    config, source, x, count, kwargs = args
+    logger.info("%s (%d of %d) initiating build", source.stem, x, count)
+    working = source.working
+    runner = source.doctype(source=source, output=working, config=config)
+    return runner.generate(**kwargs), runner.stepstats
+
+
+def docbuild_serial(config, docs, stepstats, **kwargs):
     result = list()
     for x, source in enumerate(docs, 1):
         working = source.working
@@ -281,6 +334,105 @@ def docbuild(config, docs, **kwargs):
         logger.info("%s (%d of %d) initiating build [%s]",
                     source.stem, x, len(docs), status)
         result.append(runner.generate(**kwargs))
+        stepstats.update(runner.stepstats)
+    return result
+
+
+def docbuild_parallel(config, docs, jobs, stepstats, **kwargs):
+    '''build documents in a pool of worker processes
+
+    Each BaseDoctype.generate() runs in its own process, so the document
+    toolchains for different documents can run on different CPUs.  The
+    result list is returned in the same order as docs.
+    '''
+    import multiprocessing
+    result = list()
+    count = len(docs)
+    tasks = [(config, source, x, count, kwargs)
+             for x, source in enumerate(docs, 1)]
+    logger.info("Building %d documents with %d jobs.", count, jobs)
+    pool = multiprocessing.Pool(processes=jobs)
+    try:
+        for x, (source, (success, stats)) in enumerate(
+                zip(docs, pool.imap(docbuild_worker, tasks)), 1):
+            result.append(success)
+            stepstats.update(stats)
+            status = 'progress, %d failures, %d successes'
+            status = status % (result.count(False), result.count(True),)
+            logger.info("%s (%d of %d) finished build [%s]",
+                        source.stem, x, count, status)
+        pool.close()
+    except Exception:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return result
+
+
+def log_stepstats(stepstats):
+    '''report the step cache hits and misses for each build step'''
+    steps = sorted(set(name for name, _ in stepstats))
+    for name in steps:
+        logger.info("Step cache %s: %d hits, %d misses.", name,
+                    stepstats[(name, 'hits')], stepstats[(name, 'misses')])
+
+
+def asyncengine():
+    '''return tldp.asyncexec.AsyncEngine (None if unavailable)
+
+    Imported only when asked for; asyncio is slow to import.
+    '''
+    try:
+        from tldp.asyncexec import AsyncEngine
+    except (ImportError, SyntaxError):
+        return None  # -- python2 or python3 < 3.5
+    return AsyncEngine
+
+
+def configuretools(config, docs):
+    '''find (and check) the tools once, before building docs'''
+    from tldp.toolcache import ToolCache
+    tools = ToolCache.fromconfig(config)
+    versions = not config.script and \
+        bool(getattr(config, 'buildcache', False) or
+             getattr(config, 'stepcache', False))
+    try:
+        tools.configure(config, set(x.doctype for x in docs),
+                        versions=versions)
+    finally:
+        tools.close()
+    logger.debug("Found tools with %r.", tools)
+
+
+def docbuild(config, docs, **kwargs):
+    from tldp.fopserver import FopServer
+    buildsuccess = False
+    stepstats = collections.Counter()
+    configuretools(config, docs)
+    jobs = buildjobs(config, docs)
+    engine = getattr(config, 'engine', 'process')
+    AsyncEngine = None
+    if engine == 'asyncio':
+        AsyncEngine = asyncengine()
+        if AsyncEngine is None:
+            logger.warning("asyncio engine unavailable, using process engine")
+            engine = 'process'
+    fopserver = FopServer.fromconfig(config, docs)
+    try:
+        if engine == 'asyncio' and not config.script:
+            result = AsyncEngine(jobs).docbuild(config, docs, stepstats,
+                                                **kwargs)
+        elif jobs > 1:
+            result = docbuild_parallel(config, docs, jobs, stepstats,
+                                       **kwargs)
+        else:
+            result = docbuild_serial(config, docs, stepstats, **kwargs)
+    finally:
+        if fopserver is not None:
+            fopserver.stop()
+            config.fopserver_socket = None
+    log_stepstats(stepstats)
     if all(result):
         buildsuccess = True
     return buildsuccess, list(zip(result, docs))
@@ -373,41 +525,48 @@ def getStatusNames(args):
 
 
 def getDocumentClasses(args):
-    largs = [x.lower() for x in args]
-    sought = list()
-    for cls in knowndoctypes:
-        if cls.__name__.lower() in largs:
-            sought.append(cls)
+    known = dict((cls.__name__.lower(), cls) for cls in knowndoctypes)
+    sought = set()
+    remainder = set()
+    for arg in args:
+        cls = known.get(arg.lower())
+        if cls is None:
+            remainder.add(arg)
         else:
-            sought.append(None)
-    remainder = set([y for x, y in zip(sought, args) if not x])
-    sought = set(filter(None, sought))
+            sought.add(cls)
     return sought, remainder
 
 
 def getDocumentsByStems(docs, args):
+    '''return the documents of a collection named by args, and the rest'''
     sought = set()
-    for doc in docs:
-        if doc.stem in args:
-            sought.add(doc)
-    soughtstems = [x.stem for x in sought]
-    remainder = set(args).difference(soughtstems)
+    remainder = set()
+    for arg in args:
+        if arg in docs:
+            sought.add(docs[arg])
+        else:
+            remainder.add(arg)
     return sought, remainder
 
 
 def getDocumentsByStatus(docs, stati):
-    sought = set()
-    for doc in docs:
-        if doc.status in stati:
-            sought.add(doc)
-    return sought
+    '''return the documents of a collection with any of the stati'''
+    return set(docs.select('status', stati))
 
 
 def processSkips(config, docs):
-    included = set()
-    excluded = set()
+    '''return the documents to include and those excluded by --skip
+
+    docs is an LDPDocumentCollection (looked up by its indexes) or any
+    other iterable of documents.
+    '''
     skip_stati, remainder = getStatusNames(config.skip)
     skip_doctypes, skip_stems = getDocumentClasses(remainder)
+    if isinstance(docs, LDPDocumentCollection):
+        return skipsFromCollection(docs, skip_stati, skip_doctypes,
+                                   skip_stems)
+    included = set()
+    excluded = set()
     for doc in docs:
         stem = doc.stem
         if hasattr(doc, 'doctype'):
@@ -427,30 +586,341 @@ def processSkips(config, docs):
     return included, excluded
 
 
+def skipsFromCollection(docs, skip_stati, skip_doctypes, skip_stems):
+    excluded = set()
+    for doc in docs.select('doctype', skip_doctypes):
+        logger.info("%s skipping doctype %s", doc.stem, doc.doctype)
+        excluded.add(doc)
+    for doc in docs.select('status', skip_stati):
+        if doc not in excluded:
+            logger.info("%s skipping status %s", doc.stem, doc.status)
+            excluded.add(doc)
+    for stem in skip_stems:
+        doc = docs.get(stem)
+        if doc is not None and doc not in excluded:
+            logger.info("%s skipping stem %s", stem, stem)
+            excluded.add(doc)
+    included = set(docs.values()).difference(excluded)
+    return included, excluded
+
+
+def createHasher(config):
+    '''return the hasher for source files (see --vcs, --hashcache)'''
+    from tldp.hashcache import Hasher, HashCache
+    from tldp.vcs import GitIndex
+    hasher = GitIndex.fromconfig(config)
+    if hasher is None:
+        hasher = HashCache.fromconfig(config)
+    if hasher is None:
+        hasher = Hasher.fromconfig(config)
+    return hasher
+
+
+def createInventory(config):
+    '''return an Inventory, using (and updating) the caches if enabled'''
+    from tldp.snapshot import InventorySnapshot
+    hasher = createHasher(config)
+    snapshot = InventorySnapshot.fromconfig(config)
+    counts = fscounts.copy()
+    inv = Inventory(config.pubdir, config.sourcedir, hasher=hasher,
+                    snapshot=snapshot)
+    counts = fscounts - counts
+    logger.info("Inventory scan read %d directories, made %d stat() calls.",
+                counts['scandir'], counts['stat'])
+    if hasher is not None:
+        logger.info("Hashed source files with %r.", hasher)
+        hasher.close()
+    if snapshot is not None:
+        logger.info("Inventory snapshot %s: %d reused, %d rescanned.",
+                    snapshot.fname, snapshot.hits, snapshot.misses)
+        snapshot.save()
+    return inv
+
+
+def watch(config, *args, **kwargs):
+    '''publish the work in the sourcedirs, then each document as it changes
+
+    Runs until killed; with a timeout (e.g. for testing), returns once no
+    document changed for that many seconds.
+    '''
+    from tldp.snapshot import InventorySnapshot
+    from tldp.watch import SourceWatcher
+    if args:
+        return ERR_EXTRAARGS + ' '.join(args)
+    if not config.pubdir:
+        return ERR_NEEDPUBDIR + "for --watch"
+    if not config.sourcedir:
+        return ERR_NEEDSOURCEDIR + "for --watch"
+    try:
+        watcher = SourceWatcher(config.sourcedir)
+    except OSError as e:
+        return "Cannot --watch the source directories: %s" % (e,)
+    timeout = kwargs.get('timeout', None)
+    hasher = createHasher(config)
+    snapshot = InventorySnapshot.fromconfig(config)
+    inv, stems = None, None
+    try:
+        while True:
+            if stems is None:
+                inv = Inventory(config.pubdir, config.sourcedir,
+                                hasher=hasher, snapshot=snapshot)
+                stems = set(inv.work.keys())
+            else:
+                inv.update(stems, hasher=hasher, snapshot=snapshot)
+            work = inv.work
+            docs = [work[stem] for stem in stems if stem in work]
+            docs, _ = processSkips(config, docs)
+            docs = sorted(docs, key=lambda x: x.stem.lower())
+            docs = removeUnknownDoctypes(removeOrphans(docs))
+            if docs:
+                logger.info("Publishing %d changed documents.", len(docs))
+                result = publish(config, docs)
+                if result != os.EX_OK:
+                    logger.error("%s", result)
+                inv.update(stems, hasher=hasher, snapshot=snapshot)
+            recordHashes(config, inv)
+            if hasher is not None:
+                hasher.sync()
+            if snapshot is not None:
+                snapshot.save()
+            logger.info("Watching for changes in %d directories.",
+                        len(watcher.watches))
+            stems = watcher.wait(config.watch_debounce, timeout=timeout)
+            if stems is not None and not stems:
+                return os.EX_OK
+    finally:
+        watcher.close()
+        if hasher is not None:
+            hasher.close()
+
+
+def answerQuery(config, inv, request):
+    '''answer a request to --serve (see tldp.daemon) from inv'''
+    action = request.get('action')
+    if action == 'status':
+        status = dict((stem, doc.status) for stem, doc in inv.all.items())
+        return dict(result=os.EX_OK, status=status)
+    config = copy.copy(config)
+    config.verbose = bool(request.get('verbose', False))
+    config.skip = list(request.get('skip', []))
+    args = request.get('args', [])
+    file = io.StringIO()
+    if action == 'summary':
+        result = summary(config, *args, file=file, inv=inv)
+    elif action == 'detail':
+        docs, result = collectWorkset(config, args, inv=inv)
+        if docs:
+            result = detail(config, docs, file=file)
+        elif not result:
+            result = os.EX_OK
+    else:
+        result = "Unknown request: %r" % (action,)
+    return dict(result=result, output=file.getvalue())
+
+
+def askServer(config, args):
+    '''answer --summary or --detail from a running --serve, if any
+
+    Returns: None if no server answered, else the result of the action
+    '''
+    from tldp.daemon import socketpath, ask
+    if not getattr(config, 'serve_client', False):
+        return None
+    path = socketpath(config)
+    if path is None:
+        return None
+    # -- file name arguments are relative to our working directory
+    args = [opa(x) if os.path.exists(x) else x for x in args]
+    request = dict(action='summary' if config.summary else 'detail',
+                   args=args, verbose=config.verbose, skip=config.skip)
+    reply = ask(path, request)
+    if reply is None:
+        return None
+    logger.info("Answered by server %s.", path)
+    print(reply.get('output', ''), end='', file=sys.stdout)
+    return reply.get('result')
+
+
+def serve(config, *args, **kwargs):
+    '''keep the inventory in memory; answer --summary and --list queries
+
+    Runs until killed; with a timeout (e.g. for testing), returns once no
+    request arrived for that many seconds.
+    '''
+    import socket
+    from tldp.snapshot import InventorySnapshot
+    from tldp.watch import SourceWatcher
+    from tldp.daemon import InventoryDaemon, socketpath
+    if args:
+        return ERR_EXTRAARGS + ' '.join(args)
+    if not config.pubdir:
+        return ERR_NEEDPUBDIR + "for --serve"
+    if not config.sourcedir:
+        return ERR_NEEDSOURCEDIR + "for --serve"
+    path = socketpath(config)
+    if path is None:
+        return "Option --serve-socket (or --cachedir) required for --serve"
+    hasher = createHasher(config)
+    snapshot = InventorySnapshot.fromconfig(config)
+    try:
+        watcher = SourceWatcher(config.sourcedir + [config.pubdir])
+    except OSError as e:
+        logger.warning("Cannot watch for changes (%s), rescanning for each "
+                       "query.", e)
+        watcher = None
+    state = Namespace(inv=None)
+
+    def refresh(stems):
+        if stems is None:
+            state.inv = Inventory(config.pubdir, config.sourcedir,
+                                  hasher=hasher, snapshot=snapshot)
+        else:
+            state.inv.update(stems, hasher=hasher, snapshot=snapshot)
+        if hasher is not None:
+            hasher.sync()
+        if snapshot is not None:
+            snapshot.save()
+
+    def handler(request):
+        if watcher is None:
+            refresh(None)
+        return answerQuery(config, state.inv, request)
+
+    refresh(None)
+    daemon = InventoryDaemon(path, handler, watcher=watcher, onchange=refresh)
+    try:
+        daemon.serve(timeout=kwargs.get('timeout', None))
+    except (socket.error, OSError) as e:
+        return "Cannot --serve on %s: %s" % (path, e)
+    finally:
+        if watcher is not None:
+            watcher.close()
+        if hasher is not None:
+            hasher.close()
+    return os.EX_OK
+
+
 def extractExplicitDocumentArgs(config, args):
     docs = set()
     rawdocs, remainder = getDocumentNames(args)
     logger.debug("args included %d documents in filesystem: %r",
                  len(rawdocs), rawdocs)
+    if not rawdocs:
+        return docs, remainder
+    hasher = createHasher(config)
     for doc in rawdocs:
-        docs.add(SourceDocument(doc))
+        docs.add(SourceDocument(doc, hasher=hasher))
+    if hasher is not None:
+        hasher.close()
     return docs, remainder
 
 
-def collectWorkset(config, args):
+def getChangedDocuments(config):
+    '''return the SourceDocuments changed since the published revision
+
+    Returns: None if a sourcedir has no (usable) published revision
+    '''
+    from tldp.vcs import readrevisions, changedfiles
+    git = which('git')
+    recorded = readrevisions(config.pubdir)
+    stems = set()
+    for sdir in config.sourcedir:
+        sdir = opa(sdir)
+        since = recorded.get(sdir)
+        if since is None:
+            logger.info("No published revision recorded for %s.", sdir)
+            return None
+        changed = changedfiles(git, sdir, since)
+        if changed is None:
+            logger.info("Cannot compare %s to revision %s.", sdir, since)
+            return None
+        for relpath in changed:
+            if opb(relpath) in IGNORABLE_SOURCE:
+                continue
+            entry = relpath.split('/')[0]
+            isdir = entry != relpath or os.path.isdir(opj(sdir, entry))
+            stems.add(entrystem(entry, isdir))
+    logger.debug("Changed since the published revision: %r", stems)
+    if not stems:
+        return set()
+    hasher = createHasher(config)
+    docs = scansourcedirs(config.sourcedir, hasher=hasher, stems=stems)
+    if hasher is not None:
+        hasher.close()
+    return set(docs.values())
+
+
+def selectsAllWork(config, args):
+    '''True if args (and no --skip) select all of the work to publish'''
+    return not config.skip and set(args).issubset(COMPLETE_SELECTIONS)
+
+
+def recordHashes(config, inv):
+    '''after a --publish, record the hashes of rehashed published documents
+
+    See Inventory.recordhashes(); only --publish writes into the pubdir.
+    '''
+    if inv is None:
+        return
+    count = inv.recordhashes()
+    if count:
+        logger.info("Rewrote the MD5SUMS of %d unchanged documents.", count)
+
+
+def recordRevisions(config, args):
+    '''after a --publish of all changed work, record the source revisions'''
+    from tldp.vcs import revision, writerevisions
+    if getattr(config, 'vcs', None) != 'git':
+        return
+    if not selectsAllWork(config, args):
+        return
+    git = which('git')
+    revisions = dict()
+    for sdir in config.sourcedir:
+        sdir = opa(sdir)
+        revisions[sdir] = revision(git, sdir)
+        if revisions[sdir] is None:
+            logger.warning("Not recording revisions:  %s is not in git.", sdir)
+            return
+    writerevisions(config.pubdir, revisions)
+    logger.info("Recorded published revisions %r.", revisions)
+
+
+def collectWorkset(config, args, inv=None):
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     # -- argument handling logic; try to avoid creating an inventory unless it
     #    is necessary
     #
     workset, remainder = extractExplicitDocumentArgs(config, args)
-    stati, remainder = getStatusNames(remainder)
     if len(workset):
         logger.info("Added %d explicit file paths from args.", len(workset))
 
+    # -- documents changed since the last published revision need only be
+    #    scanned themselves; without a known revision, fall back to 'work'
+    #
+    changed = None
+    if CHANGED in remainder:
+        remainder.discard(CHANGED)
+        if getattr(config, 'vcs', None) != 'git':
+            return None, ERR_NEEDVCS + "to select '%s'" % (CHANGED,)
+        if not config.pubdir:
+            return None, ERR_NEEDPUBDIR + "to select '%s'" % (CHANGED,)
+        if not config.sourcedir:
+            return None, ERR_NEEDSOURCEDIR + "to select '%s'" % (CHANGED,)
+        changed = getChangedDocuments(config)
+        if changed is None:
+            logger.info("Selecting 'work' instead of '%s'.", CHANGED)
+            remainder.add('work')
+        else:
+            workset.update(changed)
+            logger.info("Added %d docs, changed since published revision.",
+                        len(changed))
+    stati, remainder = getStatusNames(remainder)
+
     need_inventory = False
     if remainder or stati:
         need_inventory = True
-    if not workset:
+    if not workset and changed is None:
         need_inventory = True
 
     # -- We only --list, --script, --build, or --publish on work-to-be-done
@@ -463,26 +933,24 @@ def collectWorkset(config, args):
     #    config.sourcedir are set appropriately; just before creating an
     #    Inventory
     #
-    if need_inventory:
+    if need_inventory and inv is None:
         if not config.pubdir:
             return None, ERR_NEEDPUBDIR + "for inventory"
         if not config.sourcedir:
             return None, ERR_NEEDSOURCEDIR + "for inventory"
-        inv = Inventory(config.pubdir, config.sourcedir)
+        inv = createInventory(config)
         logger.info("Inventory contains %s source and %s output documents.",
                     len(inv.source.keys()), len(inv.output.keys()))
-    else:
-        inv = None
 
     if stati:
-        docs = getDocumentsByStatus(inv.all.values(), stati)
+        docs = getDocumentsByStatus(inv.all, stati)
         workset.update(docs)
         if docs:
             logger.info("Added %d docs, found by status class .", len(docs))
 
     unknownargs = None
     if remainder:
-        docs, unknownargs = getDocumentsByStems(inv.all.values(), remainder)
+        docs, unknownargs = getDocumentsByStems(inv.all, remainder)
         workset.update(docs)
         logger.info("Added %d docs, found by stem name.", len(docs))
 
@@ -495,8 +963,8 @@ def collectWorkset(config, args):
     #    or stale.
     #
     if not workset:
-        if not stati and not remainder:
-            workset.update(inv.work.values())
+        if not stati and not remainder and changed is None:
+            workset = inv.work
 
     # -- and, of course, apply the skipping logic
     #
@@ -514,16 +982,42 @@ def handleArgs(config, args):
     if config.statustypes:
         return show_statustypes(config, *args)
 
+    if config.show_plan:
+        return show_plan(config, *args)
+
+    if config.watch:
+        return watch(config, *args)
+
+    if config.serve:
+        return serve(config, *args)
+
+    if config.summary or config.detail:
+        result = askServer(config, args)
+        if result is not None:
+            return result
+
     if config.summary:
         return summary(config, *args)
 
-    docs, error = collectWorkset(config, args)
+    # -- a --publish of all the work also rewrites the MD5SUMS of documents
+    #    published with another hash algorithm, so it needs the inventory
+    #    (which collectWorkset() would make anyway, unless for 'changed')
+    #
+    inv = None
+    if config.publish and selectsAllWork(config, args) \
+            and CHANGED not in args and config.pubdir and config.sourcedir:
+        inv = createInventory(config)
+
+    docs, error = collectWorkset(config, args, inv=inv)
 
     if error:
         return error
 
     if not docs:
         logger.info("No work to do.")
+        if config.publish:
+            recordHashes(config, inv)
+            recordRevisions(config, args)
         return os.EX_OK
 
     if config.detail:
@@ -538,7 +1032,11 @@ def handleArgs(config, args):
         return script(config, docs)
 
     if config.publish:
-        return publish(config, docs)
+        result = publish(config, docs)
+        if result == os.EX_OK:
+            recordHashes(config, inv)
+            recordRevisions(config, args)
+        return result
 
     if not config.build:
         logger.info("Assuming --build, since no other action was specified...")
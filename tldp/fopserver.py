@@ -0,0 +1,214 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''a long-lived FOP process which renders the PDFs of a whole run
+
+Each fop invocation starts a new JVM, and JVM startup, font setup and JIT
+warmup often take longer than rendering a small HOWTO.  With --fopserver,
+the driver starts extras/fop/FopServer.java once per run, listening on a Unix
+domain socket in a private temporary directory.  The socket name is passed
+to the document builds (and worker processes) as config.fopserver_socket.
+Each make_pdf_with_fop() step sends its job (one request line, one reply
+line) to the server, and falls back to the fop command line if the server
+cannot be reached.
+
+The FOP configuration of a doctype (e.g. --docbook4xml-fopconf) is passed
+to fop as -c, and to the server when it starts; the server builds one
+FopFactory for each configuration (and one for none), and reuses it for
+every job which names that configuration.
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import time
+import shlex
+import socket
+import shutil
+import logging
+import subprocess
+from tempfile import mkdtemp
+
+from tldp.utils import which, firstfoundfile, logfilecontents
+
+logger = logging.getLogger(__name__)
+
+SOCKETNAME = 'fop.sock'
+STARTTIMEOUT = 60
+MSG_NOSIGNAL = getattr(socket, 'MSG_NOSIGNAL', 0)
+
+opd = os.path.dirname
+opj = os.path.join
+
+
+def fopserver_source_finder():
+    l = [opj(opd(opd(os.path.abspath(__file__))), 'extras', 'fop',
+             'FopServer.java'),
+         '/usr/share/ldptool/fop/FopServer.java',
+         ]
+    return firstfoundfile(l)
+
+
+def fopserver_command_finder():
+    '''return a command to start FopServer (Java 16+, FOP 2.x) or None'''
+    java = which('java')
+    jar = firstfoundfile(['/usr/share/java/fop.jar'])
+    source = fopserver_source_finder()
+    if not (java and jar and source):
+        return None
+    return '"%s" -cp "%s" "%s"' % (java, jar, source)
+
+
+def render(socketpath, fo, pdf, conf=None):
+    '''send a job to the server at socketpath; return its reply line'''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketpath)
+        fields = ['RENDER', fo, pdf]
+        if conf:
+            fields.append(conf)
+        request = '\t'.join(fields) + '\n'
+        # -- ldptool restores the default SIGPIPE action, so a server which
+        #    has gone away would otherwise kill this process
+        sock.sendall(request.encode('utf-8'), MSG_NOSIGNAL)
+        f = sock.makefile('rb')
+        try:
+            reply = f.readline()
+        finally:
+            f.close()
+    finally:
+        sock.close()
+    return reply.decode('utf-8').strip()
+
+
+def fopstep(runner, conf=None):
+    '''render output.name_fo to output.name_pdf with the FOP server
+
+    conf is the FOP configuration file of the doctype, if any (fop -c).
+
+    Returns: None if the caller should run fop instead (no server, --script,
+    or the server cannot be reached); otherwise True on success and False on
+    failure
+    '''
+    config = runner.config
+    socketpath = getattr(config, 'fopserver_socket', None)
+    if config.script or not socketpath:
+        return None
+    stem = runner.source.stem
+    fo = os.path.abspath(runner.output.name_fo)
+    pdf = os.path.abspath(runner.output.name_pdf)
+    if conf:
+        conf = os.path.abspath(conf)
+    if any(c in fo + pdf + (conf or '') for c in '\t\n'):
+        return None
+    try:
+        reply = render(socketpath, fo, pdf, conf)
+    except (socket.error, IOError, OSError) as e:
+        logger.warning("%s FOP server unavailable (%s), running fop",
+                       stem, e)
+        return None
+    if reply == 'OK':
+        logger.info("%s rendered %s with FOP server", stem, pdf)
+        return True
+    if not reply:
+        logger.warning("%s FOP server did not answer, running fop", stem)
+        return None
+    logger.error("%s FOP server: %s", stem, reply)
+    return False
+
+
+class FopServer(object):
+    '''start, and later stop, a FopServer process for the length of a run'''
+
+    def __repr__(self):
+        return '<%s:%s>' % (self.__class__.__name__, self.socketpath,)
+
+    @classmethod
+    def fromconfig(cls, config, docs):
+        '''start a server if --fopserver and any of docs may run fop
+
+        On success, config.fopserver_socket names the socket.
+
+        Returns: a running FopServer, or None
+        '''
+        if not getattr(config, 'fopserver', False) or config.script:
+            return None
+        if not any(hasattr(doc.doctype, 'make_pdf_with_fop') for doc in docs):
+            return None
+        command = getattr(config, 'fopserver_command', None)
+        if not command:
+            logger.warning("No --fopserver-command, not starting FOP server.")
+            return None
+        confs = set()
+        for name, value in vars(config).items():
+            if name.endswith('_fopconf') and value:
+                confs.add(os.path.abspath(value))
+        server = cls(command, confs=sorted(confs))
+        if not server.start():
+            return None
+        config.fopserver_socket = server.socketpath
+        return server
+
+    def __init__(self, command, confs=()):
+        self.command = command
+        self.confs = list(confs)
+        self.proc = None
+        self.tmpdir = None
+        self.socketpath = None
+        self.logfile = None
+
+    def start(self, timeout=STARTTIMEOUT):
+        '''start the server; wait until it accepts connections'''
+        self.tmpdir = mkdtemp(prefix='ldptool-fop-')
+        self.socketpath = opj(self.tmpdir, SOCKETNAME)
+        self.logfile = opj(self.tmpdir, 'fopserver.log')
+        cmd = shlex.split(self.command) + [self.socketpath] + self.confs
+        logger.info("Starting FOP server: %s", ' '.join(cmd))
+        try:
+            with open(os.devnull) as null, open(self.logfile, 'w') as log:
+                self.proc = subprocess.Popen(cmd, stdin=null, stdout=log,
+                                             stderr=log, cwd=self.tmpdir)
+        except OSError as e:
+            logger.warning("Could not start FOP server %s: %s", cmd[0], e)
+            self.stop()
+            return False
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                break
+            if self.ready():
+                logger.info("FOP server ready on %s.", self.socketpath)
+                return True
+            time.sleep(0.1)
+        logger.warning("FOP server did not start, running fop per document.")
+        logfilecontents(logger.info, 'fopserver', self.logfile)
+        self.stop()
+        return False
+
+    def ready(self):
+        if not os.path.exists(self.socketpath):
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socketpath)
+        except (socket.error, OSError):
+            return False
+        finally:
+            sock.close()
+        return True
+
+    def stop(self):
+        '''terminate the server and remove its socket'''
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            self.proc.wait()
+        self.proc = None
+        if self.tmpdir is not None:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+        self.tmpdir = None
+
+#
+# -- end of file
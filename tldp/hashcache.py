@@ -0,0 +1,190 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import time
+import errno
+import sqlite3
+import logging
+
+from tldp.utils import hashfunctions, hashmany
+
+logger = logging.getLogger(__name__)
+
+HASHCACHE = 'hashes.sqlite'
+
+# -- a file modified within this many seconds of being hashed may change
+#    again without changing its stat() signature (same as git's "racily
+#    clean" problem); such hashes are returned but never stored
+#
+RACY_SECONDS = 2
+
+
+def statkey(st):
+    '''return the (size, mtime_ns, inode, ctime_ns) tuple for a stat_result'''
+    mtime_ns = getattr(st, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(st.st_mtime * 1e9)  # -- python2
+    ctime_ns = getattr(st, 'st_ctime_ns', None)
+    if ctime_ns is None:
+        ctime_ns = int(st.st_ctime * 1e9)
+    return (st.st_size, mtime_ns, st.st_ino, ctime_ns)
+
+
+def configalgorithm(config):
+    '''return the --hashalgorithm of config, if available (else md5)'''
+    algorithm = getattr(config, 'hashalgorithm', None) or 'md5'
+    if algorithm not in hashfunctions:
+        logger.warning("Hash algorithm %s is not available, using md5.",
+                       algorithm)
+        algorithm = 'md5'
+    return algorithm
+
+
+class Hasher(object):
+    '''hash files with one of tldp.utils.hashfunctions, concurrently
+
+    An object of this class (or a subclass) can be passed as the hasher to
+    SourceDocument (and friends); see tldp.utils.md5files.  Subclasses
+    override hashfiles() to avoid reading files; those they must read can
+    be passed to Hasher.hashfiles().
+    '''
+
+    def __repr__(self):
+        return '<%s:%s (%d hits, %d misses)>' % (
+               self.__class__.__name__, self.algorithm, self.hits, self.misses)
+
+    @classmethod
+    def fromconfig(cls, config):
+        return cls(configalgorithm(config))
+
+    def __init__(self, algorithm='md5'):
+        self.algorithm = algorithm
+        self.func = hashfunctions[algorithm]
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, name):
+        '''return the hash of a file read from disk (None if missing)'''
+        try:
+            return self.func(name)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+
+    def hashfiles(self, names):
+        '''return the hashes for a list of file names'''
+        self.misses += len(names)
+        return hashmany(names, self.digest)
+
+    def hashfile(self, name):
+        '''return the hash for a single file name'''
+        return self.hashfiles([name])[0]
+
+    def sync(self):
+        pass
+
+    def close(self):
+        self.sync()
+
+
+class HashCache(Hasher):
+    '''a persistent cache of file content hashes
+
+    Each entry is keyed on the absolute path of the file (and the algorithm)
+    and records the size, mtime, inode and ctime of the file when it was
+    hashed.  If a later stat() of the file returns the same values, the
+    stored digest is returned without reading the file.  Otherwise, the file
+    is hashed again and the entry replaced.
+    '''
+
+    def __repr__(self):
+        return '<%s:%s %s (%d hits, %d misses)>' % (
+               self.__class__.__name__, self.fname, self.algorithm,
+               self.hits, self.misses)
+
+    @classmethod
+    def fromconfig(cls, config):
+        '''return a HashCache in config.cachedir (or None if disabled)'''
+        if not getattr(config, 'hashcache', False):
+            return None
+        cachedir = getattr(config, 'cachedir', None)
+        if not cachedir:
+            return None
+        try:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+            return cls(os.path.join(cachedir, HASHCACHE),
+                       algorithm=configalgorithm(config))
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Not using hash cache in %s: %s", cachedir, e)
+            return None
+
+    def __init__(self, fname, algorithm='md5'):
+        super(HashCache, self).__init__(algorithm)
+        self.fname = fname
+        self.db = sqlite3.connect(fname)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS hashes (
+                               path TEXT NOT NULL,
+                               algorithm TEXT NOT NULL,
+                               size INTEGER NOT NULL,
+                               mtime_ns INTEGER NOT NULL,
+                               inode INTEGER NOT NULL,
+                               ctime_ns INTEGER NOT NULL,
+                               digest TEXT NOT NULL,
+                               PRIMARY KEY (path, algorithm))''')
+
+    def hashfiles(self, names):
+        '''return the hashes for a list of file names (from cache, if valid)
+
+        The cache is consulted and updated in this thread; only the files
+        which must be read are hashed concurrently.
+        '''
+        digests = [None] * len(names)
+        todo = list()
+        for n, name in enumerate(names):
+            name = os.path.abspath(name)
+            try:
+                st = os.stat(name)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            key = statkey(st)
+            row = self.db.execute('''SELECT size, mtime_ns, inode, ctime_ns,
+                                            digest
+                                     FROM hashes
+                                     WHERE path = ? AND algorithm = ?''',
+                                  (name, self.algorithm)).fetchone()
+            if row is not None and tuple(row[:4]) == key:
+                self.hits += 1
+                digests[n] = row[4]
+            else:
+                todo.append((n, name, key, st.st_mtime))
+        hashes = super(HashCache, self).hashfiles([x[1] for x in todo])
+        for (n, name, key, mtime), digest in zip(todo, hashes):
+            digests[n] = digest
+            if digest is None or time.time() - mtime <= RACY_SECONDS:
+                continue
+            self.db.execute('''INSERT OR REPLACE INTO hashes
+                               VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                            (name, self.algorithm) + key + (digest,))
+        return digests
+
+    def sync(self):
+        '''write any new entries to disk'''
+        logger.debug("%r synchronizing.", self)
+        self.db.commit()
+
+    def close(self):
+        self.sync()
+        self.db.close()
+
+#
+# -- end of file
@@ -6,12 +6,13 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
-import copy
+import os
 import logging
 from collections import OrderedDict
 
-from tldp.sources import SourceCollection
-from tldp.outputs import OutputCollection
+from tldp.sources import SourceCollection, scansourcedirs
+from tldp.outputs import OutputCollection, OutputDirectory
+from tldp.utils import hashfunctions, writemd5sums
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +44,13 @@ status_classes['problems'] = ['orphan', 'broken', 'stale']
 status_classes['work'] = ['new', 'orphan', 'broken', 'stale']
 status_classes['all'] = ['published', 'new', 'orphan', 'broken', 'stale']
 
+# -- the status types which depend on checking for broken and stale
+#    documents; the source and output documents are classified in place, so
+#    those with status 'published' may still turn out broken or stale
+#
+CHECKED_STATUS_TYPES = set(['source', 'output', 'published', 'broken',
+                            'stale'])
+
 
 class Inventory(object):
     '''a container for classifying documents by their status
@@ -56,12 +64,21 @@ class Inventory(object):
     The following are possible values for status:
        - 'source':  a source document before any status detection
        - 'output':  an output document before any status detection
+         (the Inventory classifies every document, so these two are not
+         seen once it is constructed)
        - 'new':  a source document without any matching output stem
        - 'published':  a pair of source/output documents with matching stems
        - 'orphan':  an output document without any matching source stem
        - 'broken':  a published document with missing output files
        - 'stale':  a published document with new(er) source files
 
+    The status classes 'sources' and 'outputs' hold every source and output
+    document, each carrying the status detected for it (not 'source' or
+    'output').  The attributes source and output hold the same documents,
+    but their status is provisional: a document shown as 'published' may
+    turn out broken or stale, until check() has run (as it does for any
+    status class which needs it, and for published, broken and stale).
+
     The Inventory object is intended to be used to identify work that needs to
     be done on individual source documents to produce up-to-date output
     documents.
@@ -75,7 +92,7 @@ class Inventory(object):
                len(self.stale),
                len(self.broken),)
 
-    def __init__(self, pubdir, sourcedirs):
+    def __init__(self, pubdir, sourcedirs, hasher=None, snapshot=None):
         '''construct an Inventory
 
         pubdir: path to the OutputCollection
@@ -84,85 +101,213 @@ class Inventory(object):
           SourceCollection object; essentially a directory containing
           SourceDocuments; for example LDP/LDP/howto/linuxdoc and
           LDP/LDP/guide/docbook
-        '''
-        self.output = OutputCollection(pubdir)
-        self.source = SourceCollection(sourcedirs)
-        s = copy.deepcopy(self.source)
-        o = copy.deepcopy(self.output)
-        sset = set(s.keys())
-        oset = set(o.keys())
 
-        # -- orphan identification
-        #
+        hasher: optional, used to hash the source files, for example a
+          tldp.hashcache.HashCache
+
+        snapshot: optional, a tldp.snapshot.InventorySnapshot; unchanged
+          source and output documents are taken from the last run
+        '''
+        self.pubdir = pubdir
+        self.sourcedirs = sourcedirs
+        self.output = OutputCollection(pubdir, snapshot=snapshot)
+        self.source = SourceCollection(sourcedirs, hasher=hasher,
+                                       snapshot=snapshot)
         self.orphan = OutputCollection()
-        for doc in oset.difference(sset):
-            self.orphan[doc] = o[doc]
-            del o[doc]
-            self.orphan[doc].status = 'orphan'
+        self.new = SourceCollection()
+        self._published = SourceCollection()
+        self._broken = SourceCollection()
+        self._stale = SourceCollection()
+        # -- published stems not yet checked for broken or stale, and the
+        #    status class collections built since anything changed
+        self.unchecked = set()
+        self.views = dict()
+        # -- published stems found unchanged with another hash algorithm
+        self.rehashed = set()
+        for stem in set(self.source.keys()).union(self.output.keys()):
+            self.classify(stem)
         logger.debug("Identified %d orphan documents: %r.", len(self.orphan),
                      self.orphan.keys())
+        logger.debug("Identified %d new documents: %r.", len(self.new),
+                     self.new.keys())
+        logger.debug("Identified %d published documents.",
+                     len(self._published))
+
+    def classify(self, stem):
+        '''(re)determine the status of the source and/or output named stem
+
+        The documents of self.source and self.output are classified in place
+        (status, output and source).  Only whether the stem is an orphan, new
+        or published is determined here; published documents are checked
+        for broken or stale when first needed, see check().
+        '''
+        for collection in (self.orphan, self.new, self._published,
+                           self._broken, self._stale):
+            collection.pop(stem, None)
+        self.unchecked.discard(stem)
+        self.rehashed.discard(stem)
+        self.views.clear()
+        self.source.invalidate()
+        self.output.invalidate()
+        sdoc = self.source.get(stem)
+        odoc = self.output.get(stem)
+        if sdoc is not None:
+            sdoc.output = None
+            sdoc.differing = frozenset()
+        if odoc is not None:
+            odoc.source = None
+
+        # -- orphan identification
+        #
+        if sdoc is None:
+            if odoc is not None:
+                odoc.status = 'orphan'
+                self.orphan[stem] = odoc
+            return
 
         # -- unpublished ('new') identification
         #
-        self.new = SourceCollection()
-        for doc in sset.difference(oset):
-            self.new[doc] = s[doc]
-            del s[doc]
-            self.new[doc].status = 'new'
-        logger.debug("Identified %d new documents: %r.", len(self.new),
-                     self.new.keys())
+        if odoc is None:
+            sdoc.status = 'new'
+            self.new[stem] = sdoc
+            return
+
+        # -- published identification
+        #
+        sdoc.output = odoc
+        odoc.source = sdoc
+        sdoc.status = sdoc.output.status = 'published'
+        self._published[stem] = sdoc
+        self.unchecked.add(stem)
+
+    def check(self):
+        '''identify the broken and stale documents among the published'''
+        if not self.unchecked:
+            return
+        for stem in self.unchecked:
+            self.checkstem(stem)
+        self.unchecked.clear()
+        self.views.clear()
+        for collection in (self.source, self.output, self._published):
+            collection.invalidate()
+        logger.debug("Identified %d broken documents: %r.", len(self._broken),
+                     self._broken.keys())
+        logger.debug("Identified %d stale documents: %r.", len(self._stale),
+                     self._stale.keys())
 
-        # -- published identification; source and output should be same size
-        assert len(s) == len(o)
-        for stem, odoc in o.items():
-            sdoc = s[stem]
-            sdoc.output = odoc
-            odoc.source = sdoc
-            sdoc.status = sdoc.output.status = 'published'
-        self.published = s
-        logger.debug("Identified %d published documents.", len(self.published))
+    def checkstem(self, stem):
+        sdoc = self._published[stem]
+        odoc = sdoc.output
 
         # -- broken identification
         #
-        self.broken = SourceCollection()
-        for stem, sdoc in s.items():
-            if not sdoc.output.iscomplete:
-                self.broken[stem] = sdoc
-                sdoc.status = sdoc.output.status = 'broken'
-        logger.debug("Identified %d broken documents: %r.", len(self.broken),
-                     self.broken.keys())
+        if not odoc.iscomplete:
+            self._broken[stem] = sdoc
+            sdoc.status = odoc.status = 'broken'
 
         # -- stale identification
         #
-        self.stale = SourceCollection()
-        for stem, sdoc in s.items():
-            odoc = sdoc.output
-            omd5, smd5 = odoc.md5sums, sdoc.md5sums
-            if omd5 != smd5:
-                logger.debug("%s differing MD5 sets %r %r", stem, smd5, omd5)
-                changed = set()
-                for gone in set(omd5.keys()).difference(smd5.keys()):
-                    logger.debug("%s gone %s", stem, gone)
-                    changed.add(('gone', gone))
-                for new in set(smd5.keys()).difference(omd5.keys()):
-                    changed.add(('new', new))
-                for sfn in set(smd5.keys()).intersection(omd5.keys()):
-                    if smd5[sfn] != omd5[sfn]:
-                        changed.add(('changed', sfn))
-                for why, sfn in changed:
-                    logger.debug("%s differing source %s (%s)", stem, sfn, why)
-                odoc.status = sdoc.status = 'stale'
-                sdoc.differing = changed
-                self.stale[stem] = sdoc
-        logger.debug("Identified %d stale documents: %r.", len(self.stale),
-                     self.stale.keys())
+        omd5, smd5 = odoc.md5sums, sdoc.md5sums
+        algorithm = odoc.algorithm
+        if algorithm != sdoc.algorithm and algorithm in hashfunctions:
+            # -- published with another algorithm (e.g. before --vcs git);
+            #    if unchanged, see recordhashes()
+            smd5 = sdoc.hashes(algorithm)
+            if omd5 == smd5:
+                self.rehashed.add(stem)
+        if omd5 != smd5:
+            logger.debug("%s differing MD5 sets %r %r", stem, smd5, omd5)
+            changed = set()
+            for gone in set(omd5.keys()).difference(smd5.keys()):
+                logger.debug("%s gone %s", stem, gone)
+                changed.add(('gone', gone))
+            for new in set(smd5.keys()).difference(omd5.keys()):
+                changed.add(('new', new))
+            for sfn in set(smd5.keys()).intersection(omd5.keys()):
+                if smd5[sfn] != omd5[sfn]:
+                    changed.add(('changed', sfn))
+            for why, sfn in changed:
+                logger.debug("%s differing source %s (%s)", stem, sfn, why)
+            odoc.status = sdoc.status = 'stale'
+            sdoc.differing = changed
+            self._stale[stem] = sdoc
+
+    def recordhashes(self):
+        '''record the source hashes in the MD5SUMS of rehashed documents
+
+        check() only notes the published documents found unchanged by
+        rehashing their sources with the algorithm named in their MD5SUMS;
+        rewriting those with the hashes of this run spares the next run from
+        reading the sources again.  This writes into pubdir, so it is left
+        to --publish.  Returns the number of files rewritten.
+        '''
+        self.check()
+        count = 0
+        for stem in sorted(self.rehashed):
+            sdoc = self.source[stem]
+            fname = sdoc.output.MD5SUMS
+            header = '# -- MD5SUMS for {}'.format(stem)
+            try:
+                writemd5sums(fname, sdoc.md5sums, header=header,
+                             algorithm=sdoc.algorithm)
+            except (IOError, OSError) as e:
+                logger.warning("%s cannot rewrite %s: %s", stem, fname, e)
+                continue
+            logger.debug("%s rewrote %s with %s", stem, fname, sdoc.algorithm)
+            count += 1
+        self.rehashed.clear()
+        return count
+
+    @property
+    def published(self):
+        self.check()
+        return self._published
+
+    @property
+    def broken(self):
+        self.check()
+        return self._broken
+
+    @property
+    def stale(self):
+        self.check()
+        return self._stale
+
+    def update(self, stems, hasher=None, snapshot=None):
+        '''examine the source and output documents named stems again
+
+        Used to keep a long-lived Inventory current (e.g. for --watch); the
+        hasher and snapshot are as for the constructor.
+        '''
+        stems = set(stems)
+        found = scansourcedirs(self.sourcedirs, hasher=hasher,
+                               snapshot=snapshot, stems=stems)
+        for stem in stems:
+            self.source.pop(stem, None)
+            if stem in found:
+                self.source[stem] = found[stem]
+            self.output.pop(stem, None)
+            dirname = os.path.join(self.pubdir, stem)
+            if os.path.isdir(dirname):
+                if snapshot is None:
+                    self.output[stem] = OutputDirectory(dirname)
+                else:
+                    self.output[stem] = snapshot.outputdirectory(dirname)
+            self.classify(stem)
+        logger.debug("Updated %d documents: %r.", len(stems), sorted(stems))
 
     def getByStatusClass(self, status_class):
+        '''return the documents of a status class (do not modify)'''
         desired = status_classes.get(status_class, None)
         assert isinstance(desired, list)
-        collection = SourceCollection()
-        for status_type in desired:
-            collection.update(getattr(self, status_type))
+        if CHECKED_STATUS_TYPES.intersection(desired):
+            self.check()
+        collection = self.views.get(status_class)
+        if collection is None:
+            collection = SourceCollection()
+            for status_type in desired:
+                collection.update(getattr(self, status_type))
+            self.views[status_class] = collection
         return collection
 
     @property
@@ -7,52 +7,109 @@ from __future__ import absolute_import, division, print_function
 
 import collections
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping  # -- python2
 
-class LDPDocumentCollection(collections.MutableMapping):
+
+def sortkey(stem):
+    return stem.lower()
+
+
+class LDPDocumentCollection(MutableMapping):
     '''a dict-like container for DocumentCollection objects
 
     Intended to be subclassed.
 
     Implements all the usual dictionary stuff, but also provides sorted
     lists of documents in the collection.
+
+    The sorted order of the keys, and the indexes of the documents by an
+    attribute (e.g. status or doctype, see index()), are kept until the
+    collection changes.  Changing the attributes of the documents themselves
+    does not change the collection; call invalidate() afterwards.
     '''
     def __repr__(self):
         return '<%s:(%s docs)>' % (self.__class__.__name__, len(self))
 
+    def __init__(self):
+        self.docs = dict()
+        self.invalidate()
+
+    def invalidate(self):
+        '''forget the sorted keys and the indexes'''
+        self.order = None
+        self.indexes = dict()
+
     def __delitem__(self, key):
-        del self.__dict__[key]
+        del self.docs[key]
+        self.invalidate()
 
     def __getitem__(self, key):
-        return self.__dict__[key]
+        return self.docs[key]
 
     def __setitem__(self, key, value):
-        self.__dict__[key] = value
+        self.docs[key] = value
+        self.invalidate()
+
+    def __contains__(self, key):
+        return key in self.docs
 
     def __iter__(self):
-        return iter(self.__dict__)
+        return iter(self.docs)
 
     def __len__(self):
-        return len(self.__dict__)
+        return len(self.docs)
+
+    def sortedkeys(self):
+        '''return the (cached) keys, sorted case-insensitively'''
+        if self.order is None:
+            self.order = tuple(sorted(self.docs, key=sortkey))
+        return self.order
+
+    def index(self, attr):
+        '''return {value: [keys]}, the keys (sorted) by an attribute
+
+        Documents without the attribute are not in the index.
+        '''
+        index = self.indexes.get(attr)
+        if index is None:
+            index = collections.defaultdict(list)
+            for key in self.sortedkeys():
+                value = getattr(self.docs[key], attr, index)
+                if value is not index:
+                    index[value].append(key)
+            index = self.indexes[attr] = dict(index)
+        return index
+
+    def select(self, attr, values):
+        '''return the documents (sorted) whose attr is any of values'''
+        index = self.index(attr)
+        keys = list()
+        for value in values:
+            keys.extend(index.get(value, ()))
+        return [self.docs[key] for key in sorted(keys, key=sortkey)]
 
     def iterkeys(self):
-        return iter(self.keys)
+        return iter(self.sortedkeys())
 
     def itervalues(self):
-        for key in sorted(self, key=lambda x: x.lower()):
-            yield self[key]
+        for key in self.sortedkeys():
+            yield self.docs[key]
 
     def iteritems(self):
-        for key in self.keys:
-            yield (key, self[key])
+        for key in self.sortedkeys():
+            yield (key, self.docs[key])
 
     def keys(self):
-        return sorted(self, key=lambda x: x.lower())
+        return list(self.sortedkeys())
 
     def items(self):
-        return [(key, self[key]) for key in self.keys()]
+        return [(key, self.docs[key]) for key in self.sortedkeys()]
 
     def values(self):
-        return [self[key] for key in self.keys()]
+        return [self.docs[key] for key in self.sortedkeys()]
 
 #
 # -- end of file
@@ -9,11 +9,10 @@ from __future__ import unicode_literals
 import os
 import sys
 import errno
-import codecs
 import logging
 
 from tldp.ldpcollection import LDPDocumentCollection
-from tldp.utils import logdir
+from tldp.utils import logdir, readmd5sums, direntries
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +26,8 @@ class OutputNamingConvention(object):
     Sets a list of names for documents that are expected to be present
     in order to report that the directory iscomplete.
     '''
+    __slots__ = ('dirname', 'stem')
+
     expected = ['name_txt', 'name_pdf', 'name_htmls', 'name_html',
                 'name_indexhtml']
 
@@ -73,38 +74,34 @@ class OutputNamingConvention(object):
     @property
     def iscomplete(self):
         '''True if the output directory contains all expected documents'''
-        present = list()
-        for prop in self.expected:
-            name = getattr(self, prop, None)
-            assert name is not None
-            present.append(os.path.exists(name))
-        return all(present)
+        return not self.missing
 
     @property
     def missing(self):
         '''returns a set of missing files'''
+        try:
+            entries = direntries(self.dirname)
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+            entries = list()
+        present = set(x.path for x in entries if x.is_file())
         missing = set()
         for prop in self.expected:
             name = getattr(self, prop, None)
             assert name is not None
-            if not os.path.isfile(name):
+            if name not in present:
                 missing.add(name)
         return missing
 
     @property
     def md5sums(self):
-        d = dict()
-        try:
-            with codecs.open(self.MD5SUMS, encoding='utf-8') as f:
-                for line in f:
-                    if line.startswith('#'):
-                        continue
-                    hashval, fname = line.strip().split()
-                    d[fname] = hashval
-        except IOError as e:
-            if e.errno != errno.ENOENT:
-                raise
-        return d
+        return readmd5sums(self.MD5SUMS)[1]
+
+    @property
+    def algorithm(self):
+        '''the hash algorithm of md5sums (see tldp.utils.hashfunctions)'''
+        return readmd5sums(self.MD5SUMS)[0]
 
 
 class OutputDirectory(OutputNamingConvention):
@@ -117,6 +114,8 @@ class OutputDirectory(OutputNamingConvention):
     An important element of the OutputDirectory is the stem, determined
     from the directory name when __init__() is called.
     '''
+    __slots__ = ('status', 'source')
+
     def __repr__(self):
         return '<%s:%s>' % (self.__class__.__name__, self.dirname)
 
@@ -144,7 +143,10 @@ class OutputDirectory(OutputNamingConvention):
             raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), parent)
         self.status = 'output'
         self.source = source
-        self.logdir = os.path.join(self.dirname, logdir)
+
+    @property
+    def logdir(self):
+        return os.path.join(self.dirname, logdir)
 
     def detail(self, widths, verbose, file=sys.stdout):
         template = ' '.join(('{s.status:{w.status}}',
@@ -165,7 +167,7 @@ class OutputCollection(LDPDocumentCollection):
     The use of the stem as a key works conveniently with the
     SourceCollection which uses the same strategy on SourceDocuments.
     '''
-    def __init__(self, dirname=None):
+    def __init__(self, dirname=None, snapshot=None):
         '''construct an OutputCollection
 
         If dirname is not supplied, OutputCollection is basically, a dict().
@@ -192,20 +194,28 @@ class OutputCollection(LDPDocumentCollection):
               "Wireless-HOWTO": OutputDirectory("/path/en/Wireless-HOWTO")
               }
 
+        If a snapshot (tldp.snapshot.InventorySnapshot) is supplied, the
+        OutputDirectory objects come from it, carrying the MD5SUMS and missing
+        files of the last run for each unchanged directory.
         '''
+        super(OutputCollection, self).__init__()
         if dirname is None:
             return
         elif not os.path.isdir(dirname):
             logger.critical("Output collection dir %s must already exist.",
                             dirname)
             raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), dirname)
-        for fname in sorted(os.listdir(dirname), key=lambda x: x.lower()):
-            name = os.path.join(dirname, fname)
-            if not os.path.isdir(name):
+        entries = direntries(dirname)
+        for entry in sorted(entries, key=lambda x: x.name.lower()):
+            name = entry.path
+            if not entry.is_dir():
                 logger.info("Skipping non-directory %s (in %s)", name, dirname)
                 continue
             logger.debug("Found directory %s (in %s)", name, dirname)
-            o = OutputDirectory(name)
+            if snapshot is None:
+                o = OutputDirectory(name)
+            else:
+                o = snapshot.outputdirectory(name)
             assert o.stem not in self
             self[o.stem] = o
 
@@ -0,0 +1,270 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''a snapshot of the scanned source and output documents, kept between runs
+
+Building an Inventory means examining every source document (listing and
+hashing its files, guessing its doctype) and every output directory
+(reading its .LDP-source-MD5SUMS, checking for each expected output file).
+
+The InventorySnapshot remembers the result for each source entry and output
+directory along with a stat() signature:
+
+  - a source entry (a file or a document directory in a sourcedir):  the
+    size, mtime, inode and ctime of every file it contains
+  - an output directory:  the stat() of the directory itself (files added
+    or removed) and of its .LDP-source-MD5SUMS file
+
+On the next run, each entry with an unchanged signature is reused as it is;
+only the entries which changed are examined again.  Entries modified within
+the last couple of seconds are never remembered (see tldp.hashcache).
+
+A document directory is not keyed on the mtime of its directories alone:
+editing a file in place does not change the mtime of the directory which
+holds it, so the document would never be examined again.  Statting every
+file is still far cheaper than hashing it.
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import copy
+import time
+import errno
+import pickle
+import hashlib
+import logging
+from tempfile import mkstemp
+
+import tldp
+from tldp.utils import statfile, statfiles, Digests
+from tldp.hashcache import statkey, RACY_SECONDS
+from tldp.sources import sourcedocument
+from tldp.outputs import OutputNamingConvention, OutputDirectory
+
+logger = logging.getLogger(__name__)
+
+# -- bump this whenever the pickled classes change shape
+SNAPSHOT_FORMAT = 3
+
+
+def detached(doc):
+    '''return a copy of a SourceDocument as found, without its status
+
+    The Inventory classifies the documents in place, linking each to its
+    output; only what was found in the sourcedir belongs in the snapshot.
+    '''
+    if doc is None:
+        return None
+    doc = copy.copy(doc)
+    doc.status = 'source'
+    doc.output = doc.working = None
+    doc.differing = frozenset()
+    if hasattr(doc, 'dtworkingdir'):
+        del doc.dtworkingdir
+    return doc
+
+
+def packed(md5sums):
+    '''return md5sums as Digests (or as read, if not all hex digests)'''
+    try:
+        return Digests(md5sums)
+    except (TypeError, ValueError):
+        return md5sums
+
+
+def inventorykey(pubdir, sourcedirs):
+    '''return a hex digest identifying the inventory of pubdir/sourcedirs'''
+    dirs = [os.path.abspath(pubdir)]
+    dirs.extend(sorted(os.path.abspath(x) for x in sourcedirs))
+    return hashlib.md5('\0'.join(dirs).encode('utf-8')).hexdigest()
+
+
+def snapshotname(pubdir, sourcedirs):
+    '''return the file name of the snapshot for pubdir and sourcedirs'''
+    return 'inventory-' + inventorykey(pubdir, sourcedirs) + '.pickle'
+
+
+def sourcesignature(name):
+    '''return the (path, statkey) signature of every file below name'''
+    return tuple(sorted((path, statkey(st))
+                        for path, st in statfiles(name).items()))
+
+
+def outputsignature(dirname):
+    '''return the signature of an output directory and its MD5SUMS'''
+    result = list()
+    for name in (dirname, OutputNamingConvention(dirname, None).MD5SUMS):
+        st = statfile(name)
+        result.append(None if st is None else statkey(st))
+    return tuple(result)
+
+
+def isracy(signature):
+    '''True if any part of the signature was modified very recently'''
+    mtimes = [key[1] for key in signature if key is not None]
+    if not mtimes:
+        return False
+    return time.time() - max(mtimes) / 1e9 <= RACY_SECONDS
+
+
+class SnapshotOutputDirectory(OutputDirectory):
+    '''an OutputDirectory with the MD5SUMS and missing files of a prior run'''
+    __slots__ = ('_md5sums', '_algorithm', '_missing', '_iscomplete')
+
+    def __init__(self, dirname, md5sums, algorithm, missing, iscomplete):
+        super(SnapshotOutputDirectory, self).__init__(dirname)
+        self._md5sums = md5sums
+        self._algorithm = algorithm
+        self._missing = missing
+        self._iscomplete = iscomplete
+
+    @property
+    def md5sums(self):
+        if isinstance(self._md5sums, Digests):
+            return self._md5sums  # -- read-only
+        return dict(self._md5sums)
+
+    @property
+    def algorithm(self):
+        return self._algorithm
+
+    @property
+    def missing(self):
+        return set(self._missing)
+
+    @property
+    def iscomplete(self):
+        return self._iscomplete
+
+
+class InventorySnapshot(object):
+    '''reuse the unchanged source and output documents of the last scan
+
+    Pass an InventorySnapshot to Inventory (or SourceCollection and
+    OutputCollection) and call save() afterwards.  Only the entries seen
+    during this run are saved, so documents which disappear are dropped.
+    '''
+
+    def __repr__(self):
+        return '<%s:%s (%d reused, %d rescanned)>' % (
+               self.__class__.__name__, self.fname, self.hits, self.misses)
+
+    @classmethod
+    def fromconfig(cls, config):
+        '''return the snapshot in config.cachedir (or None if disabled)
+
+        With config.rescan, the saved snapshot is ignored (but replaced).
+        '''
+        if not getattr(config, 'snapshot', False):
+            return None
+        cachedir = getattr(config, 'cachedir', None)
+        if not cachedir:
+            return None
+        try:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+        except OSError as e:
+            logger.warning("Not using inventory snapshot in %s: %s",
+                           cachedir, e)
+            return None
+        fname = snapshotname(config.pubdir, config.sourcedir)
+        return cls(os.path.join(cachedir, fname),
+                   load=not getattr(config, 'rescan', False))
+
+    def __init__(self, fname, load=True):
+        self.fname = fname
+        self.hits = 0
+        self.misses = 0
+        self.sources = dict()
+        self.outputs = dict()
+        self.seen = dict(sources=dict(), outputs=dict())
+        if load:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.fname, 'rb') as f:
+                data = pickle.load(f)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                logger.warning("Cannot read snapshot %s: %s", self.fname, e)
+            return
+        except Exception as e:
+            # -- truncated file, or classes which changed shape, or...
+            logger.warning("Ignoring unreadable snapshot %s: %s",
+                           self.fname, e)
+            return
+        if data.get('format') != (SNAPSHOT_FORMAT, tldp.VERSION):
+            logger.info("Ignoring snapshot %s from another version.",
+                        self.fname)
+            return
+        self.sources = data['sources']
+        self.outputs = data['outputs']
+
+    def save(self):
+        '''atomically replace the snapshot with the entries of this run
+
+        The saved entries are also those reused by the next scan in this
+        process (e.g. the next refresh under --watch or --serve).
+        '''
+        data = dict(format=(SNAPSHOT_FORMAT, tldp.VERSION),
+                    sources=dict((name, (signature, detached(doc)))
+                                 for name, (signature, doc)
+                                 in self.seen['sources'].items()),
+                    outputs=dict(self.seen['outputs']))
+        self.sources = data['sources']
+        self.outputs = data['outputs']
+        dirname, basename = os.path.split(self.fname)
+        try:
+            fd, tmpname = mkstemp(prefix=basename, dir=dirname)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(data, f, 2)
+            os.rename(tmpname, self.fname)
+        except (IOError, OSError) as e:
+            logger.warning("Cannot save snapshot %s: %s", self.fname, e)
+            return False
+        logger.debug("%r saved.", self)
+        return True
+
+    def sourcedocument(self, name, hasher=None, entry=None):
+        '''return the SourceDocument (or None) for an entry in a sourcedir'''
+        name = os.path.abspath(name)
+        signature = sourcesignature(name)
+        known = self.sources.get(name)
+        if known is not None and known[1] is not None:
+            # -- hashed with another algorithm (--vcs changed)
+            if known[1].algorithm != getattr(hasher, 'algorithm', 'md5'):
+                known = None
+        if known is not None and known[0] == signature:
+            self.hits += 1
+            doc = known[1]
+        else:
+            self.misses += 1
+            doc = sourcedocument(name, hasher=hasher, entry=entry)
+        if not isracy(key for _, key in signature):
+            self.seen['sources'][name] = (signature, doc)
+        return doc
+
+    def outputdirectory(self, dirname):
+        '''return an OutputDirectory (with MD5SUMS and missing files)'''
+        dirname = os.path.abspath(dirname)
+        signature = outputsignature(dirname)
+        known = self.outputs.get(dirname)
+        if known is not None and known[0] == signature:
+            self.hits += 1
+            values = known[1:]
+        else:
+            self.misses += 1
+            odoc = OutputDirectory(dirname)
+            values = (packed(odoc.md5sums), odoc.algorithm,
+                      frozenset(odoc.missing), odoc.iscomplete)
+        if not isracy(signature):
+            self.seen['outputs'][dirname] = (signature,) + values
+        return SnapshotOutputDirectory(dirname, *values)
+
+#
+# -- end of file
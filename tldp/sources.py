@@ -8,22 +8,35 @@ from __future__ import unicode_literals
 
 import os
 import sys
+import stat
 import errno
 import logging
 
 from tldp.ldpcollection import LDPDocumentCollection
 
-from tldp.utils import md5files, stem_and_ext
+from tldp.utils import md5files, stem_and_ext, direntries, FallbackDirEntry
+from tldp.utils import Digests, intern
 from tldp.typeguesser import guess, knownextensions
 
 logger = logging.getLogger(__name__)
 
-IGNORABLE_SOURCE = ('index.sgml')
+IGNORABLE_SOURCE = ('index.sgml',)
 
 
-def scansourcedirs(dirnames):
+def entrystem(entry, isdir):
+    '''return the document stem for an entry in a sourcedir'''
+    if isdir:
+        return entry
+    return stem_and_ext(entry)[0]
+
+
+def scansourcedirs(dirnames, hasher=None, snapshot=None, stems=None):
     '''return a dict() of all SourceDocuments discovered in dirnames
     dirnames:  a list of directories containing SourceDocuments.
+    hasher:  optional, passed to each SourceDocument (see md5files)
+    snapshot:  optional, a tldp.snapshot.InventorySnapshot, which returns
+               the SourceDocuments of unchanged entries from the last run
+    stems:  optional, a set of stems; other documents are not examined
 
     scansourcedirs ensures it is operating on the absolute filesystem path for
     each of the source directories.
@@ -64,45 +77,69 @@ def scansourcedirs(dirnames):
 
     for sdir in sorted(dirs):
         logger.debug("Scanning for source documents in %s.", sdir)
-        for fname in sorted(os.listdir(sdir)):
-            candidates = list()
-            possible = arg_issourcedoc(os.path.join(sdir, fname))
-            if possible:
-                candidates.append(SourceDocument(possible))
+        for entry in sorted(direntries(sdir), key=lambda x: x.name):
+            fname = entry.name
+            if stems is not None:
+                if fname not in stems and stem_and_ext(fname)[0] not in stems:
+                    continue
+            name = entry.path
+            if snapshot is None:
+                candy = sourcedocument(name, hasher=hasher, entry=entry)
             else:
+                candy = snapshot.sourcedocument(name, hasher=hasher,
+                                                entry=entry)
+            if candy is None:
                 logger.warning("Skipping non-document %s", fname)
                 continue
-            for candy in candidates:
-                if candy.stem in found:
-                    dup = found[candy.stem].filename
-                    logger.warning("Ignoring duplicate is %s", candy.filename)
-                    logger.warning("Existing dup-entry is %s", dup)
-                else:
-                    found[candy.stem] = candy
+            if stems is not None and candy.stem not in stems:
+                continue
+            if candy.stem in found:
+                dup = found[candy.stem].filename
+                logger.warning("Ignoring duplicate is %s", candy.filename)
+                logger.warning("Existing dup-entry is %s", dup)
+            else:
+                found[candy.stem] = candy
     logger.debug("Discovered %s source documents", len(found))
     return found
 
 
-def arg_issourcedoc(filename):
+def sourcedocument(name, hasher=None, entry=None):
+    '''return a SourceDocument for a file or directory (or None)
+
+    entry is optional, the os.DirEntry for name (see direntries)
+    '''
+    possible = arg_issourcedoc(name, entry=entry)
+    if not possible:
+        return None
+    return SourceDocument(possible, hasher=hasher)
+
+
+def arg_issourcedoc(filename, entry=None):
     filename = os.path.abspath(filename)
-    if os.path.isfile(filename):
+    if entry is None:
+        entry = FallbackDirEntry(*os.path.split(filename))
+    if entry.is_file():
         if os.path.basename(filename) in IGNORABLE_SOURCE:
             return None
         return filename
-    elif os.path.isdir(filename):
+    elif entry.is_dir():
         return sourcedoc_fromdir(filename)
     return None
 
 
 def sourcedoc_fromdir(name):
     candidates = list()
-    if not os.path.isdir(name):
+    try:
+        entries = direntries(name)
+    except OSError as e:
+        if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+            raise
         return None
     stem = os.path.basename(name)
-    for ext in knownextensions:
-        possible = os.path.join(name, stem + ext)
-        if os.path.isfile(possible):
-            candidates.append(possible)
+    names = set(stem + ext for ext in knownextensions)
+    for entry in entries:
+        if entry.name in names and entry.is_file():
+            candidates.append(entry.path)
     if len(candidates) > 1:
         logger.warning("%s multiple document choices in dir %s, bailing....",
                        stem, name)
@@ -124,28 +161,36 @@ class SourceCollection(LDPDocumentCollection):
     The use of the stem as a key works conveniently with the
     OutputCollection which uses the same strategy on OutputDirectory.
     '''
-    def __init__(self, dirnames=None):
+    def __init__(self, dirnames=None, hasher=None, snapshot=None):
         '''construct a SourceCollection
 
         delegates most responsibility to function scansourcedirs
         '''
+        super(SourceCollection, self).__init__()
         if dirnames is None:
             return
-        self.update(scansourcedirs(dirnames))
+        self.update(scansourcedirs(dirnames, hasher=hasher,
+                                   snapshot=snapshot))
 
 
 class SourceDocument(object):
     '''a class providing a container for each set of source documents
     '''
+    __slots__ = ('dirname', 'basename', 'doctype', 'status', 'output',
+                 'working', 'dtworkingdir', 'differing', 'algorithm',
+                 'rehashed', 'md5sums')
+
     def __repr__(self):
         return '<%s:%s (%s)>' % \
                (self.__class__.__name__, self.filename, self.doctype)
 
-    def __init__(self, filename):
+    def __init__(self, filename, hasher=None):
         '''construct a SourceDocument
 
         filename is a required parameter
 
+        hasher is optional; see tldp.utils.md5files
+
         The filename is the main (and sometimes sole) document representing
         the source of the LDP HOWTO or Guide.  It is the document that is
         passed by name to be handled by any document processing toolchains
@@ -168,40 +213,79 @@ class SourceDocument(object):
         for every file in the source document directory (or just the single
         source document file) will be collected.
         '''
-        self.filename = os.path.abspath(filename)
-
-        if not os.path.exists(self.filename):
-            fn = self.filename
-            logger.critical("Missing source document: %s", fn)
-            raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), fn)
-
-        if os.path.isdir(self.filename):
-            self.filename = sourcedoc_fromdir(self.filename)
-        elif os.path.isfile(self.filename):
+        fname = os.path.abspath(filename)
+
+        entry = FallbackDirEntry(*os.path.split(fname))
+        try:
+            mode = entry.stat().st_mode
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            logger.critical("Missing source document: %s", fname)
+            raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), fname)
+
+        if stat.S_ISDIR(mode):
+            fname = sourcedoc_fromdir(fname)
+        elif stat.S_ISREG(mode):
             pass
         else:
             # -- we did not receive a useable document file or directory name
-            self.filename = None
+            fname = None
 
-        if self.filename is None:
+        if fname is None:
             fn = filename
             logger.critical("Source document is not a plain file: %s", fn)
             raise ValueError(fn + " not identifiable as a document")
 
+        dirname, self.basename = os.path.split(fname)
+        self.dirname = intern(dirname)
         self.doctype = guess(self.filename)
         self.status = 'source'
         self.output = None
         self.working = None
-        self.differing = set()
-        self.dirname, self.basename = os.path.split(self.filename)
-        self.stem, self.ext = stem_and_ext(self.basename)
-        parentbase = os.path.basename(self.dirname)
+        self.differing = frozenset()
         logger.debug("%s found source %s", self.stem, self.filename)
+        self.algorithm = getattr(hasher, 'algorithm', 'md5')
+        self.rehashed = None
+        self.md5sums = Digests(self.hashfiles(hasher=hasher))
+
+    @property
+    def filename(self):
+        return os.path.join(self.dirname, self.basename)
+
+    @property
+    def stem(self):
+        return os.path.splitext(self.basename)[0]
+
+    @property
+    def ext(self):
+        return os.path.splitext(self.basename)[1]
+
+    def hashfiles(self, hasher=None, algorithm='md5'):
+        '''return {relative name: hash} for the files of the document'''
+        parentbase = os.path.basename(self.dirname)
         if parentbase == self.stem:
             parentdir = os.path.dirname(self.dirname)
-            self.md5sums = md5files(self.dirname, relative=parentdir)
-        else:
-            self.md5sums = md5files(self.filename, relative=self.dirname)
+            return md5files(self.dirname, relative=parentdir,
+                            hasher=hasher, algorithm=algorithm)
+        return md5files(self.filename, relative=self.dirname,
+                        hasher=hasher, algorithm=algorithm)
+
+    def hashes(self, algorithm):
+        '''return md5sums, as computed with another hash algorithm
+
+        Used when the output was published with a different algorithm than
+        the one which produced md5sums; the result is kept.
+        '''
+        if algorithm == self.algorithm:
+            return self.md5sums
+        if self.rehashed is None:
+            self.rehashed = dict()
+        if algorithm not in self.rehashed:
+            logger.debug("%s rehashing source with %s", self.stem, algorithm)
+            self.rehashed[algorithm] = Digests(
+                self.hashfiles(algorithm=algorithm))
+        return self.rehashed[algorithm]
 
     def detail(self, widths, verbose, file=sys.stdout):
         '''produce a small tabular output about the document'''
@@ -0,0 +1,245 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''the locations and versions of the tools in the document toolchains
+
+The defaults for the tool options (e.g. --docbook4xml-xsltproc) are found
+by searching PATH (see tldp.utils.which).  A ToolCache remembers the result
+of each search, and the version string each tool reports, in
+CACHEDIR/tools.json.  The searches are reused as long as PATH and the mtime
+of every directory in PATH are unchanged (installing or removing a program
+changes the mtime of its directory); a version is reused as long as the
+size, mtime, inode and ctime of the program are unchanged.
+
+Before a build, ToolCache.configure() puts the tools into the configuration
+and checks each required tool once, so that BaseDoctype.build_precheck()
+need not check them again for every document.
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import json
+import errno
+import logging
+import subprocess
+from tempfile import mkstemp
+
+from tldp.utils import which, isexecutable
+from tldp.hashcache import statkey
+from tldp.cascadingconfig import LazyDefault
+
+logger = logging.getLogger(__name__)
+
+TOOLCACHE = 'tools.json'
+
+TOOLCACHE_FORMAT = 1
+
+# -- the arguments which make a program print its version (if not
+#    --version); output is read from both stdout and stderr
+#
+VERSIONARGS = {'fop': ['-version'],
+               'html2text': ['-version'],
+               'htmldoc': ['--version'],
+               'jade': ['-v'],
+               'openjade': ['-v'],
+               'sgml2html': ['--version'],
+               }
+
+
+def searchpath():
+    '''return the directories in PATH, in order'''
+    return [x.strip('"') for x in os.environ.get('PATH', '').split(os.pathsep)]
+
+
+def pathsignature(dirs):
+    '''return [[directory, mtime_ns], ...] for the directories in PATH'''
+    signature = list()
+    for d in dirs:
+        try:
+            mtime = statkey(os.stat(d))[1]
+        except OSError:
+            mtime = None
+        signature.append([d, mtime])
+    return signature
+
+
+def toolversion(fname):
+    '''return the first line a program prints about its version (or None)'''
+    cmd = [fname] + VERSIONARGS.get(os.path.basename(fname), ['--version'])
+    with open(os.devnull) as devnull:
+        try:
+            proc = subprocess.Popen(cmd, stdin=devnull,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+            output = proc.communicate()[0]
+        except OSError as e:
+            logger.debug("Command %r failed: %s", cmd, e)
+            return None
+    for line in output.decode('utf-8', 'replace').splitlines():
+        line = line.strip()
+        if line:
+            return line
+    return None
+
+
+class ToolCache(object):
+    '''find programs in PATH (and their versions), remembering the answers
+
+    If fname is None, nothing is read or saved, and the answers are kept
+    for the life of the object only.
+    '''
+
+    def __repr__(self):
+        return '<%s:%s (%d hits, %d misses)>' % (
+               self.__class__.__name__, self.fname, self.hits, self.misses)
+
+    @classmethod
+    def fromconfig(cls, config):
+        '''return the ToolCache in config.cachedir (in memory if disabled)'''
+        if not getattr(config, 'toolcache', False):
+            return cls()
+        cachedir = getattr(config, 'cachedir', None)
+        if not cachedir:
+            return cls()
+        try:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+        except OSError as e:
+            logger.warning("Not using tool cache in %s: %s", cachedir, e)
+            return cls()
+        return cls(os.path.join(cachedir, TOOLCACHE))
+
+    def __init__(self, fname=None):
+        self.fname = fname
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.dirs = searchpath()
+        self.signature = pathsignature(self.dirs)
+        self.programs = dict()
+        self.versions = dict()
+        self.checked = dict()
+        if fname is not None:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.fname) as f:
+                data = json.load(f)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                logger.warning("Cannot read tool cache %s: %s", self.fname, e)
+            return
+        except ValueError as e:
+            logger.warning("Ignoring unreadable tool cache %s: %s",
+                           self.fname, e)
+            return
+        if data.get('format') != TOOLCACHE_FORMAT:
+            return
+        if data.get('path') == self.signature:
+            self.programs = data.get('programs', dict())
+        else:
+            logger.debug("PATH changed, searching again for tools.")
+            self.dirty = True
+        self.versions = data.get('versions', dict())
+
+    def save(self):
+        '''atomically replace the tool cache (if anything changed)'''
+        if self.fname is None or not self.dirty:
+            return True
+        data = dict(format=TOOLCACHE_FORMAT, path=self.signature,
+                    programs=self.programs, versions=self.versions)
+        dirname, basename = os.path.split(self.fname)
+        try:
+            fd, tmpname = mkstemp(prefix=basename, dir=dirname)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.rename(tmpname, self.fname)
+        except (IOError, OSError) as e:
+            logger.warning("Cannot save tool cache %s: %s", self.fname, e)
+            return False
+        self.dirty = False
+        logger.debug("%r saved.", self)
+        return True
+
+    def close(self):
+        self.save()
+
+    def which(self, program):
+        '''return None or the full path to program (see tldp.utils.which)'''
+        if os.path.dirname(program):
+            return which(program)
+        if program in self.programs:
+            found = self.programs[program]
+            if found is None or isexecutable(found):
+                self.hits += 1
+                return found
+        self.misses += 1
+        found = which(program)
+        self.programs[program] = found
+        self.dirty = True
+        return found
+
+    def version(self, fname):
+        '''return the version string reported by a program (or None)'''
+        try:
+            key = list(statkey(os.stat(fname)))
+        except OSError:
+            return None
+        known = self.versions.get(fname)
+        if known is not None and known[0] == key:
+            self.hits += 1
+            return known[1]
+        self.misses += 1
+        version = toolversion(fname)
+        logger.debug("%s reports version %r", fname, version)
+        self.versions[fname] = [key, version]
+        self.dirty = True
+        return version
+
+    def check(self, validator, value):
+        '''return validator(value), computed once for the life of the cache'''
+        key = (validator, value)
+        if key not in self.checked:
+            self.checked[key] = bool(validator(value))
+        return self.checked[key]
+
+    def configure(self, config, doctypes, versions=False):
+        '''settle the tool configuration for building doctypes
+
+        Each default found by searching PATH is replaced by the answer from
+        the cache, and any other LazyDefault is resolved, so that the
+        configuration is complete before it is passed to a build.
+
+        Sets config.toolschecked, the names of the required tools of the
+        doctypes which are known to be usable (see build_precheck), and
+        config.toolversions, {program: version} for those which are
+        programs, if versions is True (see tldp.buildcache.fingerprint).
+        '''
+        for name, value in list(vars(config).items()):
+            if isinstance(value, LazyDefault) and value.func is which:
+                setattr(config, name, self.which(*value.args))
+        if hasattr(config, 'resolve'):
+            config.resolve()
+        checked = set()
+        toolversions = dict()
+        for doctype in doctypes:
+            for tool, validator in sorted(doctype.required.items()):
+                value = getattr(config, tool, None)
+                if value is None or not self.check(validator, value):
+                    continue
+                checked.add(tool)
+                if versions and validator is isexecutable:
+                    toolversions[value] = self.version(value)
+        config.toolschecked = frozenset(checked)
+        config.toolversions = toolversions
+        for program, version in sorted(toolversions.items()):
+            logger.info("Using %s, version %s", program, version)
+        return config
+
+#
+# -- end of file
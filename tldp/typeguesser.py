@@ -7,30 +7,22 @@ from __future__ import absolute_import, division, print_function
 
 import os
 import codecs
-import inspect
 import logging
 
-import tldp.doctypes
+from tldp.doctypes import Asciidoc, Docbook4XML, Docbook5XML, DocbookSGML
+from tldp.doctypes import Linuxdoc
 
 logger = logging.getLogger(__name__)
 
-
-def getDoctypeMembers(membertype):
-    '''returns a list of tldp.doctypes; convenience function'''
-    found = list()
-    for name, member in inspect.getmembers(tldp.doctypes, membertype):
-        logger.debug("Located %s %s (%r).", membertype.__name__, name, member)
-        found.append(member)
-    return found
+# -- the canonical list of doctypes which are recognized and capable of being
+#    processed into outputs; see tldp.doctypes for more information
+#
+knowndoctypes = [Asciidoc, Docbook4XML, Docbook5XML, DocbookSGML, Linuxdoc]
 
 
 def getDoctypeClasses():
-    '''returns a list of the classes known in tldp.doctypes
-
-    This is the canonical list of doctypes which are recognized and capable of
-    being processed into outputs.  See tldp.doctypes for more information.
-    '''
-    return getDoctypeMembers(inspect.isclass)
+    '''returns a list of the classes known in tldp.doctypes'''
+    return list(knowndoctypes)
 
 
 def guess(fname):
@@ -64,7 +56,7 @@ def guess(fname):
         logger.debug("%s no file extension, skipping %s.", stem, ext)
         return None
 
-    possible = [t for t in knowndoctypes if ext in t.extensions]
+    possible = list(doctypesbyextension.get(ext, ()))
     logger.debug("Possible:  %r", possible)
     if not possible:
         logger.debug("%s unknown extension %s.", stem, ext)
@@ -116,10 +108,11 @@ def guess(fname):
     return doctype
 
 
-knowndoctypes = getDoctypeClasses()
-knownextensions = set()
+doctypesbyextension = dict()
 for x in knowndoctypes:
-    knownextensions.update(x.extensions)
+    for ext in x.extensions:
+        doctypesbyextension.setdefault(ext, list()).append(x)
+knownextensions = set(doctypesbyextension)
 
 #
 # -- end of file
@@ -7,17 +7,40 @@ from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
 import os
+import stat
 import time
 import errno
 import codecs
 import hashlib
+import binascii
 import subprocess
 import functools
+from collections import Counter
 from functools import wraps
 from tempfile import mkstemp, mkdtemp
 import logging
 logger = logging.getLogger(__name__)
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping  # -- python2
+
+# -- the line of an MD5SUMS file naming the hash algorithm
+ALGORITHM_PREFIX = '# -- algorithm: '
+
+# -- files are hashed HASHCHUNKSIZE bytes at a time, by up to HASHTHREADS
+#    threads at once, or one per CPU if fewer (see hashmany)
+#
+HASHCHUNKSIZE = 1 << 20
+HASHTHREADS = 8
+_hashpool = None
+
+# -- the directory reads and stat() calls made while scanning file trees
+#    (see direntries); inventory logs these to make scans measurable
+#
+fscounts = Counter()
+
 opa = os.path.abspath
 opb = os.path.basename
 opd = os.path.dirname
@@ -60,6 +83,16 @@ def arg_isloglevel(l, defaultlevel=logging.ERROR):
     return level
 
 
+def arg_isnonnegativeint(n):
+    try:
+        n = int(n)
+    except (TypeError, ValueError):
+        return None
+    if n < 0:
+        return None
+    return n
+
+
 def arg_isstr(s):
     if isstr(s):
         return s
@@ -129,7 +162,7 @@ def conditionallogging(result, prefix, fname):
 
 
 def execute(cmd, stdin=None, stdout=None, stderr=None,
-            logdir=None, env=os.environ):
+            logdir=None, env=os.environ, cwd=None):
     '''(yet another) wrapper around subprocess.Popen()
 
     The processing tools for handling DocBook SGML, DocBook XML and Linuxdoc
@@ -157,6 +190,9 @@ def execute(cmd, stdin=None, stdout=None, stderr=None,
       - stderr: if not supplied, STDERR (FD 2) will be connected
         to a named file in the logdir (and left for later inspection)
       - env: if not supplied, just use current environment
+      - cwd: if supplied, the child process runs in this directory; the
+        working directory of the calling process is never changed, so
+        many documents can be built concurrently in one process
 
     Returns: the numeric exit code of the process
 
@@ -197,10 +233,10 @@ def execute(cmd, stdin=None, stdout=None, stderr=None,
     else:
         stderrname = None
 
-    logger.debug("About to execute: %r", cmd)
+    logger.debug("About to execute: %r (in %s)", cmd, cwd)
     proc = subprocess.Popen(cmd, shell=False, close_fds=True,
                             stdin=stdin, stdout=stdout, stderr=stderr,
-                            env=env, preexec_fn=os.setsid)
+                            env=env, cwd=cwd, preexec_fn=os.setsid)
     result = proc.wait()
     if result != 0:
         logger.error("Non-zero exit (%s) for process: %r", result, cmd)
@@ -214,6 +250,70 @@ def execute(cmd, stdin=None, stdout=None, stderr=None,
     return result
 
 
+def execute_pipeline(cmds, stdin=None, stdout=None,
+                     logdir=None, env=os.environ, cwd=None):
+    '''run a pipeline of commands (cmds[0] | cmds[1] | ...) like execute()
+
+    The STDOUT of each command feeds the STDIN of the next.  stdin (if
+    supplied) feeds the first command and stdout (if supplied) receives the
+    output of the last one.  As with execute(), the STDERR of every command,
+    and the STDOUT of the last (unless stdout is supplied), are recorded in
+    named files in logdir.  With a single command, this is just execute().
+
+    Returns: the exit code of the rightmost command that failed, or 0 (like
+    bash with "set -o pipefail")
+    '''
+    if len(cmds) == 1:
+        return execute(cmds[0], stdin=stdin, stdout=stdout,
+                       logdir=logdir, env=env, cwd=cwd)
+
+    for cmd in cmds:
+        assert isexecutable(cmd[0])
+
+    if logdir is None:
+        raise ValueError("logdir must be a directory, cannot be None.")
+
+    if not os.path.isdir(logdir):
+        raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), logdir)
+
+    procs = list()
+    logs = list()
+    pipein = stdin
+    for n, cmd in enumerate(cmds):
+        prefix = os.path.basename(cmd[0]) + '.' + str(os.getpid()) + '-'
+        mytfile = functools.partial(mkstemp, prefix=prefix, dir=logdir)
+        if n < len(cmds) - 1:
+            pipeout = subprocess.PIPE
+        elif stdout is None:
+            pipeout, stdoutname = mytfile(suffix='.stdout')
+            logs.append((pipeout, 'STDOUT', stdoutname))
+        else:
+            pipeout = stdout
+        stderr, stderrname = mytfile(suffix='.stderr')
+        logs.append((stderr, 'STDERR', stderrname))
+        logger.debug("About to execute: %r (in %s)", cmd, cwd)
+        proc = subprocess.Popen(cmd, shell=False, close_fds=True,
+                                stdin=pipein, stdout=pipeout, stderr=stderr,
+                                env=env, cwd=cwd, preexec_fn=os.setsid)
+        if procs:
+            pipein.close()  # -- so that the writer sees SIGPIPE, as in sh
+        pipein = proc.stdout
+        procs.append(proc)
+
+    results = [proc.wait() for proc in procs]
+    result = 0
+    for cmd, r in zip(cmds, results):
+        if r != 0:
+            logger.error("Non-zero exit (%s) for process: %r", r, cmd)
+            result = r
+    if result != 0:
+        logger.error("Find STDOUT/STDERR in %s", logdir)
+    for fd, prefix, fname in logs:
+        os.close(fd)
+        conditionallogging(result, prefix, fname)
+    return result
+
+
 def isexecutable(f):
     '''True if argument is executable'''
     return os.path.isfile(f) and os.access(f, os.X_OK)
@@ -250,29 +350,297 @@ http://stackoverflow.com/questions/377017/test-if-executable-exists-in-python/37
     return None
 
 
-def writemd5sums(fname, md5s, header=None):
-    '''write an MD5SUM file from [(filename, MD5), ...]'''
-    with codecs.open(fname, 'w', encoding='utf-8') as file:
-        if header:
-            print(header, file=file)
-        for fname, hashval in sorted(md5s.items()):
-            print(hashval + '  ' + fname, file=file)
+def writemd5sums(fname, md5s, header=None, algorithm=None):
+    '''write an MD5SUM file from [(filename, MD5), ...]
 
+    If the hashes were not made with md5file(), name the algorithm (see
+    hashfunctions); it is recorded in a comment line.
 
-def md5file(name):
-    '''return MD5 hash for a single file name'''
+    The file is written under a temporary name and renamed into place, so an
+    existing file is replaced, never rewritten:  it may be a hardlink into
+    the build cache (see tldp.buildcache).
+    '''
+    tmpname = '%s.%d.tmp' % (fname, os.getpid())
+    try:
+        with codecs.open(tmpname, 'w', encoding='utf-8') as file:
+            if header:
+                print(header, file=file)
+            if algorithm:
+                print(ALGORITHM_PREFIX + algorithm, file=file)
+            for name, hashval in sorted(md5s.items()):
+                print(hashval + '  ' + name, file=file)
+        os.rename(tmpname, fname)
+    except (IOError, OSError):
+        if os.path.exists(tmpname):
+            os.unlink(tmpname)
+        raise
+
+
+def readmd5sums(fname):
+    '''return (algorithm, {filename: hash}) from an MD5SUM file
+
+    The algorithm is 'md5' unless the file names another; a missing file
+    yields an empty dict().
+    '''
+    algorithm = 'md5'
+    d = dict()
+    try:
+        with codecs.open(fname, encoding='utf-8') as f:
+            for line in f:
+                if line.startswith(ALGORITHM_PREFIX):
+                    algorithm = line[len(ALGORITHM_PREFIX):].strip()
+                    continue
+                if line.startswith('#'):
+                    continue
+                hashval, fname = line.strip().split()
+                d[fname] = hashval
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    return algorithm, d
+
+
+def hashfile(name, algorithm='md5'):
+    '''return the hex digest of a single file name, read in chunks
+
+    The algorithm is any known to hashlib, or 'gitblob' (see gitblobfile).
+    '''
     with open(name, 'rb') as f:
-        bs = f.read()
-    md5 = hashlib.md5(bs).hexdigest()
+        if algorithm == 'gitblob':
+            size = os.fstat(f.fileno()).st_size
+            h = hashlib.sha1(b'blob ' + str(size).encode('ascii') + b'\0')
+        else:
+            h = hashlib.new(algorithm)
+        for chunk in iter(functools.partial(f.read, HASHCHUNKSIZE), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
     try:
-        md5 = unicode(md5)
+        digest = unicode(digest)
     except NameError:
         pass  # -- python3
-    return md5
+    return digest
+
+
+def md5file(name):
+    '''return MD5 hash for a single file name'''
+    return hashfile(name, 'md5')
+
+
+def gitblobfile(name):
+    '''return the git blob ID (SHA-1 of header and content) for a file'''
+    return hashfile(name, 'gitblob')
+
+
+def blake2bfile(name):
+    '''return the BLAKE2b hash for a single file name'''
+    return hashfile(name, 'blake2b')
+
+
+# -- the algorithms which may be named in an MD5SUMS file
+hashfunctions = {'md5': md5file, 'gitblob': gitblobfile}
+if hasattr(hashlib, 'blake2b'):
+    hashfunctions['blake2b'] = blake2bfile  # -- python3.6 and newer
+
+
+try:
+    from sys import intern
+except ImportError:
+    def intern(s):  # -- python2, where intern() does not take unicode
+        return s
+
+
+class Digests(Mapping):
+    '''a read-only {relative name: hex digest}, kept compactly
+
+    Each name is held as its (interned) directory and basename, in parallel
+    arrays sorted by both, so that the names of different documents share
+    their common parts.  The digests are held in binary, concatenated in a
+    single bytes object (16 bytes for each MD5).  Compares equal to a dict()
+    with the same names and hex digests.
+    '''
+    __slots__ = ('dirs', 'bases', 'packed', 'size')
+
+    def __repr__(self):
+        return '<%s:(%d files)>' % (self.__class__.__name__, len(self))
+
+    def __init__(self, hashes=()):
+        hashes = dict(hashes)
+        names = sorted((os.path.split(x), x) for x in hashes)
+        digests = [binascii.unhexlify(hashes[x]) for _, x in names]
+        self.size = len(digests[0]) if digests else 0
+        if any(len(x) != self.size for x in digests):
+            raise ValueError("digests of different lengths")
+        self.dirs = tuple(intern(d) for (d, _), _ in names)
+        self.bases = tuple(intern(b) for (_, b), _ in names)
+        self.packed = b''.join(digests)
+
+    def __getstate__(self):
+        return (self.dirs, self.bases, self.packed, self.size)
+
+    def __setstate__(self, state):
+        self.dirs, self.bases, self.packed, self.size = state
+
+    def find(self, name):
+        '''return the position of name (or None)'''
+        key = os.path.split(name)
+        lo, hi = 0, len(self.bases)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (self.dirs[mid], self.bases[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.bases) and \
+                (self.dirs[lo], self.bases[lo]) == key:
+            return lo
+        return None
+
+    def __getitem__(self, name):
+        n = self.find(name)
+        if n is None:
+            raise KeyError(name)
+        digest = self.packed[n * self.size:(n + 1) * self.size]
+        return binascii.hexlify(digest).decode('ascii')
+
+    def __iter__(self):
+        for d, b in zip(self.dirs, self.bases):
+            yield os.path.join(d, b)
+
+    def __len__(self):
+        return len(self.bases)
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+    def __eq__(self, other):
+        if isinstance(other, Digests):
+            return (self.packed == other.packed and
+                    self.bases == other.bases and self.dirs == other.dirs)
+        return Mapping.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+
+def hashthreads():
+    '''return the number of threads which hash files at once'''
+    try:
+        from os import cpu_count
+    except ImportError:
+        from multiprocessing import cpu_count  # -- python2
+    return min(HASHTHREADS, cpu_count() or 1)
+
+
+def hashpool():
+    '''return the (per process) pool of threads for hashing files'''
+    from multiprocessing.pool import ThreadPool
+    global _hashpool
+    if _hashpool is None or _hashpool[0] != os.getpid():
+        _hashpool = (os.getpid(), ThreadPool(hashthreads()))
+    return _hashpool[1]
+
+
+def hashmany(names, func=md5file):
+    '''return [func(name), ...], hashing the files concurrently
+
+    hashlib releases the GIL while hashing (and so does reading a file), so
+    a pool of threads keeps several CPUs busy on a document with many files.
+    '''
+    if len(names) < 2 or hashthreads() < 2:
+        return [func(x) for x in names]
+    return hashpool().map(func, names)
+
+
+class FallbackDirEntry(object):
+    '''the parts of os.DirEntry used by ldptool, for python < 3.5'''
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.name)
+
+    def __init__(self, dirname, name):
+        self.name = name
+        self.path = os.path.join(dirname, name)
+        self._stat = dict()
+
+    def stat(self, follow_symlinks=True):
+        '''return the (cached) stat() or lstat() of the entry
+
+        As for os.DirEntry, the lstat() serves for both unless the entry is
+        a symbolic link.
+        '''
+        if False not in self._stat:
+            fscounts['stat'] += 1
+            st = self._stat[False] = os.lstat(self.path)
+            if not stat.S_ISLNK(st.st_mode):
+                self._stat[True] = st
+        if follow_symlinks and True not in self._stat:
+            fscounts['stat'] += 1
+            self._stat[True] = os.stat(self.path)
+        return self._stat[bool(follow_symlinks)]
+
+    def _mode(self, follow_symlinks):
+        try:
+            return self.stat(follow_symlinks=follow_symlinks).st_mode
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return 0
+
+    def is_dir(self, follow_symlinks=True):
+        return stat.S_ISDIR(self._mode(follow_symlinks))
+
+    def is_file(self, follow_symlinks=True):
+        return stat.S_ISREG(self._mode(follow_symlinks))
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self._mode(False))
+
+
+def fallbackscandir(dirname):
+    return [FallbackDirEntry(dirname, x) for x in os.listdir(dirname)]
+
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir  # -- python2, if installed
+    except ImportError:
+        scandir = fallbackscandir
+
+
+def direntries(dirname):
+    '''return the entries of a directory (see os.scandir)
+
+    Each entry knows its name, path and (usually without a further system
+    call) whether it is a file or a directory; its stat() is cached.
+    '''
+    fscounts['scandir'] += 1
+    it = scandir(dirname)
+    try:
+        return list(it)
+    finally:
+        if hasattr(it, 'close'):
+            it.close()
+
+
+def entrystat(entry):
+    '''return posix.stat_result (or None) for a directory entry (lstat)'''
+    if not isinstance(entry, FallbackDirEntry):
+        fscounts['stat'] += 1  # -- else counted by FallbackDirEntry.stat
+    try:
+        return entry.stat(follow_symlinks=False)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise e
+        return None
 
 
 def statfile(name):
     '''return posix.stat_result (or None) for a single file name'''
+    fscounts['stat'] += 1
     try:
         st = os.lstat(name)
     except OSError as e:
@@ -282,9 +650,19 @@ def statfile(name):
     return st
 
 
-def md5files(name, relative=None):
-    '''get all of the MD5s for files from here downtree'''
-    return fileinfo(name, relative=relative, func=md5file)
+def md5files(name, relative=None, hasher=None, algorithm='md5'):
+    '''get all of the MD5s for files from here downtree
+
+    If supplied, hasher.hashfiles() is used instead of md5file(), for example
+    a tldp.hashcache.HashCache, which avoids rereading unchanged files.
+    Without a hasher, another algorithm from hashfunctions may be named.
+    '''
+    names = listfiles(name)
+    if hasher is not None:
+        hashes = hasher.hashfiles(names)
+    else:
+        hashes = hashmany(names, hashfunctions[algorithm])
+    return relativeinfo(names, hashes, relative)
 
 
 def statfiles(name, relative=None):
@@ -296,7 +674,56 @@ def statfiles(name, relative=None):
     >>> statfiles('./docs/x509', relative='./docs/x509/').keys()
     ['index.rst', 'tutorial.rst', 'reference.rst']
     '''
-    return fileinfo(name, relative=relative, func=statfile)
+    found = scanfiles(name)
+    stats = [statfile(path) if entry is None else entrystat(entry)
+             for path, entry in found]
+    return relativeinfo([path for path, _ in found], stats, relative)
+
+
+def scanfiles(name):
+    '''return [(filename, entry), ...] for the files at or below name
+
+    Each directory is read once, with direntries(); the entry is None for
+    name itself, if it is a file.  A name which does not exist yields an
+    empty list (see fileinfo).  Symbolic links to directories are neither
+    followed nor returned (like os.walk()).
+    '''
+    fscounts['stat'] += 1
+    try:
+        st = os.stat(name)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return []
+    if not stat.S_ISDIR(st.st_mode):
+        return [(name, None)]
+    found = list()
+    dirs = [name]
+    while dirs:
+        for entry in direntries(dirs.pop()):
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    dirs.append(entry.path)
+                continue
+            found.append((entry.path, entry))
+    return found
+
+
+def listfiles(name):
+    '''return the names of the files at (or, for a directory, below) name'''
+    return [path for path, _ in scanfiles(name)]
+
+
+def relativeinfo(names, values, relative=None):
+    '''return {name: value}, names made relative, omitting None values'''
+    info = dict()
+    for name, value in zip(names, values):
+        if value is None:
+            continue
+        if relative:
+            name = os.path.relpath(name, start=relative)
+        info[name] = value
+    return info
 
 
 def fileinfo(name, relative=None, func=statfile):
@@ -323,34 +750,8 @@ def fileinfo(name, relative=None, func=statfile):
       excluding any files (in the output dict()) which did not return a valid
       posix.stat_result.
     '''
-    info = dict()
-    if not os.path.exists(name):
-        return info
-    if not os.path.isdir(name):
-        if relative:
-            relpath = os.path.relpath(name, start=relative)
-        else:
-            relpath = name
-        info[relpath] = func(name)
-        if info[relpath] is None:
-            del info[relpath]
-    else:
-        for root, dirs, files in os.walk(name):
-            inodes = list()
-            inodes.extend(dirs)
-            inodes.extend(files)
-            for x in inodes:
-                foundpath = os.path.join(root, x)
-                if os.path.isdir(foundpath):
-                    continue
-                if relative:
-                    relpath = os.path.relpath(foundpath, start=relative)
-                else:
-                    relpath = foundpath
-                info[relpath] = func(foundpath)
-                if info[relpath] is None:
-                    del info[relpath]
-    return info
+    names = listfiles(name)
+    return relativeinfo(names, [func(x) for x in names], relative)
 
 #
 # -- end of file
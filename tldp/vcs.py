@@ -0,0 +1,222 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''source file hashes taken from a version control system (--vcs git)
+
+The LDP sources live in git, and git records in its index the blob ID (the
+SHA-1 of "blob <size>\\0" and the content) of every tracked file.  With
+--vcs git, the GitIndex is the hasher for the SourceDocuments (see
+tldp.utils.md5files):  one "git ls-files" per repository lists the blob
+IDs of all tracked files, and only the files which git reports as modified,
+and untracked files, are read and hashed here.
+
+The digests are recorded in each .LDP-source-MD5SUMS with the algorithm
+'gitblob' (see tldp.utils.hashfunctions), so that the Inventory can tell
+them apart from the md5 digests of documents published without --vcs.
+
+After a complete --publish, the commit checked out in each sourcedir is
+recorded in the pubdir (REVISIONS).  The files changed since then ("git
+diff" against the working tree, and untracked files) name the documents of
+the 'changed' selector, without scanning the rest of the collection.
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import errno
+import codecs
+import logging
+import subprocess
+
+from tldp.utils import which
+from tldp.hashcache import Hasher
+
+logger = logging.getLogger(__name__)
+
+# -- file modes of index entries which are not regular files:  a symlink
+#    is hashed by git as its target name, a gitlink is a submodule commit
+#
+NOTFILES = (b'120000', b'160000')
+
+# -- in the pubdir, the revision of each sourcedir last published completely
+#
+REVISIONS = '.LDP-source-revisions'
+
+try:
+    fsdecode = os.fsdecode
+except AttributeError:
+    def fsdecode(name):  # -- python2
+        return name.decode(sys.getfilesystemencoding())
+
+
+def rungit(git, cwd, *args):
+    '''return the output of a git command in cwd (None on failure)'''
+    cmd = [git]
+    cmd.extend(args)
+    with open(os.devnull, 'w') as devnull:
+        try:
+            return subprocess.check_output(cmd, cwd=cwd, stderr=devnull)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.debug("Command %r failed: %s", cmd, e)
+            return None
+
+
+def splitnames(output):
+    '''return the file names in the output of a git command with -z'''
+    return [fsdecode(x) for x in output.split(b'\0') if x]
+
+
+def revision(git, dirname):
+    '''return the commit checked out in dirname (None if not in git)'''
+    output = rungit(git, dirname, 'rev-parse', '--verify', '-q', 'HEAD')
+    if not output:
+        return None
+    return output.decode('ascii').strip()
+
+
+def changedfiles(git, dirname, since):
+    '''return the files below dirname changed since revision since
+
+    The names are relative to dirname; files changed but not committed and
+    untracked files are included.  Returns None if git cannot tell (e.g.
+    since is not a known commit).
+    '''
+    diff = rungit(git, dirname, 'diff', '--name-only', '--no-renames', '-z',
+                  '--relative', since, '--')
+    others = rungit(git, dirname, 'ls-files', '--others', '--exclude-standard',
+                    '-z')
+    if diff is None or others is None:
+        return None
+    return set(splitnames(diff) + splitnames(others))
+
+
+def readrevisions(pubdir):
+    '''return {sourcedir: revision} as last recorded in pubdir'''
+    revisions = dict()
+    try:
+        with codecs.open(os.path.join(pubdir, REVISIONS),
+                         encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('#'):
+                    continue
+                rev, dirname = line.rstrip('\n').split('  ', 1)
+                revisions[dirname] = rev
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    return revisions
+
+
+def writerevisions(pubdir, revisions):
+    '''record {sourcedir: revision} in pubdir'''
+    with codecs.open(os.path.join(pubdir, REVISIONS), 'w',
+                     encoding='utf-8') as f:
+        print('# -- revisions of the sources last published', file=f)
+        for dirname, rev in sorted(revisions.items()):
+            print(rev + '  ' + dirname, file=f)
+
+
+class GitIndex(Hasher):
+    '''return the hashes of files from the index of their git repository'''
+
+    def __repr__(self):
+        return '<%s:%s (%d hits, %d misses)>' % (
+               self.__class__.__name__, self.git, self.hits, self.misses)
+
+    @classmethod
+    def fromconfig(cls, config):
+        '''return a GitIndex if config.vcs is 'git' (else None)'''
+        if getattr(config, 'vcs', None) != 'git':
+            return None
+        git = which('git')
+        if git is None:
+            logger.warning("Not using --vcs git:  cannot find git.")
+            return None
+        return cls(git)
+
+    def __init__(self, git='git'):
+        super(GitIndex, self).__init__('gitblob')
+        self.git = git
+        self.sync()
+
+    def toplevel(self, dirname):
+        '''return the top of the git working tree containing dirname'''
+        path = dirname
+        while True:
+            top = self.toplevels.get(path)
+            if top is not None or (path == dirname and path in self.toplevels):
+                break
+            parent = os.path.dirname(path)
+            if parent == path:
+                output = rungit(self.git, dirname,
+                                'rev-parse', '--show-toplevel')
+                top = None
+                if output is not None:
+                    top = os.path.realpath(fsdecode(output.rstrip(b'\n')))
+                    self.toplevels[top] = top
+                break
+            path = parent
+        self.toplevels[dirname] = top
+        return top
+
+    def index(self, top):
+        '''return {path: blob ID} of the unmodified files in repository top'''
+        blobs = self.indexes.get(top)
+        if blobs is not None:
+            return blobs
+        blobs = dict()
+        staged = rungit(self.git, top, 'ls-files', '--stage', '-z')
+        modified = rungit(self.git, top, 'ls-files', '--modified', '-z')
+        if staged is None or modified is None:
+            logger.warning("Cannot read the git index in %s.", top)
+        else:
+            for entry in staged.split(b'\0'):
+                if not entry:
+                    continue
+                info, name = entry.split(b'\t', 1)
+                mode, blob, stage = info.split()
+                if mode in NOTFILES or stage != b'0':
+                    continue
+                name = os.path.join(top, fsdecode(name))
+                blobs[name] = blob.decode('ascii')
+            for name in splitnames(modified):
+                blobs.pop(os.path.join(top, name), None)
+        logger.debug("%s: %d unmodified files in the git index.",
+                     top, len(blobs))
+        self.indexes[top] = blobs
+        return blobs
+
+    def hashfiles(self, names):
+        '''return the git blob IDs for a list of file names'''
+        blobs = list()
+        todo = list()
+        for n, name in enumerate(names):
+            name = os.path.realpath(name)
+            top = self.toplevel(os.path.dirname(name))
+            blob = None
+            if top is not None:
+                blob = self.index(top).get(name)
+            if blob is None:
+                todo.append(n)
+            else:
+                self.hits += 1
+            blobs.append(blob)
+        hashes = super(GitIndex, self).hashfiles([names[n] for n in todo])
+        for n, blob in zip(todo, hashes):
+            blobs[n] = blob
+        return blobs
+
+    def sync(self):
+        '''forget the index; it is read again when next needed'''
+        self.toplevels = dict()
+        self.indexes = dict()
+
+    def close(self):
+        self.sync()
+
+#
+# -- end of file
@@ -0,0 +1,210 @@
+#! /usr/bin/python
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2016 Linux Documentation Project
+
+'''watch the source directories for changed documents (Linux inotify)
+
+A SourceWatcher places an inotify watch on every --sourcedir and on every
+directory below it (the document directories and their image directories).
+Each event is traced back to the entry in the sourcedir which contains it,
+and so to the stem of the document (see tldp.sources.scansourcedirs).
+wait() blocks, without polling, until something changes and then collects
+events until none has arrived for the debounce interval, so that a commit
+or checkout touching many files is handled as one batch.
+
+The index.sgml written into the source tree during a DocBook SGML build
+is ignored, as it is by the source document scanner.
+'''
+
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+from tldp.sources import IGNORABLE_SOURCE, entrystem
+
+logger = logging.getLogger(__name__)
+
+# -- from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCHMASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO \
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+eventheader = struct.Struct(str('iIII'))
+
+try:
+    fsdecode = os.fsdecode
+except AttributeError:
+    def fsdecode(name):  # -- python2
+        return name.decode(sys.getfilesystemencoding())
+
+try:
+    fsencode = os.fsencode
+except AttributeError:
+    def fsencode(name):  # -- python2
+        return name.encode(sys.getfilesystemencoding())
+
+
+def libc():
+    '''return the C library, if it supports inotify (else raise OSError)'''
+    lib = ctypes.CDLL(ctypes.util.find_library(str('c')), use_errno=True)
+    if not hasattr(lib, 'inotify_init1'):
+        raise OSError(errno.ENOSYS, "inotify is not available")
+    lib.inotify_init1.argtypes = [ctypes.c_int]
+    lib.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                      ctypes.c_uint32]
+    lib.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return lib
+
+
+def parse_events(buf):
+    '''yield (wd, mask, name) for each struct inotify_event in buf'''
+    offset = 0
+    while offset + eventheader.size <= len(buf):
+        wd, mask, cookie, length = eventheader.unpack_from(buf, offset)
+        offset += eventheader.size
+        name = buf[offset:offset + length].rstrip(b'\0')
+        offset += length
+        yield wd, mask, fsdecode(name)
+
+
+class SourceWatcher(object):
+    '''report the stems of documents changed in a set of sourcedirs'''
+
+    def __repr__(self):
+        return '<%s:%d watches>' % (self.__class__.__name__, len(self.watches))
+
+    def __init__(self, dirnames):
+        self.lib = libc()
+        self.fd = self.lib.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        # -- wd -> (sourcedir, path of the watched directory)
+        self.watches = dict()
+        self.sourcedirs = [os.path.abspath(x) for x in dirnames]
+        for sdir in self.sourcedirs:
+            self.addtree(sdir, sdir)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = None
+
+    def addwatch(self, sdir, path):
+        wd = self.lib.inotify_add_watch(self.fd, fsencode(path), WATCHMASK)
+        if wd < 0:
+            e = ctypes.get_errno()
+            if e in (errno.ENOENT, errno.ENOTDIR):
+                return  # -- gone already
+            raise OSError(e, os.strerror(e), path)
+        self.watches[wd] = (sdir, path)
+
+    def addtree(self, sdir, top):
+        '''watch top and every directory below it'''
+        for root, dirs, files in os.walk(top):
+            self.addwatch(sdir, root)
+
+    def stems(self, events):
+        '''return the set of stems affected by events; None means all'''
+        stems = set()
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Too many inotify events, rescanning all.")
+                return None
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if wd not in self.watches or not name:
+                continue
+            if name in IGNORABLE_SOURCE:
+                continue
+            sdir, path = self.watches[wd]
+            fullpath = os.path.join(path, name)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.addtree(sdir, fullpath)
+            relpath = os.path.relpath(fullpath, sdir)
+            entry = relpath.split(os.sep)[0]
+            isdir = bool(mask & IN_ISDIR) or entry != relpath
+            stem = entrystem(entry, isdir)
+            logger.debug("%s changed %s (mask 0x%x)", stem, fullpath, mask)
+            stems.add(stem)
+        return stems
+
+    def read(self):
+        '''return the pending events'''
+        buf = b''
+        while True:
+            try:
+                chunk = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not chunk:
+                break
+            buf += chunk
+        return list(parse_events(buf))
+
+    def readable(self, timeout):
+        try:
+            r, _, _ = select.select([self.fd], [], [], timeout)
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            return False
+        return bool(r)
+
+    def wait(self, debounce, timeout=None):
+        '''block until documents change; return their stems
+
+        After the first event, waits until no further event arrives for
+        debounce seconds.  Returns None if the whole tree should be scanned
+        again, or an empty set if timeout seconds passed without change.
+        '''
+        stems = set()
+        deadline = None if timeout is None else time.time() + timeout
+        while not stems:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+            if not self.readable(remaining):
+                return stems
+            stems = self.stems(self.read())
+            if stems is None:
+                break
+        while self.readable(debounce):
+            more = self.stems(self.read())
+            if more is None or stems is None:
+                stems = None
+            else:
+                stems.update(more)
+        return stems
+
+#
+# -- end of file